@@ -1,16 +1,17 @@
 import pandas as pd
+import numpy as np
 import os
 import glob
 import json
-import pickle
-import shutil
+
+from wos_chunk_reader import iter_csv_chunks, iter_ordered_results, read_header_bytes, skip_records, split_byte_ranges
 
 # ================= 配置区域 =================
 # 1. 文件夹路径
 FILES_FOLDER = 'files'               # 原始数据文件夹
 TIER1_FILE = '中科院1区期刊.csv'      # 1区期刊名单
-TEMP_FOLDER = 'temp_results'         # [新增] 用于存放中间结果的临时文件夹
-CHECKPOINT_FILE = 'checkpoint.json'  # [新增] 用于记录进度的文件
+TEMP_FOLDER = 'temp_results'         # 旧版的逐块 pkl 中间结果 (仅用于迁移旧断点)
+CHECKPOINT_FILE = 'checkpoint.json'  # 进度 + 累计计数 (统计结果直接保存在断点文件中)
 
 # 2. 输出文件名
 OUTPUT_JOURNAL_CSV = '结果_各期刊统计.csv'
@@ -23,6 +24,9 @@ TIER1_COL_NAME = 'Journal Name'
 
 # 4. 参数
 CHUNK_SIZE = 50000                 
+CHECKPOINT_EVERY = 10                # 每处理多少块保存一次断点 (文件结束时总会保存)
+WORKERS = 1                          # 并行进程数：1 为串行；0 表示 CPU 核数
+SPLIT_BYTES = 256 << 20              # 并行时大文件按约这么多字节切成多段，分给不同进程
 # ============================================
 
 def normalize_name(name):
@@ -31,53 +35,105 @@ def normalize_name(name):
         return ""
     return str(name).strip().lower()
 
+def summarize_chunk(chunk):
+    """
+    一个块的按期刊计数，返回 [期刊名(标准化), 总数, 2021-2026, 2020及以前] 四列。
+    期刊名先 factorize，只对不重复的名称做标准化，再按编码用 bincount 计数，不逐行 apply。
+    """
+    year = pd.to_numeric(chunk[COL_YEAR], errors='coerce').to_numpy()
+    valid = ~np.isnan(year)
+
+    codes, uniques = pd.factorize(chunk[COL_JOURNAL])
+    # 编码 -1 (期刊名为空) 对应标准化后的 ""
+    labels = np.concatenate([[""], pd.Index(uniques).astype(str).str.strip().str.lower().to_numpy(dtype=object)])
+    codes = codes[valid] + 1
+    year = year[valid]
+
+    n = len(labels)
+    summary = pd.DataFrame({
+        'temp_journal_key': labels,
+        'cnt_total': np.bincount(codes, minlength=n),
+        'cnt_2021_2026': np.bincount(codes, weights=(year >= 2021) & (year <= 2026), minlength=n).astype(np.int64),
+        'cnt_2020_before': np.bincount(codes, weights=(year <= 2020), minlength=n).astype(np.int64),
+    })
+    summary = summary[summary['cnt_total'] > 0]
+    # 不同写法 (大小写/空格) 标准化后相同的期刊合并
+    return summary.groupby('temp_journal_key', sort=False).sum().reset_index()
+
 def load_checkpoint():
     """加载进度记录"""
     if os.path.exists(CHECKPOINT_FILE):
-        with open(CHECKPOINT_FILE, 'r') as f:
-            return json.load(f)
+        with open(CHECKPOINT_FILE, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if 'counters' not in state:
+            # 旧版断点：计数在 temp_results/*.pkl 中
+            state['counters'] = import_legacy_pickles()
+        return state
     return {
         "finished_files": [],       # 已经彻底处理完的文件列表
         "current_file": None,       # 当前正在处理的文件
-        "processed_chunks": 0       # 当前文件已经处理了多少个块
+        "processed_chunks": 0,      # 当前文件已经处理了多少个块
+        "offset": None,             # 当前文件已处理部分结束处的字节偏移 (续跑时直接 seek)
+        "counters": {}              # 期刊名(标准化) -> [总论文数, 2021-2026数量, 2020及以前数量]
     }
 
 def save_checkpoint(state):
-    """保存进度记录"""
-    with open(CHECKPOINT_FILE, 'w') as f:
-        json.dump(state, f, indent=4)
+    """保存进度记录 (先写临时文件再替换，中断时不会留下写了一半的断点)"""
+    tmp_file = CHECKPOINT_FILE + '.tmp'
+    with open(tmp_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_file, CHECKPOINT_FILE)
 
-def main():
-    # 0. 初始化环境
-    if not os.path.exists(TEMP_FOLDER):
-        os.makedirs(TEMP_FOLDER)
+def import_legacy_pickles():
+    """把旧版逐块保存的 pkl 中间结果汇总为计数表"""
+    counters = {}
+    pkl_files = glob.glob(os.path.join(TEMP_FOLDER, '*.pkl'))
+    if not pkl_files:
+        return counters
+    print(f" - 迁移旧版中间结果 {len(pkl_files)} 个...")
+    for pkl_file in pkl_files:
+        try:
+            add_counts(counters, pd.read_pickle(pkl_file))
+        except Exception:
+            print(f"警告：无法读取临时文件 {pkl_file}")
+    return counters
 
-    print("Step 1: 加载1区期刊名单...")
-    try:
-        tier1_df = pd.read_csv(TIER1_FILE)
-        tier1_set = set(tier1_df[TIER1_COL_NAME].apply(normalize_name))
-        print(f" - 已加载 {len(tier1_set)} 个1区期刊。")
-    except Exception as e:
-        print(f"Error: 读取1区文件失败: {e}")
-        return
+def add_counts(counters, chunk_summary):
+    """把一个块的 groupby 结果累加到计数表"""
+    for key, total, new, old in chunk_summary.itertuples(index=False):
+        counts = counters.setdefault(key, [0, 0, 0])
+        counts[0] += int(total)
+        counts[1] += int(new)
+        counts[2] += int(old)
 
-    # 1. 获取所有CSV文件并排序（排序很重要，保证顺序一致）
-    all_files = sorted(glob.glob(os.path.join(FILES_FOLDER, '*.csv')))
-    print(f"Step 2: 发现 {len(all_files)} 个数据文件。")
+def merge_counts(counters, partial):
+    """把一个区间的计数表累加到总计数表 (按 partial 中的顺序插入新期刊，结果与串行一致)"""
+    for key, (total, new, old) in partial.items():
+        counts = counters.setdefault(key, [0, 0, 0])
+        counts[0] += total
+        counts[1] += new
+        counts[2] += old
 
-    # 2. 加载断点状态
-    state = load_checkpoint()
+def read_chunks(file_path, **kwargs):
+    """只读需要的两列；期刊名按 category 读入 (重复值多，省内存)，年份按字符串读入再转数字"""
+    return iter_csv_chunks(file_path, CHUNK_SIZE,
+                           usecols=[COL_JOURNAL, COL_YEAR],
+                           dtype={COL_JOURNAL: 'category', COL_YEAR: str}, **kwargs)
+
+def aggregate_range(file_path, start, end):
+    """(子进程) 统计文件 [start, end) 字节区间，返回该区间的计数表"""
+    counters = {}
+    for chunk, _ in read_chunks(file_path, start_offset=start, end_offset=end):
+        add_counts(counters, summarize_chunk(chunk))
+    return counters
+
+def process_files_serial(all_files, state):
+    """逐个文件、逐块统计 (断点精确到块)。出错时返回 False"""
     finished_files = set(state['finished_files'])
     current_file_record = state['current_file']
     processed_chunks_record = state['processed_chunks']
+    counters = state['counters']
 
-    print(f"Step 3: 检查断点...")
-    if current_file_record:
-        print(f" - 上次中断于文件: {current_file_record}, 第 {processed_chunks_record} 块")
-    else:
-        print(" - 无中断记录，从头开始。")
-
-    # 3. 遍历文件
     for file_path in all_files:
         file_name = os.path.basename(file_path)
 
@@ -90,87 +146,140 @@ def main():
         
         # 准备读取
         try:
-            reader = pd.read_csv(file_path, chunksize=CHUNK_SIZE, low_memory=False)
-            
-            chunk_idx = 0
-            for chunk in reader:
+            # 上次中断的文件：有字节偏移时直接 seek 过去；旧版断点只有块数，按记录数跳过 (只扫描字节，不解析)
+            start_offset, skip, chunk_idx = None, 0, 0
+            if file_name == current_file_record:
+                chunk_idx = processed_chunks_record
+                start_offset = state.get('offset')
+                if start_offset is None:
+                    skip = processed_chunks_record * CHUNK_SIZE
+                print(f"    从第 {chunk_idx} 块之后继续...")
+
+            for chunk, offset in read_chunks(file_path, start_offset=start_offset, skip=skip):
                 chunk_idx += 1
-                
-                # case B: 如果是上次中断的文件，需要跳过已经处理过的块
-                if file_name == current_file_record and chunk_idx <= processed_chunks_record:
-                    # 仅在刚开始打印一次跳过信息，避免刷屏
-                    if chunk_idx % 10 == 0:
-                        print(f"    ...跳过已处理块 {chunk_idx}", end='\r')
-                    continue
-
-                # --- 核心处理逻辑 (同之前) ---
-                chunk[COL_YEAR] = pd.to_numeric(chunk[COL_YEAR], errors='coerce')
-                chunk = chunk.dropna(subset=[COL_YEAR])
-                chunk['temp_journal_key'] = chunk[COL_JOURNAL].apply(normalize_name)
-                
-                mask_new = (chunk[COL_YEAR] >= 2021) & (chunk[COL_YEAR] <= 2026)
-                mask_old = (chunk[COL_YEAR] <= 2020)
-                
-                chunk['cnt_total'] = 1
-                chunk['cnt_2021_2026'] = mask_new.astype(int)
-                chunk['cnt_2020_before'] = mask_old.astype(int)
-                
-                chunk_summary = chunk.groupby('temp_journal_key')[[
-                    'cnt_total', 'cnt_2021_2026', 'cnt_2020_before'
-                ]].sum().reset_index()
 
-                # --- 保存中间结果 ---
-                # 将这个块的结果保存为独立文件
-                temp_filename = f"{file_name}_chunk_{chunk_idx}.pkl"
-                temp_path = os.path.join(TEMP_FOLDER, temp_filename)
-                chunk_summary.to_pickle(temp_path)
+                # --- 核心处理逻辑 ---
+                chunk_summary = summarize_chunk(chunk)
 
-                # --- 更新并保存状态 ---
+                # --- 累加到内存中的计数表 ---
+                add_counts(counters, chunk_summary)
+
+                # --- 更新状态，每 CHECKPOINT_EVERY 块保存一次 (计数与进度在同一个文件中，始终一致) ---
                 state['current_file'] = file_name
                 state['processed_chunks'] = chunk_idx
-                save_checkpoint(state)
+                state['offset'] = offset
+                if chunk_idx % CHECKPOINT_EVERY == 0:
+                    save_checkpoint(state)
                 
-                print(f"    块 {chunk_idx} 处理完成并保存.", end='\r')
+                print(f"    块 {chunk_idx} 处理完成.", end='\r')
 
             # --- 文件处理完成 ---
             print(f"\n    文件 {file_name} 全部完成。")
-            state['finished_files'].append(file_name)
-            state['current_file'] = None # 重置当前文件
-            state['processed_chunks'] = 0
-            save_checkpoint(state)
+            finish_file(state, file_name)
 
         except Exception as e:
             print(f"\n[错误] 处理文件 {file_name} 时发生异常: {e}")
             print("程序已停止，修复错误后重新运行即可从断点继续。")
-            return
+            return False
+    return True
 
-    # ================= 聚合阶段 =================
-    print("\nStep 4: 所有文件处理完毕，开始合并临时结果...")
-    
-    # 获取temp文件夹下所有pkl文件
-    temp_files = glob.glob(os.path.join(TEMP_FOLDER, '*.pkl'))
-    if not temp_files:
-        print("没有找到中间结果文件，无法生成报告。")
+def process_files_parallel(all_files, state, workers):
+    """
+    多进程统计：每个文件按 SPLIT_BYTES 切成若干字节区间，各区间在子进程中得到独立的计数表，
+    主进程按文件、区间顺序合并 (结果与串行完全一致)，每完成一个文件保存一次断点。出错时返回 False
+    """
+    finished_files = set(state['finished_files'])
+    tasks = []
+    last_task = {}    # 文件名 -> 该文件最后一个区间
+    for file_path in all_files:
+        file_name = os.path.basename(file_path)
+        if file_name in finished_files:
+            print(f" [跳过] 已完成文件: {file_name}")
+            continue
+        # 串行模式中断的文件：从断点偏移开始切分
+        start_offset = None
+        if file_name == state['current_file']:
+            start_offset = state.get('offset')
+            if start_offset is None and state['processed_chunks']:
+                data_start = read_header_bytes(file_path)[1]
+                start_offset = skip_records(file_path, data_start, state['processed_chunks'] * CHUNK_SIZE)
+        ranges = split_byte_ranges(file_path, SPLIT_BYTES, start_offset)
+        if not ranges:
+            finish_file(state, file_name)
+            continue
+        for start, end in ranges:
+            tasks.append((file_path, start, end))
+        last_task[file_name] = tasks[-1]
+
+    print(f" - {workers} 个进程并行统计 {len(last_task)} 个文件 ({len(tasks)} 个区间)...")
+    counters = state['counters']
+    file_name = None
+    try:
+        for task, partial in iter_ordered_results(aggregate_range, tasks, workers):
+            file_name = os.path.basename(task[0])
+            merge_counts(counters, partial)
+            if task == last_task[file_name]:
+                print(f"    文件 {file_name} 全部完成。")
+                finish_file(state, file_name)
+    except Exception as e:
+        print(f"\n[错误] 处理文件 {file_name} 时发生异常: {e}")
+        print("程序已停止，修复错误后重新运行即可从断点继续。")
+        return False
+    return True
+
+def finish_file(state, file_name):
+    """标记文件完成并保存断点"""
+    state['finished_files'].append(file_name)
+    state['current_file'] = None # 重置当前文件
+    state['processed_chunks'] = 0
+    state['offset'] = None
+    save_checkpoint(state)
+
+def main():
+    print("Step 1: 加载1区期刊名单...")
+    try:
+        tier1_df = pd.read_csv(TIER1_FILE)
+        tier1_set = set(tier1_df[TIER1_COL_NAME].apply(normalize_name))
+        print(f" - 已加载 {len(tier1_set)} 个1区期刊。")
+    except Exception as e:
+        print(f"Error: 读取1区文件失败: {e}")
         return
 
-    # 1. 收集所有小块的统计数据
-    all_summaries = []
-    total_parts = len(temp_files)
-    for i, pkl_file in enumerate(temp_files):
-        try:
-            df = pd.read_pickle(pkl_file)
-            all_summaries.append(df)
-            if i % 100 == 0:
-                print(f" - 合并进度: {i}/{total_parts}", end='\r')
-        except:
-            print(f"警告：无法读取临时文件 {pkl_file}")
+    # 1. 获取所有CSV文件并排序（排序很重要，保证顺序一致）
+    all_files = sorted(glob.glob(os.path.join(FILES_FOLDER, '*.csv')))
+    print(f"Step 2: 发现 {len(all_files)} 个数据文件。")
 
-    print("\n - 正在进行最终GroupBy聚合...")
-    # 2. 合并为一个大表并再次GroupBy
-    combined_df = pd.concat(all_summaries, ignore_index=True)
-    final_journal_df = combined_df.groupby('temp_journal_key').sum().reset_index()
-    
-    final_journal_df.columns = ['期刊名(标准化)', '总论文数', '2021-2026数量', '2020及以前数量']
+    # 2. 加载断点状态
+    state = load_checkpoint()
+    current_file_record = state['current_file']
+    processed_chunks_record = state['processed_chunks']
+    counters = state['counters']
+
+    print(f"Step 3: 检查断点...")
+    if current_file_record:
+        print(f" - 上次中断于文件: {current_file_record}, 第 {processed_chunks_record} 块")
+    else:
+        print(" - 无中断记录，从头开始。")
+
+    # 3. 遍历文件 (WORKERS > 1 时多进程并行)
+    workers = WORKERS or os.cpu_count() or 1
+    if workers > 1:
+        ok = process_files_parallel(all_files, state, workers)
+    else:
+        ok = process_files_serial(all_files, state)
+    if not ok:
+        return
+
+    # ================= 汇总阶段 =================
+    print("\nStep 4: 所有文件处理完毕，生成统计表...")
+    if not counters:
+        print("没有统计结果，无法生成报告。")
+        return
+
+    final_journal_df = pd.DataFrame(
+        [(key, *counts) for key, counts in counters.items()],
+        columns=['期刊名(标准化)', '总论文数', '2021-2026数量', '2020及以前数量']
+    )
     
     # 输出表1
     final_journal_df.to_csv(OUTPUT_JOURNAL_CSV, index=False, encoding='utf-8-sig')
@@ -190,8 +299,7 @@ def main():
 
     print("\n--- 任务全部完成 ---")
     
-    # 可选：询问是否删除临时文件
-    # shutil.rmtree(TEMP_FOLDER) 
+    # 可选：删除断点文件 (保留则下次运行直接输出结果)
     # if os.path.exists(CHECKPOINT_FILE): os.remove(CHECKPOINT_FILE)
 
 if __name__ == '__main__':
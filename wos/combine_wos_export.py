@@ -6,48 +6,465 @@ from datetime import datetime
 import os
 import pandas as pd
 import re
+import csv
+import json
+import shutil
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 from tqdm import tqdm
-from openpyxl import Workbook
+
+from wos_record_parser import TAG_TO_COLUMN, iter_export_records, record_to_row, export_columns
+from wos_merge_manifest import MergeManifest, read_csv_header
+from wos_csv_scan import count_csv_records
+
+# 可选：pyarrow，用于 Parquet 输出 (output_format='parquet')
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# 可选：python-calamine (Rust 实现的 Excel 读取)，未安装时使用 openpyxl / xlrd / pyxlsb
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# 支持合并的导出格式：Excel (.xls/.xlsx) 与纯文本 (Tab delimited / Plain text 均为 .txt)
+EXCEL_EXTENSIONS = (".xls", ".xlsx")
+TEXT_EXTENSIONS = (".txt",)
+
+# Parquet 输出：默认按出版年分区，可加上 "Source Title" 再按期刊分区
+PARQUET_PARTITION_COLS = ("Publication Year",)
+# Parquet 中按整数存储的列，其余列一律为字符串
+INTEGER_COLUMNS = (
+    "Publication Year", "Cited Reference Count", "Times Cited, WoS Core", "Times Cited, All Databases",
+    "180 Day Usage Count", "Since 2013 Usage Count", "Number of Pages",
+)
 
 
 # ------------------------------------------------------------
-# 强兼容 Excel 读取函数（不会再出现 engine 错误）
+# 导出文件真实格式识别（按文件头的魔数，不看扩展名）
 # ------------------------------------------------------------
-def read_excel_safely(file_path):
-    try:
-        return pd.read_excel(file_path, engine="openpyxl")
-    except Exception:
-        pass
+OLE2_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+ZIP_MAGIC = b"PK\x03\x04"
+
+
+def sniff_export_format(file_path):
+    """
+    返回 'xls' (OLE2) / 'xlsx' / 'xlsb' / 'html' (伪装成 .xls 的网页表格) / 'tsv' / None (无法识别)
+    """
+    with open(file_path, "rb") as f:
+        head = f.read(2048)
+    if not head:
+        return None
+    if head.startswith(OLE2_MAGIC):
+        return "xls"
+    if head.startswith(ZIP_MAGIC):
+        try:
+            with zipfile.ZipFile(file_path) as zf:
+                names = set(zf.namelist())
+        except zipfile.BadZipFile:
+            return None
+        if "xl/workbook.bin" in names:
+            return "xlsb"
+        if "xl/workbook.xml" in names:
+            return "xlsx"
+        return None
+
+    text = head.lstrip(b"\xef\xbb\xbf\xff\xfe\x00 \t\r\n").lower().replace(b"\x00", b"")
+    if text.startswith(b"<") and (b"<html" in text or b"<table" in text or b"<!doctype" in text):
+        return "html"
+    if b"\t" in head:
+        return "tsv"
+    return None
+
 
+# ------------------------------------------------------------
+# 按格式逐行读取（每个文件只解析一次，第一行为表头）
+# ------------------------------------------------------------
+def _excel_value(value):
+    # xlrd / calamine 把整数读成 float，还原为 int，与 pd.read_excel 的结果一致
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def iter_excel_rows(file_path, fmt=None):
+    """逐行 yield 单元格值列表；fmt 为空时先识别格式，无法识别抛出 ValueError"""
+    fmt = fmt or sniff_export_format(file_path)
+
+    if fmt in ("xls", "xlsx", "xlsb") and CalamineWorkbook is not None:
+        # 可选的 Rust 引擎，三种格式都支持且最快
+        sheet = CalamineWorkbook.from_path(file_path).get_sheet_by_index(0)
+        for row in sheet.iter_rows():
+            yield [_excel_value(v) for v in row]
+
+    elif fmt == "xlsx":
+        from openpyxl import load_workbook
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            for row in wb.worksheets[0].iter_rows(values_only=True):
+                yield list(row)
+        finally:
+            wb.close()
+
+    elif fmt == "xls":
+        import xlrd
+        book = xlrd.open_workbook(file_path, on_demand=True)
+        try:
+            sheet = book.sheet_by_index(0)
+            for r in range(sheet.nrows):
+                yield [_excel_value(v) for v in sheet.row_values(r)]
+        finally:
+            book.release_resources()
+
+    elif fmt == "xlsb":
+        from pyxlsb import open_workbook
+        with open_workbook(file_path) as wb:
+            with wb.get_sheet(1) as sheet:
+                for row in sheet.rows():
+                    yield [_excel_value(c.v) for c in row]
+
+    elif fmt == "html":
+        df = pd.read_html(file_path)[0]
+        yield list(df.columns)
+        for row in df.itertuples(index=False):
+            yield list(row)
+
+    elif fmt == "tsv":
+        with open(file_path, "r", encoding="utf-8-sig", errors="replace", newline="") as f:
+            for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE):
+                yield row
+
+    else:
+        raise ValueError(f"无法识别的文件格式：{os.path.basename(file_path)}")
+
+
+def count_excel_rows(file_path):
+    """不构造 DataFrame，直接统计数据行数（不含表头），无法读取时返回 None"""
     try:
-        return pd.read_excel(file_path, engine="xlrd")
+        return max(sum(1 for _ in iter_excel_rows(file_path)) - 1, 0)
     except Exception:
-        pass
+        return None
 
+
+# ------------------------------------------------------------
+# 强兼容 Excel 读取函数（按真实格式直接选择读取方式，不再逐个引擎试错）
+# ------------------------------------------------------------
+def read_excel_safely(file_path):
     try:
-        return pd.read_excel(file_path, engine="pyxlsb")
+        rows = iter_excel_rows(file_path)
+        header = next(rows, None)
+        if header is None:
+            return None
+        # 去掉表头之后全空的列 (部分导出带有多余的空单元格)
+        width = len(header)
+        while width and header[width - 1] in (None, ""):
+            width -= 1
+        header = header[:width]
+        return pd.DataFrame([row[:width] for row in rows], columns=header)
     except Exception:
-        pass
+        return None
 
+
+# ------------------------------------------------------------
+# 纯文本导出 → CSV（逐条流式写入，不经过 pandas/openpyxl/xlrd）
+# ------------------------------------------------------------
+def write_text_export_to_csv(file_path, output_csv, columns, write_header):
+    """按 columns 的列顺序写入 CSV，缺失字段留空，返回写入行数"""
+    rows = 0
+    with open(output_csv, 'w' if write_header else 'a', newline='', encoding="utf-8-sig") as out:
+        writer = csv.writer(out, lineterminator=os.linesep)
+        if write_header:
+            writer.writerow(columns)
+        for record in iter_export_records(file_path):
+            row = record_to_row(record)
+            writer.writerow([row.get(c, '') for c in columns])
+            rows += 1
+    return rows
+
+
+# ------------------------------------------------------------
+# 统一 schema：所有文件的列取并集，固定列顺序和类型
+# ------------------------------------------------------------
+def to_typed_frame(df):
+    """整数列转为可空 Int32，其余列转为字符串，保证各文件写出的 schema 一致"""
+    df = df.copy()
+    for col in df.columns:
+        if col in INTEGER_COLUMNS:
+            df[col] = pd.to_numeric(df[col], errors="coerce").astype("Int32")
+        else:
+            df[col] = df[col].astype("string")
+    return df
+
+
+def read_export_header(file_path):
+    """
+    只读表头 (xlsx / Tab delimited 读第一行，Plain text 只扫描字段标签)。
+    xls / xlsb / 网页表格读表头也要解析整张表，返回 None，由调用方在进程池中解析。
+    """
+    if file_path.lower().endswith(TEXT_EXTENSIONS):
+        return export_columns(file_path)
+    fmt = sniff_export_format(file_path)
+    if fmt == "xlsx":
+        # 不走 calamine：它会先载入整张表，openpyxl 的 read_only 模式只读第一行
+        from openpyxl import load_workbook
+        wb = load_workbook(file_path, read_only=True, data_only=True)
+        try:
+            header = list(next(wb.worksheets[0].iter_rows(values_only=True), ()))
+        finally:
+            wb.close()
+    elif fmt == "tsv":
+        rows = iter_excel_rows(file_path, fmt)
+        try:
+            header = next(rows, None) or []
+        finally:
+            rows.close()
+    else:
+        return None
+    while header and header[-1] in (None, ""):
+        header = header[:-1]
+    return [str(c) for c in header]
+
+
+def union_columns(headers):
+    """多个表头的并集：WOS 标准列按字段标签顺序排在前面，其余列按首次出现的顺序排在后面"""
+    order = {col: i for i, col in enumerate(TAG_TO_COLUMN.values())}
+    seen = []
+    seen_set = set()
+    for header in headers:
+        for col in header:
+            if col not in seen_set:
+                seen.append(col)
+                seen_set.add(col)
+    known = sorted((c for c in seen if c in order), key=order.get)
+    return known + [c for c in seen if c not in order]
+
+
+def schema_path_for(output_csv):
+    return output_csv + ".schema.json"
+
+
+def write_schema_sidecar(output_csv, columns):
+    """记录合并 CSV 的列与类型，read_merged_csv 读取时直接按此类型解析，不再做类型推断"""
+    schema = {
+        "columns": columns,
+        "dtypes": {c: ("Int32" if c in INTEGER_COLUMNS else "string") for c in columns},
+    }
+    with open(schema_path_for(output_csv), "w", encoding="utf-8") as f:
+        json.dump(schema, f, ensure_ascii=False, indent=2)
+
+
+def read_schema_columns(output_csv):
+    """schema 文件中记录的列 (合并 CSV 或 Parquet 数据集)，没有 schema 文件时返回 None"""
+    schema_path = schema_path_for(output_csv)
+    if not os.path.exists(schema_path):
+        return None
+    with open(schema_path, "r", encoding="utf-8") as f:
+        return json.load(f).get("columns")
+
+
+def existing_parquet_columns(dataset_dir, partition_cols=PARQUET_PARTITION_COLS):
+    """
+    已有 Parquet 数据集的列：优先取 schema 文件；没有时 (旧数据集) 取任一数据文件的列，再补上分区列
+    (分区列不写入数据文件)。数据集为空时返回 None。
+    """
+    columns = read_schema_columns(dataset_dir)
+    if columns:
+        return columns
+    for root, _, names in os.walk(dataset_dir):
+        for name in sorted(names):
+            if name.endswith(".parquet"):
+                columns = pq.read_schema(os.path.join(root, name)).names
+                return columns + [c for c in partition_cols if c not in columns]
     return None
 
 
+def read_merged_csv(csv_path, usecols=None, **kwargs):
+    """按 schema 文件中的类型读取合并 CSV (没有 schema 文件时全部按字符串读取)"""
+    dtypes = str
+    schema_path = schema_path_for(csv_path)
+    if os.path.exists(schema_path):
+        with open(schema_path, "r", encoding="utf-8") as f:
+            dtypes = json.load(f)["dtypes"]
+        if usecols is not None:
+            dtypes = {c: dtypes[c] for c in usecols if c in dtypes}
+    return pd.read_csv(csv_path, usecols=usecols, dtype=dtypes, encoding="utf-8-sig",
+                       keep_default_na=False, na_values=[""], **kwargs)
+
+
+# ------------------------------------------------------------
+# 单个导出文件追加到 CSV（合并主函数和后台合并线程共用）
+# ------------------------------------------------------------
+def append_export_to_csv(file_path, output_csv, header_columns=None, write_header=False, df=None):
+    """
+    把一个 savedrecs 文件写入 output_csv；write_header 为 True 时覆盖写并写表头。
+    header_columns 为 None 时以本文件的列作为表头，否则按 header_columns 对齐列。
+    df 为已解析好的 Excel 内容 (进程池解析时传入)。
+    返回 (写入行数, 表头列)，无法读取时抛出 ValueError。
+    """
+    if file_path.lower().endswith(TEXT_EXTENSIONS):
+        # 纯文本导出：字段标签映射为 Excel 列名，与 Excel 导出合并后列一致
+        if header_columns is None:
+            header_columns = export_columns(file_path)
+        rows = write_text_export_to_csv(file_path, output_csv, header_columns, write_header)
+        return rows, header_columns
+
+    if df is None:
+        df = read_excel_safely(file_path)
+    if df is None:
+        raise ValueError("Excel 读取失败")
+    if header_columns is None:
+        header_columns = list(df.columns)
+    # 按表头对齐列 (缺失的列留空，多余的列丢弃)，整数列不会因为空值变成 2020.0
+    df = to_typed_frame(df).reindex(columns=header_columns)
+
+    df.to_csv(
+        output_csv,
+        mode='w' if write_header else 'a',
+        header=write_header,
+        index=False,
+        encoding="utf-8-sig"
+    )
+    return len(df), header_columns
+
+
+# ------------------------------------------------------------
+# 单个导出文件写入 Parquet 数据集（按年份 / 期刊分区，列有类型）
+# ------------------------------------------------------------
+def append_export_to_parquet(file_path, dataset_dir, df=None, partition_cols=PARQUET_PARTITION_COLS,
+                             part_name=None, columns=None):
+    """
+    把一个 savedrecs 文件追加到 Parquet 数据集 dataset_dir，返回写入行数。
+    part_name 用作数据文件名前缀 (默认取原文件名)，同名文件会被覆盖，合并时传入内容哈希。
+    columns 不为空时按其对齐列，各数据文件的 schema 完全一致。
+    """
+    if pq is None:
+        raise ImportError("输出 Parquet 需要安装 pyarrow")
+
+    if df is None:
+        if file_path.lower().endswith(TEXT_EXTENSIONS):
+            df = pd.DataFrame([record_to_row(r) for r in iter_export_records(file_path)])
+        else:
+            df = read_excel_safely(file_path)
+    if df is None:
+        raise ValueError("Excel 读取失败")
+    if df.empty:
+        return 0
+
+    if columns:
+        df = df.reindex(columns=columns)
+    df = to_typed_frame(df)
+    cols = [c for c in partition_cols if c in df.columns]
+    for col in cols:
+        # 分区值为空时写成 __HIVE_DEFAULT_PARTITION__，读回时与整数分区无法合并：缺失年份归入 0，缺失期刊归入 UNKNOWN
+        if col in INTEGER_COLUMNS:
+            df[col] = df[col].fillna(0)
+        else:
+            df[col] = df[col].fillna("UNKNOWN").replace("", "UNKNOWN")
+    part_name = part_name or re.sub(r"[^0-9A-Za-z_-]+", "_", os.path.splitext(os.path.basename(file_path))[0])
+    # 不写 pandas 元数据：分区列读回时是字典类型，与元数据中的 Int32 冲突会导致 read_parquet 失败
+    table = pa.Table.from_pandas(df, preserve_index=False).replace_schema_metadata(None)
+    pq.write_to_dataset(
+        table,
+        dataset_dir,
+        partition_cols=cols or None,
+        basename_template=part_name + "-{i}.parquet",
+    )
+    return len(df)
+
+
+# ------------------------------------------------------------
+# 多进程解析 Excel（按输入顺序产出，内存中最多保留 workers*2 个结果）
+# ------------------------------------------------------------
+def iter_parsed_exports(file_paths, workers=None, parsed=None):
+    """
+    按 file_paths 的顺序 yield (路径, DataFrame 或 None, 错误信息)。
+    Excel 在进程池中解析；纯文本返回 None，由写入端直接流式处理。
+    workers 默认等于 CPU 核数，<= 1 时退化为串行。
+    parsed: {路径: pickle 文件}，表头预扫描时已解析过的文件直接读回，不再解析。
+    """
+    workers = workers or os.cpu_count() or 1
+    parsed = parsed or {}
+
+    def needs_parse(path):
+        return not path.lower().endswith(TEXT_EXTENSIONS) and path not in parsed
+
+    excel_count = sum(1 for p in file_paths if needs_parse(p))
+
+    if workers <= 1 or excel_count <= 1:
+        for path in file_paths:
+            if path.lower().endswith(TEXT_EXTENSIONS):
+                yield path, None, None
+                continue
+            if path in parsed:
+                yield path, pd.read_pickle(parsed[path]), None
+                continue
+            df = read_excel_safely(path)
+            yield path, df, None if df is not None else "Excel 读取失败"
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, excel_count)) as pool:
+        pending = deque()
+        remaining = iter(file_paths)
+
+        def submit_next():
+            path = next(remaining, None)
+            if path is None:
+                return
+            future = pool.submit(read_excel_safely, path) if needs_parse(path) else None
+            pending.append((path, future))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            path, future = pending.popleft()
+            submit_next()
+            if future is None:
+                yield path, pd.read_pickle(parsed[path]) if path in parsed else None, None
+                continue
+            try:
+                df = future.result()
+            except Exception as e:
+                yield path, None, str(e)
+                continue
+            yield path, df, None if df is not None else "Excel 读取失败"
+
+
 # ------------------------------------------------------------
 # CSV 总行数统计（不含表头）
 # ------------------------------------------------------------
 def count_csv_rows(csv_path):
-    with open(csv_path, "r", encoding="utf-8-sig") as f:
-        total = sum(1 for _ in f) - 1
-    return max(total, 0)
+    # 引号内的换行 (摘要、地址中常见) 不计；结果按文件大小 / mtime 缓存
+    return count_csv_records(csv_path, has_header=True)
 
 
 # ------------------------------------------------------------
-# 主函数：Excel → CSV（不会爆内存）
+# 主函数：Excel / 纯文本 → CSV（不会爆内存）
 # ------------------------------------------------------------
 def merge_wos_exports_to_csv(input_folder, output_csv,
-                             delete_originals=False, match_savedrecs=True):
+                             delete_originals=False, match_savedrecs=True, workers=None,
+                             incremental=True, output_format="csv", partition_cols=PARQUET_PARTITION_COLS,
+                             union_schema=True):
+    """
+    workers: Excel 解析进程数，默认等于 CPU 核数；1 表示单进程串行
+    incremental: output_csv 已存在时按合并清单只追加新文件 (内容相同的重命名文件也跳过)；
+                 False 时重新生成 output_csv
+    output_format: "csv" 或 "parquet"；parquet 时 output_csv 为数据集目录，
+                   按 partition_cols 分区 (例如 ("Publication Year", "Source Title"))，需要 pyarrow
+    union_schema: 先读一遍所有文件的表头，以列的并集作为输出表头 (不同记录类型/字段配置的导出列不同)；
+                  False 时以第一个文件的列为准，其余文件按列名对齐
+    """
+    if output_format not in ("csv", "parquet"):
+        raise ValueError(f"未知的输出格式：{output_format}")
+    if output_format == "parquet" and pq is None:
+        print("❌ 输出 Parquet 需要安装 pyarrow")
+        return
 
-    print("\n--- 开始执行 Excel → CSV 合并任务 ---\n")
+    print("\n--- 开始执行 导出文件 → CSV 合并任务 ---\n")
 
     output_dir = os.path.dirname(output_csv)
     if not os.path.exists(output_dir):
@@ -56,7 +473,10 @@ def merge_wos_exports_to_csv(input_folder, output_csv,
     # 过滤文件
     def is_wos_file(name):
         n = name.lower()
-        if not (n.endswith(".xls") or n.endswith(".xlsx")):
+        if n.endswith(TEXT_EXTENSIONS):
+            # 纯文本只认 WOS 的 savedrecs*.txt，避免把目录里的其他 txt 合并进来
+            return n.startswith("savedrecs")
+        if not n.endswith(EXCEL_EXTENSIONS):
             return False
         if match_savedrecs:
             return re.match(r"savedrecs.*", name, re.IGNORECASE) is not None
@@ -70,55 +490,138 @@ def merge_wos_exports_to_csv(input_folder, output_csv,
         return
 
     if not files:
-        print("⚠ 未找到 Excel 文件。")
+        print("⚠ 未找到 WOS 导出文件。")
         return
 
-    print(f"找到 {len(files)} 个 Excel 文件，开始写 CSV...\n")
+    print(f"找到 {len(files)} 个导出文件，开始写 CSV...\n")
 
-    first_write = True
+    # --------------------------------------------------------
+    # 合并清单：跳过已合并的文件，续写已有的 CSV
+    # --------------------------------------------------------
+    manifest = MergeManifest(output_csv)
+    if not incremental or not os.path.exists(output_csv):
+        manifest.reset()
+        if output_format == "parquet" and os.path.isdir(output_csv):
+            shutil.rmtree(output_csv)
+    header_columns = None
+    if incremental and output_format == "csv":
+        header_columns = read_csv_header(output_csv)
+    elif incremental and os.path.isdir(output_csv):
+        # 续写 Parquet 数据集时沿用已有的列，各数据文件的 schema 保持一致
+        header_columns = existing_parquet_columns(output_csv, partition_cols)
+    first_write = header_columns is None
+
+    file_paths = []
+    file_hashes = {}
     files_to_delete = []
+    skipped = 0
+    for file in files:
+        file_path = os.path.join(input_folder, file)
+        merged, digest = manifest.check(file_path)
+        if merged or digest in file_hashes.values():
+            # 已合并过，或与本批其他文件内容相同
+            skipped += 1
+            files_to_delete.append(file_path)
+            continue
+        file_paths.append(file_path)
+        file_hashes[file_path] = digest
+
+    if skipped:
+        print(f"跳过已合并 / 重复的文件 {skipped} 个，待合并 {len(file_paths)} 个\n")
 
     # --------------------------------------------------------
-    # Excel → CSV（逐文件，不爆内存）
+    # 表头预扫描：确定并集列顺序
     # --------------------------------------------------------
-    for file in tqdm(files, desc="读取 Excel 并写入 CSV",
-                     dynamic_ncols=True, colour="green", leave=False):
-
-        file_path = os.path.join(input_folder, file)
+    parsed = {}
+    parsed_dir = output_csv.rstrip("/\\") + ".parsed"
+    if union_schema and file_paths:
+        headers = []
+        full_parse = []
+        for file_path in file_paths:
+            try:
+                header = read_export_header(file_path)
+            except Exception:
+                # 读不了的文件在正式写入时报错
+                continue
+            if header is None:
+                full_parse.append(file_path)
+            else:
+                headers.append(header)
+        if full_parse:
+            # 只能整表解析才能拿到表头的文件：在进程池中解析一次，结果暂存到磁盘，写入时直接读回
+            os.makedirs(parsed_dir, exist_ok=True)
+            for i, (file_path, df, error) in enumerate(iter_parsed_exports(full_parse, workers)):
+                if df is None:
+                    continue
+                headers.append([str(c) for c in df.columns])
+                parsed[file_path] = os.path.join(parsed_dir, f"{i}.pkl")
+                df.to_pickle(parsed[file_path])
+                del df
+        columns = union_columns(headers)
+        if header_columns is None:
+            header_columns = columns
+        else:
+            extra = [c for c in columns if c not in header_columns]
+            if extra:
+                # 续写时表头 / schema 已固定，新列既不能丢弃也不能只写进部分数据文件
+                shutil.rmtree(parsed_dir, ignore_errors=True)
+                raise ValueError(f"新导出文件中有已有合并结果没有的列 {extra}，无法增量合并；"
+                                 f"请用 incremental=False 重新生成 {output_csv}")
+        write_schema_sidecar(output_csv, header_columns)
 
-        df = read_excel_safely(file_path)
-        if df is None:
-            tqdm.write(f"❌ 无法读取：{file}")
+    # --------------------------------------------------------
+    # 导出文件 → CSV（逐文件，不爆内存）
+    # --------------------------------------------------------
+    # 子进程只负责解析，写入始终在主进程按文件顺序进行，输出与串行合并完全一致
+    for file_path, df, error in tqdm(iter_parsed_exports(file_paths, workers, parsed), total=len(file_paths),
+                                     desc="读取导出文件并写入 CSV",
+                                     dynamic_ncols=True, colour="green", leave=False):
+
+        file = os.path.basename(file_path)
+        if error:
+            tqdm.write(f"❌ 无法读取：{file}（{error}）")
             continue
 
-        tqdm.write(f"读取 {file}（{len(df)} 行）")
-
-        df.to_csv(
-            output_csv,
-            mode='w' if first_write else 'a',
-            header=first_write,
-            index=False,
-            encoding="utf-8-sig"
-        )
+        try:
+            if output_format == "parquet":
+                rows = append_export_to_parquet(file_path, output_csv, df=df, partition_cols=partition_cols,
+                                                part_name=file_hashes[file_path], columns=header_columns)
+            else:
+                rows, header_columns = append_export_to_csv(file_path, output_csv, header_columns, first_write,
+                                                            df=df)
+        except Exception as e:
+            tqdm.write(f"❌ 无法读取：{file}（{e}）")
+            continue
 
+        manifest.record(file_path, rows, file_hashes[file_path])
+        tqdm.write(f"读取 {file}（{rows} 行）")
         first_write = False
         files_to_delete.append(file_path)
         del df
 
-    print("\n✔ 所有 Excel 已写入 CSV！")
+    if os.path.isdir(parsed_dir):
+        shutil.rmtree(parsed_dir, ignore_errors=True)
+
+    print(f"\n✔ 所有导出文件已写入 {output_format.upper()}！")
 
     # --------------------------------------------------------
     # 统计 CSV 行数
     # --------------------------------------------------------
-    total_rows = count_csv_rows(output_csv)
+    if not os.path.exists(output_csv):
+        print("⚠ 没有可写入的数据。")
+        return 0
+    if output_format == "parquet":
+        total_rows = manifest.total_rows
+    else:
+        total_rows = count_csv_rows(output_csv)
 
-    print(f"\n📊 CSV 总数据行数（不含表头）：{total_rows}\n")
+    print(f"\n📊 {output_format.upper()} 总数据行数（不含表头）：{total_rows}\n")
 
     # --------------------------------------------------------
-    # 删除原 Excel（可选）
+    # 删除原导出文件（可选）
     # --------------------------------------------------------
     if delete_originals:
-        print("正在删除原 Excel 文件...")
+        print("正在删除原导出文件...")
         for f in files_to_delete:
             try:
                 os.remove(f)
@@ -135,32 +638,74 @@ def merge_wos_exports_to_csv(input_folder, output_csv,
 # 独立的 CSV → XLSX 函数（可选调用）
 # ------------------------------------------------------------
 
-def csv_to_xlsx(csv_file, xlsx_file):
+XLSX_MAX_ROWS = 1048576          # 单个工作表的行数上限 (含表头)
+XLSX_MAX_CELL_CHARS = 32767      # 单元格字符数上限，超长的引文字段会被截断
+
+
+def csv_to_xlsx(csv_file, xlsx_file, split="sheet", max_rows=XLSX_MAX_ROWS):
+    """
+    CSV → XLSX（csv.reader 正确处理带逗号/换行的引号字段，write-only 工作簿流式写入，内存占用固定）。
+    超过单表行数上限时自动续写：split="sheet" 在同一文件中新建 Sheet2、Sheet3...；
+    split="file" 另存为 xxx_2.xlsx、xxx_3.xlsx...。每个工作表都重复写表头。返回生成的文件列表。
+    """
+    # openpyxl 只在生成 xlsx 时需要，不放在合并的导入路径上
+    from openpyxl import Workbook
+    from openpyxl.cell.cell import ILLEGAL_CHARACTERS_RE
+
     print("\n--- 开始执行 CSV → XLSX ---\n")
 
     # 获取总行数
     total_rows = count_csv_rows(csv_file)
     print(f"CSV 总行数：{total_rows}")
 
-    wb = Workbook()
-    ws = wb.active
-
-    with open(csv_file, "r", encoding="utf-8-sig") as f:
-
-        header = next(f).strip().split(",")
+    def clean(value):
+        # 去掉 Excel 不允许的控制字符，超长单元格截断
+        value = ILLEGAL_CHARACTERS_RE.sub("", value)
+        return value[:XLSX_MAX_CELL_CHARS]
+
+    base, ext = os.path.splitext(xlsx_file)
+    output_files = []
+    wb = ws = None
+    sheet_no = 0
+    rows_in_sheet = 0
+
+    def new_sheet():
+        nonlocal wb, ws, sheet_no, rows_in_sheet
+        sheet_no += 1
+        if wb is None or split == "file":
+            if wb is not None:
+                wb.save(output_files[-1])
+            wb = Workbook(write_only=True)
+            output_files.append(xlsx_file if not output_files else f"{base}_{len(output_files) + 1}{ext}")
+        ws = wb.create_sheet(title=f"Sheet{sheet_no}" if split == "sheet" else "Sheet1")
         ws.append(header)
+        rows_in_sheet = 1
+
+    with open(csv_file, "r", encoding="utf-8-sig", newline="") as f:
+        reader = csv.reader(f)
+        header = [clean(v) for v in next(reader, [])]
+        new_sheet()
 
-        for line in tqdm(
-                f,
+        for row in tqdm(
+                reader,
                 total=total_rows,
                 desc="写入 XLSX",
                 dynamic_ncols=True,
                 colour="yellow",
                 leave=False):
-            ws.append(line.strip().split(","))
+            if rows_in_sheet >= max_rows:
+                new_sheet()
+            ws.append([clean(v) for v in row])
+            rows_in_sheet += 1
 
-    wb.save(xlsx_file)
-    print(f"\n✔ XLSX 文件已生成：{xlsx_file}\n")
+    wb.save(output_files[-1])
+    for path in output_files:
+        print(f"\n✔ XLSX 文件已生成：{path}")
+    if sheet_no > 1:
+        unit = "个文件" if split == "file" else "个工作表"
+        print(f"（超过单表 {max_rows} 行上限，共拆分为 {sheet_no} {unit}）")
+    print()
+    return output_files
 
 
 # --- 示例调用 ---
@@ -196,4 +741,4 @@ if __name__ == '__main__':
     )
 
     #csv 2 xlsx
-    # csv_to_xlsx_stream(OUTPUT_CSV, OUTPUT_XLSX)
+    # csv_to_xlsx(OUTPUT_CSV, OUTPUT_XLSX)
@@ -1,10 +1,12 @@
 import pandas as pd
 import os
 import glob
-import re
 import time
 import json
 
+from wos_chunk_reader import iter_csv_chunks, iter_ordered_results, read_header_bytes, skip_records, split_byte_ranges
+from wos_gazetteer import get_region_matcher, remove_author_brackets
+
 # ================= 配置区域 =================
 # 请务必修改为您实际的文件夹路径
 input_folder = r'E:\wos_spider\WOS_Exported_Files'   # 输入文件夹
@@ -14,38 +16,13 @@ output_file_name = 'Jiangsu_2024_Final.csv'               # 结果数据文件
 log_file_name = 'process_log.json'                        # 进度记录文件
 
 CHUNK_SIZE = 3000                                        # 每次内存处理的行数
-# ===========================================
+WORKERS = 1                                              # 并行进程数：1 为串行；0 表示 CPU 核数
+SPLIT_BYTES = 256 << 20                                  # 并行时大文件按约这么多字节切成多段，分给不同进程
 
-def get_jiangsu_regex():
-    """
-    构建江苏省及下辖13个地级市的正则匹配模式。
-    """
-    cities = [
-        "Jiangsu",      # 省名
-        "Nanjing",      # 南京
-        "Suzhou",       # 苏州
-        "Wuxi",         # 无锡
-        "Xuzhou",       # 徐州
-        "Changzhou",    # 常州
-        "Nantong",      # 南通
-        "Lianyungang",  # 连云港
-        "Huai'an", "Huaian", # 淮安
-        "Yancheng",     # 盐城
-        "Yangzhou",     # 扬州
-        "Zhenjiang",    # 镇江
-        "Taizhou",      # 泰州
-        "Suqian"        # 宿迁
-    ]
-    # 拼接正则: (?i)(Jiangsu|Nanjing|Suzhou|...)
-    return r'(?i)(' + '|'.join(cities) + ')'
-
-def clean_address(text):
-    """
-    清除地址中的 [Author Name] 部分，避免人名干扰。
-    """
-    if not isinstance(text, str):
-        return ""
-    return re.sub(r'\[.*?\]', '', text)
+PROVINCE = 'Jiangsu'                                     # 要筛选的省份 (省名及下辖城市见 wos_gazetteer.py)
+GAZETTEER_FILE = None                                    # 补充/覆盖地名表的 JSON 文件 (可选)
+TARGET_YEAR = 2024                                       # 出版年
+# ===========================================
 
 def load_progress(log_path):
     """读取进度记录"""
@@ -54,13 +31,80 @@ def load_progress(log_path):
             with open(log_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
         except:
-            return {"current_file": None, "processed_rows": 0}
-    return {"current_file": None, "processed_rows": 0}
+            return {"current_file": None, "processed_rows": 0, "offset": None}
+    return {"current_file": None, "processed_rows": 0, "offset": None}
+
+def save_progress(log_path, file_name, rows_count, offset=None):
+    """保存进度记录 (offset: 已处理部分结束处的字节偏移，续跑时直接 seek)"""
+    tmp_path = log_path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({"current_file": file_name, "processed_rows": rows_count, "offset": offset}, f)
+    os.replace(tmp_path, log_path)
+
+def filter_chunk(chunk, matcher):
+    """筛选一个块：先按出版年筛选，只对剩下的行去除人名后匹配省份/城市"""
+    if 'Publication Year' not in chunk.columns or 'Addresses' not in chunk.columns:
+        return chunk.iloc[0:0]
 
-def save_progress(log_path, file_name, rows_count):
-    """保存进度记录"""
-    with open(log_path, 'w', encoding='utf-8') as f:
-        json.dump({"current_file": file_name, "processed_rows": rows_count}, f)
+    # 1. 筛选年份 (开销小，先做)
+    chunk['Publication Year'] = pd.to_numeric(chunk['Publication Year'], errors='coerce')
+    chunk = chunk[chunk['Publication Year'] == TARGET_YEAR]
+    if chunk.empty:
+        return chunk
+
+    # 2. 筛选地址 (去除 [作者] 部分后整词匹配地名)
+    addr_mask = matcher.contains(remove_author_brackets(chunk['Addresses']))
+    return chunk[addr_mask.to_numpy()]
+
+def read_chunks(file_path, **kwargs):
+    """分块读取 (每块附带结束处的字节偏移)"""
+    return iter_csv_chunks(file_path, CHUNK_SIZE, encoding='utf-8', on_bad_lines='skip', **kwargs)
+
+def filter_range(file_path, start, end):
+    """(子进程) 筛选文件 [start, end) 字节区间，返回 (各块的筛选结果, 读取行数, 错误信息)"""
+    matcher = get_region_matcher(PROVINCE, GAZETTEER_FILE)
+    shards, rows = [], 0
+    try:
+        for chunk, _ in read_chunks(file_path, start_offset=start, end_offset=end):
+            filtered_data = filter_chunk(chunk, matcher)
+            if not filtered_data.empty:
+                shards.append(filtered_data)
+            rows += len(chunk)
+    except Exception as e:
+        return [], rows, str(e)
+    return shards, rows, None
+
+def iter_filtered_serial(pending):
+    """逐个文件、逐块筛选，按顺序 yield (文件路径, 筛选结果列表, 行数, 结束偏移, 错误信息)"""
+    matcher = get_region_matcher(PROVINCE, GAZETTEER_FILE)
+    for file_path, start_offset, skip_rows in pending:
+        try:
+            for chunk, offset in read_chunks(file_path, start_offset=start_offset, skip=skip_rows):
+                yield file_path, [filter_chunk(chunk, matcher)], len(chunk), offset, None
+        except Exception as e:
+            yield file_path, [], 0, None, str(e)
+
+def iter_filtered_parallel(pending, workers):
+    """
+    各文件按 SPLIT_BYTES 切成字节区间，在子进程中筛选；
+    按文件、区间顺序 yield (文件路径, 筛选结果列表, 行数, 区间结束偏移, 错误信息)，写入顺序与串行一致
+    """
+    tasks = []
+    for file_path, start_offset, skip_rows in pending:
+        if skip_rows:
+            start_offset = skip_records(file_path, read_header_bytes(file_path)[1], skip_rows)
+        for start, end in split_byte_ranges(file_path, SPLIT_BYTES, start_offset):
+            tasks.append((file_path, start, end))
+    print(f"{workers} 个进程并行筛选 {len(pending)} 个文件 ({len(tasks)} 个区间)...")
+
+    failed = set()
+    for (file_path, _, end), (shards, rows, error) in iter_ordered_results(filter_range, tasks, workers):
+        # 出错文件的后续区间不再写入 (与串行模式一致：出错后跳到下一个文件)
+        if file_path in failed:
+            continue
+        if error:
+            failed.add(file_path)
+        yield file_path, shards, rows, end, error
 
 def process_wos_data():
     # 1. 初始化路径
@@ -78,19 +122,19 @@ def process_wos_data():
     progress = load_progress(log_path)
     last_file = progress.get('current_file')
     last_rows = progress.get('processed_rows', 0)
+    last_offset = progress.get('offset')
     
     # 标记：是否找到断点文件
     found_resume_point = False if last_file else True 
     # 标记：是否首次写入（控制表头）
     is_first_write = not os.path.exists(output_path)
     
-    # 准备正则
-    jiangsu_pattern = get_jiangsu_regex()
     total_saved = 0
     start_time = time.time()
 
-    # 4. 循环处理文件
-    for i, file_path in enumerate(all_files):
+    # 4. 确定待处理的文件及断点位置
+    pending = []
+    for file_path in all_files:
         file_name = os.path.basename(file_path)
         
         # --- 跳过已完成的文件 ---
@@ -101,72 +145,55 @@ def process_wos_data():
                 print(f"[跳过] {file_name} (上次已完成)")
                 continue
 
-        print(f"[{i+1}/{len(all_files)}] 正在处理: {file_name}")
-        
-        # --- 计算跳过行数 ---
-        skip_rows = last_rows if (file_name == last_file) else 0
-        current_file_processed_rows = skip_rows 
-        
-        try:
-            # 构造读取迭代器
-            if skip_rows > 0:
-                print(f"恢复模式：跳过前 {skip_rows} 行...")
-                # range(1, skip_rows + 1) 跳过数据行但保留表头
-                reader = pd.read_csv(
-                    file_path, 
-                    chunksize=CHUNK_SIZE, 
-                    encoding='utf-8', 
-                    on_bad_lines='skip',
-                    skiprows=range(1, skip_rows + 1) 
-                )
-            else:
-                reader = pd.read_csv(
-                    file_path, 
-                    chunksize=CHUNK_SIZE, 
-                    encoding='utf-8', 
-                    on_bad_lines='skip'
-                )
-            
-            # --- 分块处理 ---
-            for chunk in reader:
-                # 1. 筛选年份 (2024)
-                if 'Publication Year' in chunk.columns:
-                    chunk['Publication Year'] = pd.to_numeric(chunk['Publication Year'], errors='coerce')
-                    year_mask = chunk['Publication Year'] == 2024
-                else:
-                    year_mask = False
-
-                # 2. 筛选地址 (去除人名后匹配江苏城市)
-                if 'Addresses' in chunk.columns:
-                    clean_addrs = chunk['Addresses'].astype(str).map(clean_address)
-                    addr_mask = clean_addrs.str.contains(jiangsu_pattern, regex=True, na=False)
-                else:
-                    addr_mask = False
-                
-                # 3. 综合筛选
-                filtered_data = chunk[year_mask & addr_mask]
-
-                # 4. 写入结果
-                if not filtered_data.empty:
-                    filtered_data.to_csv(
-                        output_path, 
-                        mode='a', 
-                        index=False, 
-                        header=is_first_write, 
-                        encoding='utf-8-sig'
-                    )
-                    is_first_write = False
-                    total_saved += len(filtered_data)
-                
-                # 5. 更新进度记录
-                current_file_processed_rows += len(chunk)
-                save_progress(log_path, file_name, current_file_processed_rows)
+        # --- 断点位置 ---
+        # 旧版进度文件只有行数：按记录数跳过 (只扫描字节，不解析)
+        if file_name == last_file and last_offset is not None:
+            print(f"恢复模式：{file_name} 从字节偏移 {last_offset} (第 {last_rows} 行之后) 继续...")
+            pending.append((file_path, last_offset, 0))
+        elif file_name == last_file and last_rows > 0:
+            print(f"恢复模式：{file_name} 跳过前 {last_rows} 行...")
+            pending.append((file_path, None, last_rows))
+        else:
+            pending.append((file_path, None, 0))
 
-        except Exception as e:
-            print(f"读取文件出错 {file_name}: {e}")
+    # 5. 分块 (WORKERS > 1 时多进程按字节区间) 筛选，按文件顺序写入结果
+    workers = WORKERS or os.cpu_count() or 1
+    if workers > 1:
+        segments = iter_filtered_parallel(pending, workers)
+    else:
+        segments = iter_filtered_serial(pending)
+
+    current_file = None
+    current_file_processed_rows = 0
+    for file_path, shards, rows, offset, error in segments:
+        file_name = os.path.basename(file_path)
+        if file_name != current_file:
+            current_file = file_name
+            print(f"[{all_files.index(file_path)+1}/{len(all_files)}] 正在处理: {file_name}")
+            current_file_processed_rows = last_rows if file_name == last_file else 0
+
+        if error:
+            print(f"读取文件出错 {file_name}: {error}")
             continue
 
-    # 5. 完成收尾
+        # 写入结果
+        for filtered_data in shards:
+            if not filtered_data.empty:
+                filtered_data.to_csv(
+                    output_path, 
+                    mode='a', 
+                    index=False, 
+                    header=is_first_write, 
+                    encoding='utf-8-sig'
+                )
+                is_first_write = False
+                total_saved += len(filtered_data)
+        
+        # 更新进度记录
+        current_file_processed_rows += rows
+        save_progress(log_path, file_name, current_file_processed_rows, offset)
+
+    # 6. 完成收尾
     print("="*40)
     print(f"所有处理完成！")
     print(f"⏱总耗时: {time.time() - start_time:.1f} 秒")
@@ -1,6 +1,8 @@
 import os
 import csv
 
+from wos_csv_scan import count_csv_records
+
 def is_header(row1, row2):
     def is_number(s):
         try:
@@ -19,6 +21,7 @@ def is_header(row1, row2):
     return row1_num < row2_num
 
 def count_csv_rows(filepath):
+    # 只用 csv.reader 读前两行判断表头，总行数由引号感知的块扫描得到 (带缓存)
     with open(filepath, 'r', encoding='utf-8', errors='ignore', newline='') as f:
         reader = csv.reader(f)
 
@@ -32,13 +35,8 @@ def count_csv_rows(filepath):
         except StopIteration:
             return 1
 
-        has_header = is_header(first, second)
-
-        count = 2  # 已读两行
-        for _ in reader:
-            count += 1
-
-        return count - 1 if has_header else count
+    has_header = is_header(first, second)
+    return count_csv_records(filepath, has_header=has_header)
 
 
 def count_all_csv(directory='E:\wos_spider\WOS_Exported_Files'):
@@ -0,0 +1,269 @@
+# -*- coding: utf-8 -*-
+# 作者地址 (C1 / Addresses) 索引 (SQLite, WAL 模式)
+# 合并后的 CSV 中每条记录的 Addresses 形如
+#   "[Li, X; Wang, Y] Nanjing Univ, Sch Phys, Nanjing 210093, Jiangsu, Peoples R China; [Smith, J] MIT, Cambridge, MA 02139 USA"
+# 入库时解析一次，拆成 (UT, 作者, 机构, 城市, 省/州, 国家) 行：
+#   papers        每个 UT 一行：出版年、来源文件
+#   affiliations  每个 (UT, 作者, 地址) 一行，按 省份+年份 / 城市 / 国家 / 机构 建索引
+#   ingest_files  已入库的文件及读取到的字节偏移 (增量入库、断点续跑；只在末尾追加的文件从偏移继续)
+# 之后 "2024 年有江苏单位的论文" 之类的查询直接走索引，不再对几百万行地址做正则扫描:
+#   SELECT DISTINCT a.ut FROM affiliations a WHERE a.province = 'Jiangsu' AND a.pub_year = 2024
+# 用法: python wos_affiliation_index.py <affiliations.db> <合并 CSV 文件或目录>
+
+import os
+import re
+import sys
+import glob
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from wos_chunk_reader import iter_csv_chunks, content_digest, is_appended
+from wos_gazetteer import CHINA_MUNICIPALITIES, CHINA_PROVINCES, city_province_map
+
+COL_UT = 'UT (Unique WOS ID)'
+COL_YEAR = 'Publication Year'
+COL_ADDRESSES = 'Addresses'
+
+CHUNK_SIZE = 20000
+# SQLite 单条语句的参数个数上限 (旧版本为 999)
+IN_BATCH = 900
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_files (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    path        TEXT NOT NULL UNIQUE,
+    size        INTEGER,
+    mtime       INTEGER,
+    offset      INTEGER,
+    digest      TEXT,                   -- 文件开头和 offset 之前内容的哈希 (wos_chunk_reader.content_digest)
+    done        INTEGER NOT NULL DEFAULT 0,
+    papers      INTEGER NOT NULL DEFAULT 0,
+    updated_at  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS papers (
+    ut          TEXT PRIMARY KEY,
+    pub_year    INTEGER,
+    file_id     INTEGER NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS affiliations (
+    ut          TEXT NOT NULL,
+    pub_year    INTEGER,
+    addr_index  INTEGER NOT NULL,       -- 该记录中的第几个地址
+    author      TEXT,                   -- 地址前没有 [作者] 时为空
+    institution TEXT,
+    city        TEXT,
+    province    TEXT,                   -- 中国为省份，美国等为州缩写
+    country     TEXT
+);
+
+CREATE INDEX IF NOT EXISTS idx_aff_province_year ON affiliations (province, pub_year);
+CREATE INDEX IF NOT EXISTS idx_aff_city ON affiliations (city);
+CREATE INDEX IF NOT EXISTS idx_aff_country_year ON affiliations (country, pub_year);
+CREATE INDEX IF NOT EXISTS idx_aff_institution ON affiliations (institution);
+CREATE INDEX IF NOT EXISTS idx_aff_ut ON affiliations (ut);
+CREATE INDEX IF NOT EXISTS idx_papers_file ON papers (file_id);
+"""
+
+# "[作者; 作者] 地址" 中的一段
+ADDRESS_BLOCK_PATTERN = re.compile(r'\[([^\]]*)\]\s*([^\[]*)')
+# 美国地址最后一段 "MA 02139 USA" / "MA USA"
+US_TAIL_PATTERN = re.compile(r'^([A-Z]{2})(?:\s+[\d-]+)?\s+USA$')
+COUNTRY_ALIASES = {"peoples r china": "China"}
+
+_PROVINCE_NAMES = {name.lower(): name for name in CHINA_PROVINCES}
+_CITY_PROVINCE = city_province_map()
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def strip_postal_code(text):
+    """去掉含数字的词 (邮编)，"Nanjing 210093" -> "Nanjing"，"Cambridge CB2 1TN" -> "Cambridge\""""
+    return ' '.join(word for word in text.split() if not any(ch.isdigit() for ch in word))
+
+
+def parse_address(address):
+    """一条地址 -> (机构, 城市, 省/州, 国家)"""
+    parts = [p.strip() for p in address.strip().rstrip('.;').split(',') if p.strip()]
+    if not parts:
+        return None, None, None, None
+    institution = parts[0]
+    tail = parts[-1]
+    province = None
+
+    us = US_TAIL_PATTERN.match(tail)
+    if us or tail == 'USA':
+        country = 'USA'
+        province = us.group(1) if us else None
+        city = strip_postal_code(parts[-2]) if len(parts) >= 3 else None
+        return institution, city or None, province, country
+
+    country = COUNTRY_ALIASES.get(tail.lower(), strip_postal_code(tail) or tail)
+    rest = parts[1:-1]
+    if rest and country == 'China' and strip_postal_code(rest[-1]).lower() in _PROVINCE_NAMES:
+        province = _PROVINCE_NAMES[strip_postal_code(rest[-1]).lower()]
+        rest = rest[:-1]
+    if province in CHINA_MUNICIPALITIES or not rest:
+        # 直辖市 "Chinese Acad Sci, Inst Phys, Beijing 100190, Peoples R China"：城市即省份，前面的段是院系
+        city = province
+    else:
+        city = strip_postal_code(rest[-1])
+    if country == 'China' and province is None and city:
+        # 直辖市及地名表中的城市没有写省份时按城市推断
+        province = _CITY_PROVINCE.get(city.lower())
+    return institution, city or None, province, country
+
+
+def parse_c1(c1):
+    """
+    解析一条记录的 Addresses，返回 [(地址序号, 作者, 机构, 城市, 省/州, 国家), ...]。
+    带 [作者] 时每个作者一行；没有 [作者] 的旧格式按 "; " 分隔地址，作者为空。
+    """
+    if not isinstance(c1, str) or not c1.strip():
+        return []
+    rows = []
+    if '[' in c1:
+        for index, match in enumerate(ADDRESS_BLOCK_PATTERN.finditer(c1)):
+            fields = parse_address(match.group(2).strip().rstrip(';'))
+            for author in match.group(1).split(';'):
+                rows.append((index, author.strip() or None, *fields))
+    else:
+        for index, address in enumerate(a for a in c1.split(';') if a.strip()):
+            rows.append((index, None, *parse_address(address)))
+    return rows
+
+
+def open_index(db_path):
+    """打开 (或创建) 地址索引数据库"""
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.commit()
+    return conn
+
+
+def _migrate(conn):
+    """旧版索引的 ingest_files 补充 digest 字段"""
+    columns = {r['name'] for r in conn.execute("PRAGMA table_info(ingest_files)")}
+    if 'digest' not in columns:
+        conn.execute("ALTER TABLE ingest_files ADD COLUMN digest TEXT")
+
+
+def _existing_uts(conn, uts):
+    """uts 中已入库的 UT"""
+    found = set()
+    for i in range(0, len(uts), IN_BATCH):
+        batch = uts[i:i + IN_BATCH]
+        marks = ','.join('?' * len(batch))
+        found.update(r[0] for r in conn.execute(f"SELECT ut FROM papers WHERE ut IN ({marks})", batch))
+    return found
+
+
+def _file_entry(conn, path):
+    """
+    返回 (文件 id, 续读偏移, 是否已完成)。文件只在末尾追加了记录时从上次的偏移继续；
+    偏移之前的内容变了时删除该文件之前入库的数据，从头重新入库。
+    """
+    st = os.stat(path)
+    row = conn.execute("SELECT * FROM ingest_files WHERE path = ?", (path,)).fetchone()
+    if row is not None and row['size'] == st.st_size and row['mtime'] == st.st_mtime_ns:
+        return row['id'], (None if row['done'] else row['offset']), bool(row['done'])
+    if row is not None and is_appended(path, row['offset'] or 0, row['digest']):
+        with conn:
+            conn.execute("UPDATE ingest_files SET size = ?, mtime = ?, done = 0, updated_at = ? WHERE id = ?",
+                         (st.st_size, st.st_mtime_ns, _now(), row['id']))
+        return row['id'], row['offset'], False
+    with conn:
+        if row is not None:
+            conn.execute("DELETE FROM affiliations WHERE ut IN (SELECT ut FROM papers WHERE file_id = ?)", (row['id'],))
+            conn.execute("DELETE FROM papers WHERE file_id = ?", (row['id'],))
+            conn.execute("DELETE FROM ingest_files WHERE id = ?", (row['id'],))
+        cur = conn.execute("INSERT INTO ingest_files (path, size, mtime, updated_at) VALUES (?, ?, ?, ?)",
+                           (path, st.st_size, st.st_mtime_ns, _now()))
+    return cur.lastrowid, None, False
+
+
+def ingest_file(conn, csv_path, chunk_size=CHUNK_SIZE):
+    """把一个合并 CSV 解析入库，返回新增论文数。已入库且未变化的文件直接跳过；同一 UT 只入库一次"""
+    path = os.path.abspath(csv_path)
+    file_id, start_offset, done = _file_entry(conn, path)
+    if done:
+        return 0
+
+    added = 0
+    for chunk, offset in iter_csv_chunks(path, chunk_size, start_offset=start_offset,
+                                         usecols=[COL_UT, COL_YEAR, COL_ADDRESSES], dtype=str):
+        chunk = chunk.dropna(subset=[COL_UT]).drop_duplicates(subset=[COL_UT])
+        years = pd.to_numeric(chunk[COL_YEAR], errors='coerce')
+        existing = _existing_uts(conn, chunk[COL_UT].tolist())
+
+        papers, affiliations = [], []
+        for ut, year, c1 in zip(chunk[COL_UT], years, chunk[COL_ADDRESSES]):
+            if ut in existing:
+                continue
+            year = None if pd.isna(year) else int(year)
+            papers.append((ut, year, file_id))
+            affiliations.extend((ut, year, *row) for row in parse_c1(c1))
+
+        # 数据和偏移在同一个事务中提交，中断后从偏移继续不会重复或遗漏
+        with conn:
+            conn.executemany("INSERT INTO papers (ut, pub_year, file_id) VALUES (?, ?, ?)", papers)
+            conn.executemany(
+                "INSERT INTO affiliations (ut, pub_year, addr_index, author, institution, city, province, country) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", affiliations)
+            conn.execute("UPDATE ingest_files SET offset = ?, digest = ?, papers = papers + ?, updated_at = ? "
+                         "WHERE id = ?", (offset, content_digest(path, offset), len(papers), _now(), file_id))
+        added += len(papers)
+
+    with conn:
+        conn.execute("UPDATE ingest_files SET done = 1, updated_at = ? WHERE id = ?", (_now(), file_id))
+    return added
+
+
+def build_index(db_path, source, chunk_size=CHUNK_SIZE):
+    """入库 source (合并 CSV 文件或目录) 中的所有 CSV，返回新增论文数"""
+    files = [source] if os.path.isfile(source) else sorted(glob.glob(os.path.join(source, '*.csv')))
+    conn = open_index(db_path)
+    total = 0
+    try:
+        for path in files:
+            added = ingest_file(conn, path, chunk_size)
+            print(f" - {os.path.basename(path)}: 新增 {added} 篇")
+            total += added
+    finally:
+        conn.close()
+    return total
+
+
+def papers_in_region(conn, province=None, city=None, country=None, year=None):
+    """按地区 (和出版年) 查询 UT 列表，走 affiliations 上的索引"""
+    conditions, params = [], []
+    for column, value in (("province", province), ("city", city), ("country", country), ("pub_year", year)):
+        if value is not None:
+            conditions.append(f"{column} = ?")
+            params.append(value)
+    where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+    return [r[0] for r in conn.execute(f"SELECT DISTINCT ut FROM affiliations {where}", params)]
+
+
+if __name__ == '__main__':
+    # 用法: python wos_affiliation_index.py <affiliations.db> <合并 CSV 文件或目录>
+    if len(sys.argv) < 3:
+        print("用法: python wos_affiliation_index.py <affiliations.db> <合并 CSV 文件或目录>")
+        sys.exit(1)
+    added = build_index(sys.argv[1], sys.argv[2])
+    conn = open_index(sys.argv[1])
+    papers = conn.execute("SELECT COUNT(*) FROM papers").fetchone()[0]
+    rows = conn.execute("SELECT COUNT(*) FROM affiliations").fetchone()[0]
+    print(f"本次新增 {added} 篇；索引共 {papers} 篇论文，{rows} 条作者地址")
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+# 可按字节偏移断点续读的 CSV 分块读取
+# 按引号感知的方式 (wos_csv_scan.find_record_end) 在原始字节中切出 chunk_size 条完整记录，
+# 加上表头交给 pd.read_csv 解析，同时给出该块结束处的字节偏移。
+# 断点中记录这个偏移，续跑时直接 seek 过去，不再逐行解析已处理过的数据。
+# split_byte_ranges 按同样的记录边界把大文件切成若干字节区间，配合 iter_ordered_results 交给多个进程并行处理。
+# 合并 CSV 会被增量追加：断点处同时记录 content_digest，is_appended 据此判断文件是只在末尾追加 (从断点继续)
+# 还是被重新生成 (需要从头处理)。
+# 仅支持 UTF-8 (可带 BOM) 编码的 CSV。
+
+import io
+import os
+import hashlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from wos_csv_scan import SCAN_BLOCK_SIZE, count_block_newlines, find_record_end
+
+UTF8_BOM = b'\xef\xbb\xbf'
+# 判断文件是否被重写：对文件开头和断点之前各这么多字节取哈希
+CHECK_BYTES = 4096
+
+
+def read_header_bytes(path):
+    """返回 (表头那一行的字节 (不含 BOM)，数据起始偏移)"""
+    buf = b''
+    in_quote = False
+    scanned = 0
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(SCAN_BLOCK_SIZE)
+            if not block:
+                # 只有表头、没有换行
+                start = len(buf)
+                break
+            buf += block
+            end, _, in_quote = find_record_end(buf[scanned:], 1, in_quote)
+            if end is not None:
+                start = scanned + end
+                break
+            scanned = len(buf)
+    header = buf[:start]
+    bom = len(UTF8_BOM) if header.startswith(UTF8_BOM) else 0
+    if header and not header.endswith(b'\n'):
+        header += b'\n'
+    return header[bom:], start
+
+
+def content_digest(path, offset):
+    """文件开头和 offset 之前各 CHECK_BYTES 字节的哈希；文件只在末尾追加时不变"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        digest.update(f.read(min(CHECK_BYTES, offset)))
+        start = max(offset - CHECK_BYTES, 0)
+        f.seek(start)
+        digest.update(f.read(offset - start))
+    return digest.hexdigest()
+
+
+def is_appended(path, offset, digest):
+    """记录 digest 之后文件是否只在末尾追加了数据 (offset 之前的内容没变)"""
+    return (digest is not None and os.path.getsize(path) >= offset
+            and content_digest(path, offset) == digest)
+
+
+def skip_records(path, offset, n):
+    """从 offset 开始跳过 n 条记录 (只扫描字节，不解析)，返回新的偏移"""
+    found = 0
+    in_quote = False
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        while found < n:
+            block = f.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            end, got, in_quote = find_record_end(block, n - found, in_quote)
+            if end is not None:
+                return offset + end
+            found += got
+            offset += len(block)
+    return offset
+
+
+def split_byte_ranges(path, part_bytes, start_offset=None):
+    """
+    把 [start_offset, 文件末尾) 切成约 part_bytes 大小的若干 (起, 止) 字节区间，切点都在记录边界上。
+    只扫描字节跟踪引号状态，不解析。没有数据时返回空列表。
+    """
+    _, data_start = read_header_bytes(path)
+    cut = start_offset or data_start
+    size = os.path.getsize(path)
+    ranges = []
+    target = cut + part_bytes
+    pos = cut
+    in_quote = False
+    searching = False    # 已越过 target，正在找其后的第一个记录边界
+    with open(path, 'rb') as f:
+        f.seek(pos)
+        while target < size:
+            block = f.read(SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            i = 0
+            while True:
+                if not searching:
+                    if target >= pos + len(block):
+                        _, in_quote = count_block_newlines(block[i:], in_quote)
+                        break
+                    _, in_quote = count_block_newlines(block[i:target - pos], in_quote)
+                    i = target - pos
+                    searching = True
+                end, _, in_quote = find_record_end(block[i:], 1, in_quote)
+                if end is None:
+                    break
+                i += end
+                if pos + i >= size:
+                    # 找到的边界就是文件末尾
+                    target = size
+                    break
+                ranges.append((cut, pos + i))
+                cut = pos + i
+                target = cut + part_bytes
+                searching = False
+            pos += len(block)
+    if cut < size:
+        ranges.append((cut, size))
+    return ranges
+
+
+def iter_ordered_results(func, tasks, workers):
+    """
+    在进程池中执行 func(*task)，按 tasks 的顺序 yield (task, 结果)；同时在途的任务不超过 workers * 2 个。
+    workers <= 1 时在当前进程中串行执行。func 必须是模块顶层函数 (Windows 下子进程重新导入模块)。
+    """
+    tasks = list(tasks)
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield task, func(*task)
+        return
+
+    with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+        pending = deque()
+        remaining = iter(tasks)
+
+        def submit_next():
+            task = next(remaining, None)
+            if task is not None:
+                pending.append((task, pool.submit(func, *task)))
+
+        for _ in range(workers * 2):
+            submit_next()
+
+        while pending:
+            task, future = pending.popleft()
+            submit_next()
+            yield task, future.result()
+
+
+def iter_csv_chunks(path, chunk_size, start_offset=None, skip=0, end_offset=None, **read_csv_kwargs):
+    """
+    逐块 yield (DataFrame, 块结束处的字节偏移)。
+    start_offset: 断点中记录的偏移 (必须是某块的结束偏移)；为空时从第一条数据开始。
+    skip: 先跳过多少条记录 (兼容只记录了行数的旧断点)。
+    end_offset: 读到该偏移为止 (split_byte_ranges 给出的区间终点)；为空时读到文件末尾。
+    read_csv_kwargs 原样传给 pd.read_csv (usecols / dtype / on_bad_lines 等)。
+    """
+    header, data_start = read_header_bytes(path)
+    offset = start_offset or data_start
+    if skip:
+        offset = skip_records(path, offset, skip)
+    read_csv_kwargs.setdefault('encoding', 'utf-8')
+
+    def parse(segment):
+        return pd.read_csv(io.BytesIO(header + segment), **read_csv_kwargs)
+
+    with open(path, 'rb') as f:
+        f.seek(offset)
+        buf = b''
+        scanned = 0      # buf 中已扫描过的长度
+        found = 0        # 已扫描部分中的完整记录数
+        in_quote = False
+        while True:
+            size = SCAN_BLOCK_SIZE if end_offset is None else min(SCAN_BLOCK_SIZE, end_offset - offset - len(buf))
+            block = f.read(size) if size > 0 else b''
+            if not block:
+                break
+            buf += block
+            while True:
+                end, got, in_quote = find_record_end(buf[scanned:], chunk_size - found, in_quote)
+                if end is None:
+                    found += got
+                    scanned = len(buf)
+                    break
+                cut = scanned + end
+                offset += cut
+                yield parse(buf[:cut]), offset
+                buf = buf[cut:]
+                scanned, found, in_quote = 0, 0, False
+
+        # 文件末尾不足一块的记录
+        if buf.strip():
+            offset += len(buf)
+            yield parse(buf), offset
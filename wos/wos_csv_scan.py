@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# CSV 快速扫描 (按大块二进制读取，识别引号)
+# WOS 的摘要、地址等字段中常带换行，直接数换行会多算；csv.reader 逐字段解析又太慢。
+# 这里按块 split(b'"')，只统计引号外的换行：成对的 "" 转义只会让引号状态翻转两次，不影响结果。
+# 统计结果缓存在目录下的 .row_counts.json 中 (按文件大小 + mtime 判断是否失效)。
+# find_record_end 用同样的方法定位记录边界，供 wos_chunk_reader.py 按字节偏移断点续读。
+
+import os
+import json
+import threading
+
+SCAN_BLOCK_SIZE = 8 << 20
+ROW_CACHE_NAME = '.row_counts.json'
+
+_cache_lock = threading.Lock()
+
+
+def count_block_newlines(block, in_quote=False):
+    """返回 (块中引号外的换行数, 块结束时是否处于引号内)"""
+    if b'"' not in block:
+        return (0 if in_quote else block.count(b'\n')), in_quote
+    parts = block.split(b'"')
+    # in_quote 时 parts[0] 在引号内，引号外的片段从 parts[1] 开始隔一个取一个
+    count = sum(p.count(b'\n') for p in parts[(1 if in_quote else 0)::2])
+    if (len(parts) - 1) % 2:
+        in_quote = not in_quote
+    return count, in_quote
+
+
+def find_record_end(data, n, in_quote=False):
+    """
+    在 data 中找第 n 个引号外换行之后的位置 (即第 n 条记录结束处)。
+    返回 (位置, n, False)；不足 n 个时返回 (None, 已找到的个数, data 末尾的引号状态)。
+    """
+    pos = 0
+    found = 0
+    parts = data.split(b'"')
+    last = len(parts) - 1
+    for i, part in enumerate(parts):
+        if not in_quote:
+            c = part.count(b'\n')
+            if found + c >= n:
+                idx = -1
+                for _ in range(n - found):
+                    idx = part.find(b'\n', idx + 1)
+                return pos + idx + 1, n, False
+            found += c
+        pos += len(part) + 1
+        if i < last:
+            in_quote = not in_quote
+    return None, found, in_quote
+
+
+def count_csv_lines(path):
+    """CSV 的记录行数 (含表头)，引号内的换行不计"""
+    lines = 0
+    in_quote = False
+    last = b''
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(SCAN_BLOCK_SIZE), b''):
+            n, in_quote = count_block_newlines(block, in_quote)
+            lines += n
+            last = block[-1:]
+    # 最后一行没有换行符
+    if last and last != b'\n':
+        lines += 1
+    return lines
+
+
+def _load_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_cache(cache_path, cache):
+    tmp = f"{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp, cache_path)
+    except OSError:
+        # 目录只读等情况下不缓存，不影响计数结果
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def cached_csv_lines(path):
+    """带缓存的 count_csv_lines：文件大小和 mtime 未变时直接返回上次的结果"""
+    path = os.path.abspath(path)
+    cache_path = os.path.join(os.path.dirname(path), ROW_CACHE_NAME)
+    name = os.path.basename(path)
+    st = os.stat(path)
+
+    with _cache_lock:
+        entry = _load_cache(cache_path).get(name)
+    if entry and entry.get('size') == st.st_size and entry.get('mtime') == st.st_mtime_ns:
+        return entry['lines']
+
+    lines = count_csv_lines(path)
+    with _cache_lock:
+        cache = _load_cache(cache_path)
+        cache[name] = {"size": st.st_size, "mtime": st.st_mtime_ns, "lines": lines}
+        _save_cache(cache_path, cache)
+    return lines
+
+
+def count_csv_records(path, has_header=True, use_cache=True):
+    """数据行数 (has_header 时不含表头)"""
+    lines = cached_csv_lines(path) if use_cache else count_csv_lines(path)
+    return max(lines - (1 if has_header else 0), 0)
@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+# 合并结果去重 (按 UT，没有 UT 时按标准化后的 DOI)
+# 检索式之间有重叠、中断后重跑等都会让合并 CSV 中出现大量重复记录，analysis_SO_nums.py / total_papar_counts.py
+# 的计数因此偏大。这里逐块流式读取合并 CSV，只保留每个 UT/DOI 第一次出现的记录，写入新的 CSV。
+# 已出现的键不放在内存里，而是以 64 位哈希存入磁盘上的 SQLite (INTEGER PRIMARY KEY，即 B 树本身)，
+# 几千万条记录去重时内存占用也只和块大小有关。键集合和进度保存在 <输出>.keys.db 中：
+# 中断后重新运行从断点继续；之后对新的合并文件再运行一次，只会追加之前没出现过的记录。
+# 每个输入文件记录读到的偏移、大小、mtime 和断点前内容的哈希：增量合并后变大的文件从断点继续读新追加的部分，
+# 变小或被重新生成的文件直接报错 (已写出的记录无法撤回，需删除输出及 .keys.db 后重跑)。
+# 用法: python wos_dedup.py <去重后.csv> <合并 CSV 文件或目录> [...]
+# 注: 64 位哈希在 5000 万条记录时误判 (两条不同记录哈希相同) 的概率约为 1e-4。
+
+import os
+import sys
+import glob
+import sqlite3
+
+import numpy as np
+import pandas as pd
+
+from wos_chunk_reader import iter_csv_chunks, content_digest
+from wos_merge_manifest import read_csv_header
+
+COL_UT = 'UT (Unique WOS ID)'
+COL_DOI = 'DOI'
+
+CHUNK_SIZE = 50000
+# SQLite 单条语句的参数个数上限 (旧版本为 999)
+IN_BATCH = 900
+# 键集合的 SQLite 页缓存 (MB)，内存占用的上限
+KEYSET_CACHE_MB = 256
+DOI_PREFIX_PATTERN = r'^(?:https?://(?:dx\.)?doi\.org/|doi:\s*)'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS seen (
+    key         INTEGER PRIMARY KEY
+);
+
+CREATE TABLE IF NOT EXISTS progress (
+    path        TEXT PRIMARY KEY,
+    offset      INTEGER,
+    done        INTEGER NOT NULL DEFAULT 0,
+    size        INTEGER,                -- 本次读取开始时的文件大小和 mtime
+    mtime       INTEGER,
+    digest      TEXT                    -- 文件开头和 offset 之前 CHECK_BYTES 字节的哈希
+);
+
+CREATE TABLE IF NOT EXISTS output (
+    id          INTEGER PRIMARY KEY CHECK (id = 1),
+    size        INTEGER NOT NULL,
+    rows_in     INTEGER NOT NULL,
+    rows_out    INTEGER NOT NULL
+);
+"""
+
+
+def keyset_path_for(output_csv):
+    return output_csv + '.keys.db'
+
+
+def open_keyset(db_path):
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(f"PRAGMA cache_size=-{KEYSET_CACHE_MB * 1024}")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.execute("INSERT OR IGNORE INTO output (id, size, rows_in, rows_out) VALUES (1, 0, 0, 0)")
+    conn.commit()
+    return conn
+
+
+def _migrate(conn):
+    """旧版键集合的进度表补充文件大小 / mtime / 哈希字段"""
+    columns = {r[1] for r in conn.execute("PRAGMA table_info(progress)")}
+    for name, ddl in (("size", "INTEGER"), ("mtime", "INTEGER"), ("digest", "TEXT")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE progress ADD COLUMN {name} {ddl}")
+
+
+def resume_offset(conn, path):
+    """
+    返回 path 的续读偏移 (0 表示从头读)；已去重且之后没有变化时返回 None。
+    文件在上次去重之后变大 (增量合并追加了记录) 时从上次的偏移继续；
+    文件变小，或断点之前的内容变了 (被重新生成) 时抛出 ValueError。
+    """
+    row = conn.execute("SELECT offset, done, size, mtime, digest FROM progress WHERE path = ?", (path,)).fetchone()
+    if row is None:
+        return 0
+    offset, done, size, mtime, digest = row
+    offset = offset or 0
+    st = os.stat(path)
+    if done and st.st_size == size and st.st_mtime_ns == mtime:
+        return None
+    name = os.path.basename(path)
+    if st.st_size < max(offset, size or 0):
+        raise ValueError(f"{name} 比上次去重时变小了 ({size} -> {st.st_size} 字节)，"
+                         "文件已被重新生成，请删除输出文件及其 .keys.db 后重跑")
+    if digest is not None and content_digest(path, offset) != digest:
+        raise ValueError(f"{name} 在上次去重的断点 (第 {offset} 字节) 之前的内容变了，"
+                         "文件已被重新生成，请删除输出文件及其 .keys.db 后重跑")
+    return offset
+
+
+def normalize_doi(values):
+    """DOI 标准化：去空格、转小写、去掉 https://doi.org/ 和 doi: 前缀"""
+    return values.str.strip().str.lower().str.replace(DOI_PREFIX_PATTERN, '', regex=True)
+
+
+def record_keys(chunk):
+    """返回 (UT 键, DOI 键) 两个 Series，缺失时为 NaN"""
+    empty = pd.Series(np.nan, index=chunk.index, dtype=object)
+    ut = doi = empty
+    if COL_UT in chunk.columns:
+        values = chunk[COL_UT].str.strip().str.upper()
+        ut = ('ut:' + values).where(values.notna() & (values != ''))
+    if COL_DOI in chunk.columns:
+        values = normalize_doi(chunk[COL_DOI])
+        doi = ('doi:' + values).where(values.notna() & (values != ''))
+    return ut, doi
+
+
+def hash_keys(keys):
+    """键 -> 有符号 64 位整数 (SQLite 的 INTEGER)"""
+    return pd.util.hash_array(keys.to_numpy(dtype=object)).view(np.int64)
+
+
+def _existing_keys(conn, hashes):
+    """hashes 中已在键集合里的；先排序，按 B 树顺序查找"""
+    hashes = sorted(hashes)
+    found = []
+    for i in range(0, len(hashes), IN_BATCH):
+        batch = hashes[i:i + IN_BATCH]
+        marks = ','.join('?' * len(batch))
+        found.extend(r[0] for r in conn.execute(f"SELECT key FROM seen WHERE key IN ({marks})", batch))
+    return found
+
+
+def new_record_mask(conn, chunk):
+    """
+    返回 (保留哪些行的布尔数组, 需要加入键集合的哈希)。
+    有 UT 的行按 UT 判断；没有 UT 的行按 DOI 判断 (与之前保留的所有记录的 DOI 比较)；
+    带 UT 的行如果其 DOI 之前只在没有 UT 的记录中出现过，也视为重复。两者都没有的行全部保留。
+    """
+    ut, doi = record_keys(chunk)
+    has_ut = ut.notna().to_numpy()
+    has_doi = doi.notna().to_numpy()
+    has_key = has_ut | has_doi
+    keep = np.ones(len(chunk), dtype=bool)
+    if not has_key.any():
+        return keep, []
+
+    key_hash = np.zeros(len(chunk), dtype=np.int64)
+    key_hash[has_key] = hash_keys(ut.fillna(doi)[has_key])
+    doi_hash = np.zeros(len(chunk), dtype=np.int64)
+    # 没有 UT 的记录额外登记 "orphan:" 键，之后同一篇论文带 UT 出现时据此识别
+    orphan_hash = np.zeros(len(chunk), dtype=np.int64)
+    if has_doi.any():
+        doi_hash[has_doi] = hash_keys(doi[has_doi])
+        orphan_hash[has_doi] = hash_keys('orphan:' + doi[has_doi])
+    ut_doi = has_ut & has_doi
+    doi_only = has_doi & ~has_ut
+
+    # 块内重复只保留第一条，再排除键集合中已有的
+    first = np.zeros(len(chunk), dtype=bool)
+    first[has_key] = ~pd.Series(key_hash[has_key]).duplicated().to_numpy()
+    lookup = set(key_hash[first].tolist()) | set(orphan_hash[first & ut_doi].tolist())
+    existing = np.array(_existing_keys(conn, list(lookup)), dtype=np.int64)
+    fresh = first & ~np.isin(key_hash, existing)
+    fresh &= ~(ut_doi & np.isin(orphan_hash, existing))
+
+    # 没有 UT 的行：DOI 与本块中保留的带 UT 记录相同也算重复
+    if doi_only.any():
+        fresh &= ~(doi_only & np.isin(doi_hash, doi_hash[fresh & ut_doi]))
+
+    keep[has_key] = fresh[has_key]
+    # 保留的带 UT 记录同时登记其 DOI，之后没有 UT 的同一篇论文也能识别
+    new_keys = (set(key_hash[fresh].tolist()) | set(doi_hash[fresh & ut_doi].tolist())
+                | set(orphan_hash[fresh & doi_only].tolist()))
+    # 按顺序插入，B 树只在尾部附近分裂，比随机插入快得多
+    return keep, [(h,) for h in sorted(new_keys)]
+
+
+def _union_header(files):
+    """所有输入文件表头的并集 (按首次出现的顺序)"""
+    columns = []
+    for path in files:
+        for column in read_csv_header(path) or []:
+            if column not in columns:
+                columns.append(column)
+    return columns
+
+
+def dedup_csv_files(inputs, output_csv, chunk_size=CHUNK_SIZE):
+    """
+    按顺序读取 inputs (合并 CSV 文件或目录)，去重后追加到 output_csv，返回 (读入行数, 写出行数) (累计)。
+    """
+    files = []
+    for source in inputs:
+        files.extend([source] if os.path.isfile(source) else sorted(glob.glob(os.path.join(source, '*.csv'))))
+    files = [os.path.abspath(p) for p in files if os.path.abspath(p) != os.path.abspath(output_csv)]
+
+    conn = open_keyset(keyset_path_for(output_csv))
+    try:
+        size, rows_in, rows_out = conn.execute("SELECT size, rows_in, rows_out FROM output").fetchone()
+        # 去掉上次中断时已写出、但未记入进度的部分
+        if os.path.exists(output_csv) and os.path.getsize(output_csv) > size:
+            with open(output_csv, 'r+b') as f:
+                f.truncate(size)
+        columns = read_csv_header(output_csv) if size else _union_header(files)
+
+        for path in files:
+            offset = resume_offset(conn, path)
+            if offset is None:
+                print(f" [跳过] 已去重: {os.path.basename(path)}")
+                continue
+            print(f" -> 正在去重: {os.path.basename(path)}" + (f" (从第 {offset} 字节继续)" if offset else "") + " ...")
+            st = os.stat(path)
+            for chunk, offset in iter_csv_chunks(path, chunk_size, start_offset=offset, dtype=str):
+                keep, new_keys = new_record_mask(conn, chunk)
+                kept = chunk[keep]
+                extra = [c for c in kept.columns if c not in columns]
+                if extra:
+                    print(f"    警告: 输出中没有这些列，已忽略: {', '.join(extra)}")
+                if not kept.empty:
+                    kept.reindex(columns=columns).to_csv(output_csv, mode='a', index=False, header=(size == 0),
+                                                         encoding='utf-8-sig')
+                    size = os.path.getsize(output_csv)
+                rows_in += len(chunk)
+                rows_out += len(kept)
+                # 键、进度与输出大小在同一个事务中提交
+                with conn:
+                    conn.executemany("INSERT OR IGNORE INTO seen (key) VALUES (?)", new_keys)
+                    conn.execute("INSERT OR REPLACE INTO progress (path, offset, done, size, mtime, digest) "
+                                 "VALUES (?, ?, 0, ?, ?, ?)",
+                                 (path, offset, st.st_size, st.st_mtime_ns, content_digest(path, offset)))
+                    conn.execute("UPDATE output SET size = ?, rows_in = ?, rows_out = ?", (size, rows_in, rows_out))
+            with conn:
+                conn.execute("INSERT OR REPLACE INTO progress (path, offset, done, size, mtime, digest) "
+                             "VALUES (?, ?, 1, ?, ?, ?)",
+                             (path, offset, st.st_size, st.st_mtime_ns, content_digest(path, offset)))
+    finally:
+        conn.close()
+    return rows_in, rows_out
+
+
+if __name__ == '__main__':
+    # 用法: python wos_dedup.py <去重后.csv> <合并 CSV 文件或目录> [...]
+    if len(sys.argv) < 3:
+        print("用法: python wos_dedup.py <去重后.csv> <合并 CSV 文件或目录> [...]")
+        sys.exit(1)
+    try:
+        rows_in, rows_out = dedup_csv_files(sys.argv[2:], sys.argv[1])
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"读入 {rows_in} 行，去重后 {rows_out} 行 (重复 {rows_in - rows_out} 行) -> {sys.argv[1]}")
@@ -31,6 +31,17 @@ except ImportError:
     def merge_wos_exports_to_csv(a, b, delete_originals=False): 
         print("[警告] 未找到合并脚本，跳过合并步骤。")
 
+from wos_partition import (
+    MAX_RECORDS_PER_QUERY, PartitionProbeError, parse_year_range, format_year_range, plan_year_partitions,
+    check_partition_total
+)
+import wos_task_ledger as ledger_db
+from wos_export_verify import (
+    list_export_files, wait_for_new_download, verify_chunk, accept_chunk, reject_chunk, repair_ledger
+)
+from wos_merge_watcher import start_merge_watcher
+from wos_export_fields import FULL_RECORD, resolve_field_profile, select_record_content
+
 # =====================================================
 # 全局配置参数 (请核对路径)
 # =====================================================
@@ -48,6 +59,8 @@ CHROME_DOWNLOAD_DIR = r'C:\Users\admin\Downloads'
 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
 OUTPUT_FILE = os.path.join(DOWNLOAD_DIR, f'WOS_Merged_Results_Final_{timestamp}.csv')
 CSV_FILE_PATH = os.path.join(WORK_DIR, '期刊列表.csv')
+# 任务台账 (SQLite)，旧版 JSON 状态文件仅用于首次迁移
+LEDGER_PATH = os.path.join(DOWNLOAD_DIR, 'wos_tasks.db')
 STATE_FILE_PATH = os.path.join(DOWNLOAD_DIR, 'wos_spider_state.json')
 
 # 爬虫参数
@@ -55,6 +68,25 @@ STATE_FILE_PATH = os.path.join(DOWNLOAD_DIR, 'wos_spider_state.json')
 MAX_EXPORT_PER_CHUNK = 1000
 WAIT_TIMEOUT = 40
 PAUSE_TIME = 5
+# 结果数超过 MAX_RECORDS_PER_QUERY 时按 PY 自动切分，计数探针失败的重试次数
+PROBE_RETRIES = 2
+# run_search 的结果状态
+SEARCH_OK = 'ok'
+SEARCH_EMPTY = 'empty'      # 检索成功但无结果
+SEARCH_FAILED = 'failed'    # 语法报错、超时或页面异常
+# 每个块下载完成后校验行数；等待下载文件出现的超时和单块最多尝试次数
+DOWNLOAD_WAIT_TIMEOUT = 120
+MAX_TASK_ATTEMPTS = 3
+# 分区检索 (或读取结果数) 连续失败这么多次后，该分区标记为失败，下次运行再导出
+PARTITION_SEARCH_ATTEMPTS = 3
+# 导出格式: 'excel' (.xls) / 'tab' (Tab delimited, .txt) / 'plain' (Plain text 字段标签, .txt)
+# 纯文本格式由 wos_record_parser.py 流式解析，合并和校验比 .xls 快得多，推荐 'tab'
+EXPORT_FORMAT = 'excel'
+# 导出字段配置 (见 wos_export_fields.FIELD_PROFILES): 'full' 为全记录；
+# 'journal_year' / 'address_year' 等通过 Custom selection 只导出下游分析需要的字段
+FIELD_PROFILE = 'full'
+# 导出过程中由后台线程把校验通过的块随时合并到 OUTPUT_FILE (False 则仍在结束时一次性合并)
+BACKGROUND_MERGE = True
 
 # =====================================================
 # XPATH 定义
@@ -65,11 +97,19 @@ XPATH_SEARCH_BTN_RESULT = '//button[@aria-label="Search"]'
 XPATH_TOTAL_RECORDS_COUNT = '//h1[contains(@class, "search-info-title")]/span[@class="brand-blue"]'
 XPATH_EXPORT_BUTTON = '//button[@id="export-trigger-btn"]'
 XPATH_EXPORT_TO_EXCEL = '//button[@id="exportToExcelButton"]'
+XPATH_EXPORT_TO_TAB = '//button[@id="exportToTabWinButton"]'
+XPATH_EXPORT_TO_PLAIN_TEXT = '//button[@id="exportToFieldTaggedButton"]'
+# EXPORT_FORMAT -> 导出菜单中的按钮
+EXPORT_FORMAT_BUTTONS = {
+    'excel': XPATH_EXPORT_TO_EXCEL,
+    'tab': XPATH_EXPORT_TO_TAB,
+    'plain': XPATH_EXPORT_TO_PLAIN_TEXT,
+}
 XPATH_CONTENT_DROPDOWN_BUTTON = '//wos-select/button[@aria-haspopup="listbox"]'
-XPATH_CONTENT_FULL_RECORD_OPTION = '//div[@aria-label="Full Record"]'
 XPATH_FINAL_EXPORT_BUTTON = '//button[@id="exportButton"]'
 
 # [新增] 搜索错误提示框 (红色报错条)
+XPATH_NO_RECORDS = "//div[contains(text(), 'No records match your query')]"
 XPATH_SEARCH_ERROR_ALERT = '//div[contains(@class, "error-code") and @role="alert"]'
 
 # =====================================================
@@ -110,31 +150,6 @@ def setup_logger(log_dir):
 
 logger = logging.getLogger('wos_spider_init') 
 
-# =====================================================
-# 状态管理函数
-# =====================================================
-def load_state():
-    if not os.path.exists(STATE_FILE_PATH):
-        return {"kw_index": 0, "start_record": 1}
-    try:
-        with open(STATE_FILE_PATH, 'r', encoding='utf-8') as f:
-            content = f.read().strip()
-            if not content: return {"kw_index": 0, "start_record": 1}
-            data = json.loads(content)
-            logger.info(f"检测到断点：第 {data.get('kw_index', 0)+1} 个关键词，记录起始 {data.get('start_record', 1)}")
-            return data
-    except Exception as e:
-        logger.warning(f"读取状态文件失败，将从头开始: {e}")
-        return {"kw_index": 0, "start_record": 1}
-
-def save_state(kw_index, start_record):
-    data = {"kw_index": kw_index, "start_record": start_record}
-    try:
-        with open(STATE_FILE_PATH, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=4)
-    except Exception as e:
-        logger.error(f"保存进度失败: {e}")
-
 # =====================================================
 # 辅助功能函数
 # =====================================================
@@ -189,10 +204,16 @@ def force_set_range(driver, start_record, end_record):
 # =====================================================
 # 核心业务逻辑 (已更新)
 # =====================================================
-def perform_search(driver, wait, keyword):
-    
+def run_search(driver, wait, keyword, year_range=None):
+    """
+    检索并返回结果状态: SEARCH_OK / SEARCH_EMPTY (检索成功但无结果) / SEARCH_FAILED
+    year_range: 追加 PY 年份区间限制 (用于分区检索)
+    """
     query = re.sub(r'\b(AND|OR|NOT)\b', lambda m: m.group(1).lower(), keyword)
-    search_query = f'SO={query}'
+    if year_range:
+        search_query = f'SO=({query}) AND PY=({year_range})'
+    else:
+        search_query = f'SO={query}'
     logger.info(f"正在检索: {search_query}")
 
     old_records_element = None
@@ -228,10 +249,10 @@ def perform_search(driver, wait, keyword):
                 result_btn[0].click()
             else:
                 logger.error("未找到搜索按钮！")
-                return False
+                return SEARCH_FAILED
         except Exception as e:
             logger.error(f"点击搜索按钮失败: {e}")
-            return False
+            return SEARCH_FAILED
 
         if old_records_element:
             try:
@@ -261,7 +282,7 @@ def perform_search(driver, wait, keyword):
             
             # 3. 检查无结果提示 (No records found)
             # 这种情况下页面不会报错，但也没有总数，需要单独识别
-            no_records = d.find_elements(By.XPATH, "//div[contains(text(), 'No records match your query')]")
+            no_records = d.find_elements(By.XPATH, XPATH_NO_RECORDS)
             if no_records and no_records[0].is_displayed():
                 return "NO_RECORDS"
 
@@ -279,15 +300,15 @@ def perform_search(driver, wait, keyword):
                     driver.refresh()
                     time.sleep(3) 
                 except: pass
-                return False
+                return SEARCH_FAILED
 
             elif status == "NO_RECORDS":
                 logger.warning(f" >>> [跳过] 关键词 {keyword} 搜索成功但无结果。")
-                return False 
+                return SEARCH_EMPTY 
 
             elif status == "SUCCESS":
                 logger.info(" >>> [成功] 结果页面已加载")
-                return True
+                return SEARCH_OK
 
         except TimeoutException:
             logger.error(f" >>> [失败] 搜索响应超时 ({WAIT_TIMEOUT}秒内未检测到明确状态)")
@@ -296,13 +317,18 @@ def perform_search(driver, wait, keyword):
                 driver.refresh()
                 time.sleep(3)
             except: pass
-            return False
+            return SEARCH_FAILED
 
     except Exception as e:
         logger.error(f"搜索过程异常: {e}")
-        return False
+        return SEARCH_FAILED
 
-def get_total_records(wait):
+def perform_search(driver, wait, keyword, year_range=None):
+    """检索成功且有结果时返回 True"""
+    return run_search(driver, wait, keyword, year_range) == SEARCH_OK
+
+def get_total_records(wait, strict=False):
+    """strict=True 时读取失败抛出异常，否则按 0 返回"""
     try:
         # 这里的等待时间可以缩短了，因为 perform_search 已经确认页面加载好了
         element = wait.until(EC.visibility_of_element_located((By.XPATH, XPATH_TOTAL_RECORDS_COUNT)))
@@ -311,9 +337,68 @@ def get_total_records(wait):
         logger.info(f"总记录数：{total}")
         return total
     except Exception as e:
+        if strict:
+            raise
         logger.warning(f"无法获取总记录数 (可能为0或元素未加载): {e}")
         return 0
 
+def count_records(driver, wait, keyword, first_year, last_year):
+    """
+    计数探针：按年份区间检索，返回记录数。
+    只有页面明确提示无结果时才返回 0；检索失败、读不到总数时重试，仍失败则抛出 PartitionProbeError
+    (不能按 0 处理，否则父区间的记录会全部算到另一半上，切分结果错误)。
+    """
+    years = format_year_range(first_year, last_year)
+    for attempt in range(PROBE_RETRIES):
+        status = run_search(driver, wait, keyword, year_range=years)
+        if status == SEARCH_EMPTY:
+            return 0
+        if status == SEARCH_OK:
+            try:
+                return get_total_records(wait, strict=True)
+            except Exception as e:
+                logger.warning(f"计数探针 PY=({years}) 读取总数失败: {e}")
+        time.sleep(3)
+    raise PartitionProbeError(f"计数探针 PY=({years}) 连续 {PROBE_RETRIES} 次失败")
+
+def search_partition(driver, wait, keyword, years):
+    """
+    检索一个分区并读取结果数；页面明确提示无结果时返回 0。
+    检索失败或读不到结果数时重试，连续 PARTITION_SEARCH_ATTEMPTS 次失败返回 None
+    (不能按 0 处理，否则分区没有任何任务就被标记完成，记录全部丢失)。
+    """
+    for attempt in range(PARTITION_SEARCH_ATTEMPTS):
+        status = run_search(driver, wait, keyword, year_range=years)
+        if status == SEARCH_EMPTY:
+            return 0
+        if status == SEARCH_OK:
+            try:
+                return get_total_records(wait, strict=True)
+            except Exception as e:
+                logger.warning(f"分区 PY=({years or '全部'}) 读取结果数失败: {e}")
+        logger.error(f"分区 PY=({years or '全部'}) 检索失败 ({attempt + 1}/{PARTITION_SEARCH_ATTEMPTS})，等待 10秒后重试...")
+        time.sleep(10)
+    return None
+
+def plan_keyword_partitions(driver, wait, keyword, total_records):
+    """
+    结果数未超过上限时返回单个分区 (years=None 表示不加年份限制)；
+    否则按 PY 递归切分，直到每个分区都不超过 MAX_RECORDS_PER_QUERY。
+    """
+    if total_records <= MAX_RECORDS_PER_QUERY:
+        return [{"years": None, "count": total_records}]
+
+    logger.info(f"结果数 {total_records} 超过上限 {MAX_RECORDS_PER_QUERY}，开始按 PY 自动切分...")
+    first_year, last_year = parse_year_range(None)
+    partitions = plan_year_partitions(
+        lambda a, b: count_records(driver, wait, keyword, a, b),
+        first_year, last_year, total=total_records
+    )
+    logger.info(f"切分完成，共 {len(partitions)} 个分区: " +
+                ", ".join(f"PY={p['years']}({p['count']})" for p in partitions))
+    check_partition_total(partitions, total_records)
+    return partitions
+
 def export_record_range(driver, wait, keyword, chunk_index, start_record, end_record):
     """
     导出单个块，使用智能等待检测窗口消失
@@ -325,9 +410,9 @@ def export_record_range(driver, wait, keyword, chunk_index, start_record, end_re
         driver.execute_script("arguments[0].click();", export_button)
         time.sleep(1) 
 
-        # 2. Excel 选项
-        excel_button = wait.until(EC.element_to_be_clickable((By.XPATH, XPATH_EXPORT_TO_EXCEL)))
-        driver.execute_script("arguments[0].click();", excel_button)
+        # 2. 导出格式选项 (EXPORT_FORMAT)
+        format_button = wait.until(EC.element_to_be_clickable((By.XPATH, EXPORT_FORMAT_BUTTONS[EXPORT_FORMAT])))
+        driver.execute_script("arguments[0].click();", format_button)
         
         # 3. 等待弹窗出现
         wait.until(EC.visibility_of_element_located((By.TAG_NAME, "app-export-out-details")))
@@ -342,16 +427,16 @@ def export_record_range(driver, wait, keyword, chunk_index, start_record, end_re
         # 5. 输入范围
         force_set_range(driver, start_record, end_record)
 
-        # 6. 下拉选全记录
+        # 6. 下拉选择记录内容 (FIELD_PROFILE)
         try:
             dropdown = wait.until(EC.element_to_be_clickable((By.XPATH, XPATH_CONTENT_DROPDOWN_BUTTON)))
             dropdown.click()
             time.sleep(0.5)
-            full_record = wait.until(EC.element_to_be_clickable((By.XPATH, XPATH_CONTENT_FULL_RECORD_OPTION)))
-            full_record.click()
-            time.sleep(0.5)
+            select_record_content(driver, wait, FIELD_PROFILE)
         except:
-            pass 
+            # 全记录选择失败时沿用弹窗当前选项；自定义字段选择失败则本块失败，避免导出缺列的文件
+            if resolve_field_profile(FIELD_PROFILE)[0] != FULL_RECORD:
+                raise
 
         # 7. 最终导出
         final_btn = wait.until(EC.element_to_be_clickable((By.XPATH, XPATH_FINAL_EXPORT_BUTTON)))
@@ -377,6 +462,7 @@ def export_record_range(driver, wait, keyword, chunk_index, start_record, end_re
             logger.warning(" >>> [超时] 等待窗口关闭超过30秒，尝试按ESC...")
             ActionChains(driver).send_keys(Keys.ESCAPE).perform()
             time.sleep(2)
+            # 下载可能已经触发，是否真正完成交给 run_range_task 按行数校验
             return True
             
     except Exception as e:
@@ -385,10 +471,44 @@ def export_record_range(driver, wait, keyword, chunk_index, start_record, end_re
         time.sleep(2)
         return False
 
+def run_range_task(driver, wait, ledger, keyword, years, task):
+    """
+    导出一个记录范围并校验：下载完成后统计行数，与 end_record - start_record + 1 比较。
+    校验通过的文件重命名并记入台账；不通过的移入 _rejected 并标记失败，等待重新导出。
+    """
+    start_record, end_record = task['start_record'], task['end_record']
+    expected = end_record - start_record + 1
+    chunk_index = (start_record - 1) // MAX_EXPORT_PER_CHUNK + 1
+
+    before = list_export_files(CHROME_DOWNLOAD_DIR)
+    started = ledger_db.mark_task_running(ledger, task['id'])
+    if not export_record_range(driver, wait, keyword, chunk_index, start_record, end_record):
+        ledger_db.mark_task_failed(ledger, task['id'], "export_record_range 失败", started)
+        return False
+
+    path = wait_for_new_download(CHROME_DOWNLOAD_DIR, before, timeout=DOWNLOAD_WAIT_TIMEOUT)
+    if path is None:
+        logger.warning(f" >>> [校验失败] {DOWNLOAD_WAIT_TIMEOUT}秒内未检测到下载文件")
+        ledger_db.mark_task_failed(ledger, task['id'], "未检测到下载文件", started)
+        return False
+
+    ok, rows = verify_chunk(path, start_record, end_record)
+    if not ok:
+        logger.warning(f" >>> [校验失败] 期望 {expected} 行，实际 {rows} 行，文件移入 _rejected")
+        reject_chunk(path)
+        ledger_db.mark_task_failed(ledger, task['id'], f"行数不符: 期望 {expected}，实际 {rows}", started)
+        return False
+
+    path = accept_chunk(path, keyword, years, start_record, end_record)
+    ledger_db.mark_task_done(ledger, task['id'], started, path, rows)
+    logger.info(f" >>> [校验通过] {rows} 行 -> {os.path.basename(path)}")
+    return True
+
 # =====================================================
 # 主任务
 # =====================================================
-def main_task():
+def main_task(repair=False):
+    """repair=True (命令行 --repair)：先按台账复核已导出的块，只重新导出缺口"""
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='ignore', line_buffering=True)
     sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='ignore', line_buffering=True)
     
@@ -399,9 +519,20 @@ def main_task():
     keywords = read_keywords(CSV_FILE_PATH)
     if not keywords: return
 
-    state = load_state()
-    start_kw_index = state['kw_index']
-    resume_record_start = state['start_record']
+    ledger = ledger_db.open_ledger(LEDGER_PATH)
+    ledger_db.register_keywords(ledger, keywords)
+    imported, resume_record = ledger_db.import_json_state(ledger, keywords, STATE_FILE_PATH, MAX_EXPORT_PER_CHUNK)
+    if imported:
+        logger.info(f"已从旧版状态文件迁移进度：前 {imported} 个关键词标记为完成")
+    if resume_record > 1:
+        logger.info(f"第 {imported + 1} 个关键词从记录 {resume_record} 继续导出")
+    if repair:
+        logger.info("=== --repair 模式：复核已导出的块 ===")
+        repair_ledger(ledger)
+    resume_mode = ledger_db.has_progress(ledger)
+    if resume_mode:
+        summary = ledger_db.ledger_summary(ledger)
+        logger.info(f"检测到台账进度: 关键词 {summary['keywords']}，任务 {summary['tasks']}")
 
     try:
         driver = setup_driver(DOWNLOAD_DIR)
@@ -411,7 +542,7 @@ def main_task():
         logger.critical(f"浏览器连接失败: {e}")
         return
 
-    if start_kw_index == 0:
+    if not resume_mode:
         try:
             driver.get(WOS_URL_ROOT)
             logger.info("请手动登录 WOS。页面加载完毕后，按 Enter 键开始...")
@@ -421,58 +552,113 @@ def main_task():
         logger.info("断点模式启动，请确保浏览器在 WOS 页面，按 Enter 继续...")
         input()
 
+    merge_watcher = None
+    if BACKGROUND_MERGE:
+        merge_watcher = start_merge_watcher(CHROME_DOWNLOAD_DIR, OUTPUT_FILE, delete_originals=True)
+
     try:
         for idx, keyword in enumerate(keywords):
-            if idx < start_kw_index:
+            kw_status = ledger_db.get_keyword_status(ledger, keyword)
+            if kw_status in (ledger_db.KW_DONE, ledger_db.KW_EMPTY, ledger_db.KW_SKIPPED):
                 continue
             
             logger.info(f"{'='*40}")
             logger.info(f"进度: {idx+1}/{len(keywords)} - 关键词: 【{keyword}】")
             logger.info(f"{'='*40}")
 
-            # 搜索
-            if not perform_search(driver, wait, keyword):
-                logger.warning(f"搜索 {keyword} 失败或被跳过")
-                save_state(idx + 1, 1)
-                continue
+            partitions = ledger_db.load_partitions(ledger, keyword)
+            on_result_page = False
 
-            # 获取数量
-            total_records = get_total_records(wait)
-            if total_records == 0:
-                logger.warning(f"关键词 {keyword} 结果为 0，跳过")
-                save_state(idx + 1, 1)
-                continue
+            # 首次处理该关键词：整体检索一次，判断是否需要按 PY 切分
+            if not partitions:
+                if not perform_search(driver, wait, keyword):
+                    logger.warning(f"搜索 {keyword} 失败或被跳过")
+                    ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_SKIPPED)
+                    continue
 
-            current_start_record = resume_record_start if idx == start_kw_index else 1
-            if idx != start_kw_index: resume_record_start = 1
-            
-            chunk_index = (current_start_record // MAX_EXPORT_PER_CHUNK) + 1
-
-            while current_start_record <= total_records:
-                end_record = min(current_start_record + MAX_EXPORT_PER_CHUNK - 1, total_records)
-                
-                success = export_record_range(driver, wait, keyword, chunk_index, current_start_record, end_record)
-                
-                if success:
-                    next_start = end_record + 1
-                    save_state(idx, next_start)
-                    current_start_record = next_start
-                    chunk_index += 1
-                    
-                    if current_start_record <= total_records:
+                try:
+                    total_records = get_total_records(wait, strict=True)
+                except Exception as e:
+                    logger.error(f"关键词 {keyword} 读取结果数失败，下次运行重试: {e}")
+                    continue
+                if total_records == 0:
+                    logger.warning(f"关键词 {keyword} 结果为 0，跳过")
+                    ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_EMPTY, 0)
+                    continue
+
+                try:
+                    partitions = plan_keyword_partitions(driver, wait, keyword, total_records)
+                except PartitionProbeError as e:
+                    logger.error(f"关键词 {keyword} 切分失败，不保存切分结果，下次运行重新切分: {e}")
+                    continue
+                ledger_db.save_partitions(ledger, keyword, partitions)
+                ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_PLANNED, total_records)
+                partitions = ledger_db.load_partitions(ledger, keyword)
+                on_result_page = (len(partitions) == 1)
+
+            # 逐个分区导出
+            part_index = 0
+            while part_index < len(partitions):
+                partition = partitions[part_index]
+                part_label = f"PY={partition['years']}" if partition['years'] else "全部"
+                if partition['status'] == ledger_db.TASK_DONE:
+                    part_index += 1
+                    continue
+                logger.info(f"--- 分区 {part_index+1}/{len(partitions)}: {part_label} ---")
+
+                if not on_result_page:
+                    total_records = search_partition(driver, wait, keyword, partition['years'])
+                    if total_records is None:
+                        logger.error(f"分区 {part_label} 连续 {PARTITION_SEARCH_ATTEMPTS} 次检索失败，标记为失败，下次运行重新导出")
+                        ledger_db.set_partition_status(ledger, keyword, partition['years'], ledger_db.TASK_FAILED)
+                        part_index += 1
+                        continue
+                on_result_page = False
+
+                # 单个年份仍超过上限时只能导出前 MAX_RECORDS_PER_QUERY 条，差额记入台账 (shortfall)
+                exportable = min(total_records, MAX_RECORDS_PER_QUERY)
+                ledger_db.set_partition_total(ledger, keyword, partition['years'], total_records, exportable)
+                if exportable < total_records:
+                    logger.warning(f"分区 {part_label} 有 {total_records} 条，超过导出上限，"
+                                   f"{total_records - exportable} 条无法导出 (已记入台账)")
+                ledger_db.add_range_tasks(ledger, keyword, partition['years'], exportable, MAX_EXPORT_PER_CHUNK)
+                tasks = ledger_db.open_tasks(ledger, keyword, partition['years'])
+                if tasks and tasks[0]['start_record'] > 1:
+                    logger.info(f"断点恢复：从记录 {tasks[0]['start_record']} 继续 (剩余 {len(tasks)} 块)")
+
+                for task_no, task in enumerate(tasks):
+                    for attempt in range(MAX_TASK_ATTEMPTS):
+                        if run_range_task(driver, wait, ledger, keyword, partition['years'], task):
+                            break
+                        logger.error("导出失败，等待 10秒后重试当前块...")
+                        time.sleep(10)
+                    else:
+                        logger.error(f"块 {task['start_record']}-{task['end_record']} 连续 {MAX_TASK_ATTEMPTS} 次失败，"
+                                     f"保留在台账中等待重新导出")
+
+                    if task_no < len(tasks) - 1:
                         time.sleep(random.uniform(2, 4)) 
+
+                gaps = ledger_db.open_tasks(ledger, keyword, partition['years'])
+                if gaps:
+                    logger.warning(f"分区 {part_label} 还有 {len(gaps)} 个块未通过校验，下次运行或 --repair 时重新导出")
                 else:
-                    logger.error("导出失败，等待 10秒后重试当前块...")
-                    time.sleep(10)
+                    ledger_db.set_partition_status(ledger, keyword, partition['years'], ledger_db.TASK_DONE)
+                part_index += 1
+            
+            if any(p['status'] != ledger_db.TASK_DONE for p in ledger_db.load_partitions(ledger, keyword)):
+                logger.warning(f"关键词 {keyword} 存在未完成的块，稍后重新导出")
+                continue
 
             logger.info(f"关键词 {keyword} 完成")
-            save_state(idx + 1, 1)
-            start_kw_index = -1 
+            ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_DONE)
             time.sleep(2)
 
         logger.info("所有关键词处理完毕！")
-        if os.path.exists(STATE_FILE_PATH):
-            os.remove(STATE_FILE_PATH)
+        summary = ledger_db.ledger_summary(ledger)
+        logger.info(f"台账汇总: 关键词 {summary['keywords']}，任务 {summary['tasks']}")
+        for kw, years, total, shortfall in ledger_db.truncated_partitions(ledger):
+            logger.warning(f"超过导出上限: {kw} PY={years or '全部'} 结果 {total} 条，缺少 {shortfall} 条")
             
     except KeyboardInterrupt:
         logger.info("用户中断 (Ctrl+C)，进度已保存")
@@ -482,10 +668,14 @@ def main_task():
     finally:
         logger.info("尝试合并文件...")
         try:
-            merge_wos_exports_to_csv(CHROME_DOWNLOAD_DIR, OUTPUT_FILE, delete_originals=True)
+            if merge_watcher is not None:
+                # 大部分块已在导出过程中合并，这里只处理剩余文件
+                merge_watcher.stop()
+            else:
+                merge_wos_exports_to_csv(CHROME_DOWNLOAD_DIR, OUTPUT_FILE, delete_originals=True)
             logger.info(f"合并完成: {OUTPUT_FILE}")
         except Exception as e:
             logger.error(f"合并失败: {e}")
 
 if __name__ == "__main__":
-    main_task()
\ No newline at end of file
+    main_task(repair='--repair' in sys.argv)
\ No newline at end of file
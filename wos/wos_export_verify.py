@@ -0,0 +1,168 @@
+# -*- coding: utf-8 -*-
+# WOS 导出块校验
+# 每个块下载完成后统计记录数，与 end_record - start_record + 1 比较；
+# 不一致的块从下载目录移走并重新排队，避免合并结果出现空洞或重复。
+# repair_ledger() 用于 --repair 模式：按台账逐块复核，只重新导出缺口。
+
+import os
+import re
+import time
+import hashlib
+import shutil
+import logging
+
+import wos_task_ledger as ledger_db
+
+# 下载中的临时文件后缀 (Chrome)
+PARTIAL_SUFFIXES = ('.crdownload', '.tmp', '.part')
+# 校验失败的块移动到下载目录下的这个子目录
+REJECTED_SUBDIR = '_rejected'
+
+logger = logging.getLogger('wos_spider')
+
+
+# =====================================================
+# 下载检测
+# =====================================================
+def list_export_files(download_dir):
+    """下载目录中已完成的 savedrecs* 文件名集合"""
+    try:
+        names = os.listdir(download_dir)
+    except FileNotFoundError:
+        return set()
+    return {n for n in names
+            if n.lower().startswith('savedrecs') and not n.lower().endswith(PARTIAL_SUFFIXES)}
+
+
+def wait_for_new_download(download_dir, before, timeout=120, poll=1.0):
+    """
+    等待下载目录中出现 before 之外的新 savedrecs 文件，且文件大小稳定。
+    返回新文件的完整路径，超时返回 None。
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        new_files = sorted(list_export_files(download_dir) - before)
+        if new_files:
+            path = os.path.join(download_dir, new_files[0])
+            try:
+                size1 = os.path.getsize(path)
+                time.sleep(poll)
+                size2 = os.path.getsize(path)
+            except OSError:
+                continue
+            if size1 == size2 and size1 > 0:
+                return path
+        time.sleep(poll)
+    return None
+
+
+# =====================================================
+# 记录数统计
+# =====================================================
+def count_export_records(path):
+    """统计一个导出块中的记录数 (不含表头)，无法读取时返回 None"""
+    if path.lower().endswith('.txt'):
+        # Tab delimited / Plain text 导出直接流式计数，不经过 pandas
+        from wos_record_parser import count_export_records as count_text_records
+        try:
+            return count_text_records(path)
+        except (OSError, UnicodeError):
+            return None
+
+    # 按真实格式逐行计数，不构造 DataFrame
+    from combine_wos_export import count_excel_rows
+    return count_excel_rows(path)
+
+
+def chunk_file_name(keyword, years, start_record, end_record, ext, copy=0):
+    """
+    校验通过的块重命名为 savedrecs_<关键词>_<关键词哈希>_PY<年份>_<起>-<止>.<ext>，
+    保留 savedrecs 前缀，合并脚本仍能匹配到。关键词只保留字母数字且截断到 60 个字符，
+    前缀相同、只差标点或全是中文的关键词靠哈希区分。copy > 0 时在记录范围前加 _dup<copy>。
+    """
+    safe_kw = re.sub(r'[^0-9A-Za-z]+', '_', keyword).strip('_')[:60]
+    digest = hashlib.sha1(keyword.encode('utf-8')).hexdigest()[:8]
+    prefix = f"savedrecs_{safe_kw}_{digest}" if safe_kw else f"savedrecs_{digest}"
+    safe_years = f"_PY{years}" if years else ""
+    dup = f"_dup{copy}" if copy else ""
+    return f"{prefix}{safe_years}{dup}_{start_record}-{end_record}{ext}"
+
+
+def verify_chunk(path, start_record, end_record):
+    """返回 (是否一致, 实际行数)"""
+    expected = end_record - start_record + 1
+    rows = count_export_records(path)
+    return rows == expected, rows
+
+
+def accept_chunk(path, keyword, years, start_record, end_record, target_dir=None):
+    """
+    校验通过：重命名 (target_dir 为空时留在原目录)，返回新路径。
+    同名的块已存在 (同一范围被重新导出，旧块还没合并) 时不覆盖，另取 _dup<n> 的文件名；
+    内容相同的块在合并时按内容哈希跳过。
+    """
+    ext = os.path.splitext(path)[1]
+    target_dir = target_dir or os.path.dirname(path)
+    copy = 0
+    while True:
+        new_path = os.path.join(target_dir, chunk_file_name(keyword, years, start_record, end_record, ext, copy))
+        if not os.path.exists(new_path):
+            break
+        copy += 1
+    # 标签页下载目录与 Chrome 下载目录可能不在同一磁盘，用 shutil.move
+    shutil.move(path, new_path)
+    return new_path
+
+
+def reject_chunk(path):
+    """校验失败：移入 _rejected 子目录，避免被合并"""
+    rejected_dir = os.path.join(os.path.dirname(path), REJECTED_SUBDIR)
+    if not os.path.exists(rejected_dir):
+        os.makedirs(rejected_dir)
+    target = os.path.join(rejected_dir, f"{int(time.time())}_{os.path.basename(path)}")
+    shutil.move(path, target)
+    return target
+
+
+# =====================================================
+# --repair：按台账复核已完成的块
+# =====================================================
+def repair_ledger(conn):
+    """
+    复核台账中所有已完成的块：
+      - 输出文件仍在：重新统计行数
+      - 输出文件已被合并删除：使用导出时记录的行数
+      - 行数与记录范围不一致：重新排队
+      - 文件已删除且没有行数记录 (校验功能上线前的块)：无法复核，只计数
+    最后把未完成关键词的领取次数清零，多 profile 进程池可以重新领取。
+    返回重新排队的块数。
+    """
+    requeued = 0
+    unverified = 0
+    for task in ledger_db.done_tasks(conn):
+        expected = task['end_record'] - task['start_record'] + 1
+        output_file = task['output_file']
+        rows = task['row_count']
+
+        if output_file and os.path.exists(output_file):
+            rows = count_export_records(output_file)
+        elif rows is None:
+            # 校验功能上线前完成的块，既没有文件也没有行数，无法复核
+            unverified += 1
+            continue
+
+        if rows != expected:
+            logger.warning(f"[缺口] {task['keyword']} PY={task['years'] or '全部'} "
+                           f"{task['start_record']}-{task['end_record']}: 期望 {expected} 行，实际 {rows}")
+            if output_file and os.path.exists(output_file):
+                reject_chunk(output_file)
+            ledger_db.requeue_task(conn, task['id'], f"行数不符: 期望 {expected}，实际 {rows}")
+            requeued += 1
+
+    if unverified:
+        logger.info(f"{unverified} 个早期完成的块没有输出文件和行数记录，未复核")
+    reset = ledger_db.reset_claims(conn)
+    if reset:
+        logger.info(f"{reset} 个未完成关键词的领取次数已清零")
+    logger.info(f"复核完成，{requeued} 个块重新排队")
+    return requeued
@@ -0,0 +1,351 @@
+# -*- coding: utf-8 -*-
+# 声明式筛选 / 抽取
+# 每个业务问题 (某省某年的论文、某批期刊、某种文献类型 ...) 不再复制一份脚本改常量，而是写一个 JSON 筛选配置:
+#   python wos_filter.py <筛选配置.json>
+# 条件按开销从小到大执行 (出版年 -> 文献类型 -> 期刊 -> 地址)，每一步只处理上一步留下的行；
+# 只读取条件和输出中用到的列。输入可以是合并后的 CSV (文件或目录)，也可以是 combine_wos_export 输出的
+# Parquet 数据集 (出版年条件直接裁剪分区)；结果输出为 CSV 或 Parquet 目录。
+# 进度记录在 <输出>.progress.json 中 (CSV 输入精确到块的字节偏移)，中断后用同一配置重新运行即从断点继续。
+#
+# 配置示例 (与 get_jiangsu_2025.py 相同的筛选):
+# {
+#     "input": "E:/wos_spider/WOS_Exported_Files",
+#     "output": "E:/wos_spider/jiangsu_2024.csv",
+#     "output_format": "csv",
+#     "columns": null,
+#     "where": {
+#         "year": {"min": 2024, "max": 2024},
+#         "doc_types": ["Article", "Review"],
+#         "journals": {"file": "中科院1区期刊.csv", "file_column": "Journal Name"},
+#         "region": {"province": "Jiangsu"}
+#     }
+# }
+# where 中每个条件都可选；写成对象时可用 "column" 指定要筛选的列 (默认为 WOS 导出的列名)，
+# 列表类条件写成对象时值放在 "values" 中，期刊名单也可以从 CSV 文件的某一列读取。
+
+import os
+import sys
+import glob
+import json
+
+import numpy as np
+import pandas as pd
+
+from wos_chunk_reader import iter_csv_chunks
+from wos_gazetteer import get_region_matcher, remove_author_brackets
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = ds = pq = None
+
+# 默认列名 (WOS Excel 导出 / combine_wos_export 合并后的列名)
+COL_YEAR = 'Publication Year'
+COL_DOC_TYPE = 'Document Type'
+COL_JOURNAL = 'Source Title'
+COL_ADDRESSES = 'Addresses'
+
+CHUNK_SIZE = 50000
+OUTPUT_FORMATS = ('csv', 'parquet')
+
+
+def normalize_values(values):
+    """去首尾空格并转小写 (与 analysis_SO_nums.normalize_name 一致)"""
+    return pd.Index(values).astype(str).str.strip().str.lower()
+
+
+class YearRange:
+    """出版年范围 (闭区间)，spec: {"min": 2021, "max": 2026} / [2021, 2026] / 2024"""
+    cost = 0
+
+    def __init__(self, spec, column=COL_YEAR):
+        if isinstance(spec, dict):
+            self.min, self.max = spec.get('min'), spec.get('max')
+        elif isinstance(spec, (list, tuple)):
+            self.min, self.max = spec
+        else:
+            self.min = self.max = spec
+        self.column = column
+
+    def mask(self, values):
+        year = pd.to_numeric(values, errors='coerce').to_numpy(dtype=float)
+        keep = ~np.isnan(year)
+        if self.min is not None:
+            keep &= year >= self.min
+        if self.max is not None:
+            keep &= year <= self.max
+        return keep
+
+    def arrow_filter(self):
+        """Parquet 输入时下推到数据集 (按年份分区时直接跳过不需要的分区)"""
+        expr = None
+        field = ds.field(self.column)
+        for bound in ((field >= self.min) if self.min is not None else None,
+                      (field <= self.max) if self.max is not None else None):
+            if bound is not None:
+                expr = bound if expr is None else expr & bound
+        return expr
+
+
+class ValueSet:
+    """
+    列值属于给定集合 (忽略大小写和首尾空格)。
+    multi=True 时单元格按 "; " 拆分，任一部分属于集合即可 (如 Document Type 的 "Article; Early Access")。
+    """
+
+    def __init__(self, values, column, multi=False, cost=1):
+        self.values = set(normalize_values(values))
+        self.column = column
+        self.multi = multi
+        self.cost = cost
+
+    def mask(self, values):
+        # 只对不重复的值做标准化和判断，再按编码映射回每一行
+        codes, uniques = pd.factorize(values)
+        if self.multi:
+            hit = np.array([any(part.strip().lower() in self.values for part in str(v).split(';')) for v in uniques],
+                           dtype=bool)
+        else:
+            hit = normalize_values(uniques).isin(self.values)
+        hit = np.append(np.asarray(hit, dtype=bool), False)    # 编码 -1 (空值) 不匹配
+        return hit[codes]
+
+    def arrow_filter(self):
+        return None
+
+
+class Region:
+    """地址中出现某省或其下辖城市 (见 wos_gazetteer.py)，spec: {"province": "Jiangsu", "gazetteer_file": null}"""
+    cost = 2
+
+    def __init__(self, spec, column=COL_ADDRESSES):
+        if isinstance(spec, str):
+            spec = {"province": spec}
+        self.matcher = get_region_matcher(spec['province'], spec.get('gazetteer_file'))
+        self.column = column
+
+    def mask(self, values):
+        return self.matcher.contains(remove_author_brackets(values)).to_numpy(dtype=bool)
+
+    def arrow_filter(self):
+        return None
+
+
+def split_spec(spec, default_column):
+    """条件写成对象时取出 "column"，返回 (条件, 列名)"""
+    if isinstance(spec, dict) and 'column' in spec:
+        spec = dict(spec)
+        return spec, spec.pop('column')
+    return spec, default_column
+
+
+def load_value_list(spec):
+    """值列表：列表，{"values": [...]}，或 {"file": CSV 路径, "file_column": 列名}"""
+    if isinstance(spec, dict) and 'file' in spec:
+        column = spec['file_column']
+        return pd.read_csv(spec['file'], usecols=[column])[column].dropna().tolist()
+    if isinstance(spec, dict):
+        return list(spec['values'])
+    return list(spec)
+
+
+def compile_predicates(where):
+    """把 where 配置编译成条件列表，按开销从小到大排序"""
+    where = dict(where or {})
+    predicates = []
+    if 'year' in where:
+        predicates.append(YearRange(*split_spec(where.pop('year'), COL_YEAR)))
+    if 'doc_types' in where:
+        spec, column = split_spec(where.pop('doc_types'), COL_DOC_TYPE)
+        predicates.append(ValueSet(load_value_list(spec), column, multi=True, cost=1))
+    if 'journals' in where:
+        spec, column = split_spec(where.pop('journals'), COL_JOURNAL)
+        predicates.append(ValueSet(load_value_list(spec), column, cost=1.5))
+    if 'region' in where:
+        predicates.append(Region(*split_spec(where.pop('region'), COL_ADDRESSES)))
+    if where:
+        raise ValueError(f"未知的筛选条件: {', '.join(where)}")
+    return sorted(predicates, key=lambda p: p.cost)
+
+
+def apply_predicates(df, predicates):
+    """依次执行条件，每一步只处理上一步留下的行"""
+    for predicate in predicates:
+        if df.empty:
+            break
+        df = df[predicate.mask(df[predicate.column])]
+    return df
+
+
+def referenced_columns(predicates, columns):
+    """需要读取的列；输出全部列时返回 None"""
+    if columns is None:
+        return None
+    needed = list(columns)
+    for predicate in predicates:
+        if predicate.column not in needed:
+            needed.append(predicate.column)
+    return needed
+
+
+def resolve_input(path):
+    """返回 ('csv', [文件...]) 或 ('parquet', 数据集目录)"""
+    if os.path.isfile(path):
+        if path.lower().endswith('.parquet'):
+            return 'parquet', path
+        return 'csv', [path]
+    csv_files = sorted(glob.glob(os.path.join(path, '*.csv')))
+    if csv_files:
+        return 'csv', csv_files
+    if glob.glob(os.path.join(path, '**', '*.parquet'), recursive=True):
+        return 'parquet', path
+    raise FileNotFoundError(f"输入中没有 CSV 或 Parquet 文件: {path}")
+
+
+def progress_path_for(output):
+    return output.rstrip('/\\') + '.progress.json'
+
+
+class FilterJob:
+    """一次筛选任务：按配置逐块读取、筛选并写出，进度写入 <输出>.progress.json"""
+
+    def __init__(self, spec):
+        self.spec = spec
+        self.output = spec['output']
+        self.output_format = spec.get('output_format', 'csv')
+        if self.output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"不支持的输出格式: {self.output_format}，可选: {', '.join(OUTPUT_FORMATS)}")
+        if self.output_format == 'parquet' and pa is None:
+            raise ImportError("输出 Parquet 需要安装 pyarrow")
+        self.columns = spec.get('columns')
+        self.predicates = compile_predicates(spec.get('where'))
+        self.read_columns = referenced_columns(self.predicates, self.columns)
+        self.chunk_size = spec.get('chunk_size', CHUNK_SIZE)
+        self.progress_path = progress_path_for(self.output)
+        # Parquet 输出的列类型：CSV 输入全部为字符串，Parquet 输入沿用数据集中的类型
+        self.source_types = {}
+        self.arrow_schema = None
+        self.state = self._load_progress()
+
+    # ---------- 进度 ----------
+    def _spec_key(self):
+        return {k: self.spec.get(k) for k in ('input', 'output_format', 'columns', 'where')}
+
+    def _load_progress(self):
+        if os.path.exists(self.progress_path):
+            with open(self.progress_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('spec') != self._spec_key():
+                raise ValueError(f"筛选配置与已有进度不一致，请删除 {self.output} 和 {self.progress_path} 后重新运行")
+            self._rollback(state)
+            return state
+        if os.path.exists(self.output):
+            raise FileExistsError(f"输出已存在且没有进度记录: {self.output}")
+        return {"spec": self._spec_key(), "finished_files": [], "current_file": None, "offset": None,
+                "rows_out": 0, "output_size": 0, "parts": 0}
+
+    def _rollback(self, state):
+        """去掉上次中断时已写出、但未记入进度的部分 (保证不重复)"""
+        if self.output_format == 'csv':
+            if os.path.exists(self.output) and os.path.getsize(self.output) > state['output_size']:
+                with open(self.output, 'r+b') as f:
+                    f.truncate(state['output_size'])
+        elif os.path.isdir(self.output):
+            for name in os.listdir(self.output):
+                if name.startswith('part-') and int(name[5:10]) >= state['parts']:
+                    os.remove(os.path.join(self.output, name))
+
+    def _save_progress(self):
+        tmp_path = self.progress_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.progress_path)
+
+    # ---------- 输出 ----------
+    def _write(self, df):
+        if self.columns is not None:
+            df = df[self.columns]
+        if df.empty:
+            return
+        if self.output_format == 'csv':
+            df.to_csv(self.output, mode='a', index=False, header=(self.state['output_size'] == 0),
+                      encoding='utf-8-sig')
+            self.state['output_size'] = os.path.getsize(self.output)
+        else:
+            os.makedirs(self.output, exist_ok=True)
+            # 各 part 使用同一 schema (某块整列为空时不会被推断成 null / float 类型)
+            if self.arrow_schema is None:
+                self.arrow_schema = pa.schema([(c, self.source_types.get(c, pa.string())) for c in df.columns])
+            table = pa.Table.from_pandas(df, schema=self.arrow_schema, preserve_index=False)
+            part_path = os.path.join(self.output, f"part-{self.state['parts']:05d}.parquet")
+            pq.write_table(table.replace_schema_metadata(None), part_path)
+            self.state['parts'] += 1
+        self.state['rows_out'] += len(df)
+
+    # ---------- 输入 ----------
+    def _run_csv(self, files):
+        for file_path in files:
+            file_name = os.path.basename(file_path)
+            if file_name in self.state['finished_files']:
+                print(f" [跳过] 已完成文件: {file_name}")
+                continue
+            start_offset = self.state['offset'] if file_name == self.state['current_file'] else None
+            print(f" -> 正在处理文件: {file_name} ...")
+            # 所有列按字符串读入，输出与原文件一致，也省去类型推断
+            for chunk, offset in iter_csv_chunks(file_path, self.chunk_size, start_offset=start_offset,
+                                                 usecols=self.read_columns, dtype=str):
+                self._write(apply_predicates(chunk, self.predicates))
+                self.state['current_file'], self.state['offset'] = file_name, offset
+                self._save_progress()
+            self._finish_file(file_name)
+
+    def _run_parquet(self, path):
+        dataset = ds.dataset(path, format='parquet', partitioning='hive')
+        self.source_types = {field.name: field.type for field in dataset.schema}
+        pushdown = None
+        for predicate in self.predicates:
+            expr = predicate.arrow_filter()
+            if expr is not None:
+                pushdown = expr if pushdown is None else pushdown & expr
+        for fragment in sorted(dataset.get_fragments(filter=pushdown), key=lambda f: f.path):
+            if fragment.path in self.state['finished_files']:
+                continue
+            print(f" -> 正在处理: {fragment.path} ...")
+            for batch in fragment.to_batches(schema=dataset.schema, columns=self.read_columns, filter=pushdown,
+                                             batch_size=self.chunk_size):
+                self._write(apply_predicates(batch.to_pandas(), self.predicates))
+            self._finish_file(fragment.path)
+
+    def _finish_file(self, name):
+        self.state['finished_files'].append(name)
+        self.state['current_file'], self.state['offset'] = None, None
+        self._save_progress()
+
+    def run(self):
+        kind, source = resolve_input(self.spec['input'])
+        if kind == 'parquet':
+            if ds is None:
+                raise ImportError("读取 Parquet 需要安装 pyarrow")
+            self._run_parquet(source)
+        else:
+            self._run_csv(source)
+        print(f"筛选完成，共 {self.state['rows_out']} 行 -> {self.output}")
+        return self.state['rows_out']
+
+
+def run_filter(spec):
+    """按筛选配置 (dict 或 JSON 文件路径) 执行，返回输出行数"""
+    if isinstance(spec, str):
+        with open(spec, 'r', encoding='utf-8') as f:
+            spec = json.load(f)
+    return FilterJob(spec).run()
+
+
+if __name__ == '__main__':
+    # 用法: python wos_filter.py <筛选配置.json>
+    if len(sys.argv) < 2:
+        print("用法: python wos_filter.py <筛选配置.json>")
+        sys.exit(1)
+    run_filter(sys.argv[1])
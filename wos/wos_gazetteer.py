@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+# 地址地区匹配 (省 -> 地级市 地名表)
+# WOS 的 Addresses (C1) 形如 "[Li, X] Nanjing Univ, Nanjing 210093, Jiangsu, Peoples R China"。
+# 按地名表把一个省及其下辖城市编译成一个多模式匹配器：安装了 pyahocorasick 时用 Aho-Corasick 自动机，
+# 否则用按前缀树合并的单个正则；两种方式都先把文本转为小写，再按整词匹配 (前后不能是 WORD_CHARS 中的字符)。
+# 地名表可通过 JSON 文件 ({"省名": ["城市", ...]}) 补充或覆盖，见 load_gazetteer。
+
+import re
+import json
+from functools import lru_cache
+
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+# 内置地名表 (WOS 地址中的英文写法)；未列出的省份请用 JSON 文件补充
+GAZETTEER = {
+    "Jiangsu": [
+        "Nanjing",      # 南京
+        "Suzhou",       # 苏州
+        "Wuxi",         # 无锡
+        "Xuzhou",       # 徐州
+        "Changzhou",    # 常州
+        "Nantong",      # 南通
+        "Lianyungang",  # 连云港
+        "Huai'an", "Huaian",  # 淮安
+        "Yancheng",     # 盐城
+        "Yangzhou",     # 扬州
+        "Zhenjiang",    # 镇江
+        "Taizhou",      # 泰州
+        "Suqian",       # 宿迁
+    ],
+    "Zhejiang": [
+        "Hangzhou", "Ningbo", "Wenzhou", "Jiaxing", "Huzhou", "Shaoxing",
+        "Jinhua", "Quzhou", "Zhoushan", "Taizhou", "Lishui",
+    ],
+    "Guangdong": [
+        "Guangzhou", "Shenzhen", "Zhuhai", "Shantou", "Foshan", "Shaoguan", "Zhanjiang",
+        "Zhaoqing", "Jiangmen", "Maoming", "Huizhou", "Meizhou", "Shanwei", "Heyuan",
+        "Yangjiang", "Qingyuan", "Dongguan", "Zhongshan", "Chaozhou", "Jieyang", "Yunfu",
+    ],
+    "Shandong": [
+        "Jinan", "Qingdao", "Zibo", "Zaozhuang", "Dongying", "Yantai", "Weifang", "Jining",
+        "Tai'an", "Taian", "Weihai", "Rizhao", "Linyi", "Dezhou", "Liaocheng", "Binzhou", "Heze",
+    ],
+    "Hubei": [
+        "Wuhan", "Huangshi", "Shiyan", "Yichang", "Xiangyang", "Ezhou", "Jingmen",
+        "Xiaogan", "Jingzhou", "Huanggang", "Xianning", "Suizhou", "Enshi",
+    ],
+    # 直辖市
+    "Beijing": [],
+    "Shanghai": [],
+    "Tianjin": [],
+    "Chongqing": [],
+}
+
+# 省级行政区 (WOS 地址中的英文写法)，wos_affiliation_index.py 用来识别地址中的省份
+CHINA_PROVINCES = (
+    "Anhui", "Beijing", "Chongqing", "Fujian", "Gansu", "Guangdong", "Guangxi", "Guizhou", "Hainan",
+    "Hebei", "Heilongjiang", "Henan", "Hubei", "Hunan", "Inner Mongolia", "Jiangsu", "Jiangxi", "Jilin",
+    "Liaoning", "Ningxia", "Qinghai", "Shaanxi", "Shandong", "Shanghai", "Shanxi", "Sichuan", "Tianjin",
+    "Tibet", "Xinjiang", "Yunnan", "Zhejiang", "Hong Kong", "Macau", "Taiwan",
+)
+# 直辖市：地址中省级这一段就是城市
+CHINA_MUNICIPALITIES = ("Beijing", "Shanghai", "Tianjin", "Chongqing")
+
+# 地址中作者姓名部分 "[Li, X; Wang, Y]"
+AUTHOR_BRACKET_PATTERN = r'\[[^\]]*\]'
+
+# 整词边界：地名前后不能紧挨这些字符 (小写后比较)。正则和自动机共用这一个定义，两种后端的匹配结果一致
+WORD_CHARS = frozenset('0123456789abcdefghijklmnopqrstuvwxyz')
+
+
+def load_gazetteer(path=None):
+    """内置地名表；path 指定的 JSON 文件中的省份会覆盖同名省份"""
+    gazetteer = {province: list(cities) for province, cities in GAZETTEER.items()}
+    if path:
+        with open(path, 'r', encoding='utf-8') as f:
+            gazetteer.update(json.load(f))
+    return gazetteer
+
+
+def region_names(province, gazetteer=None):
+    """省名 + 下辖城市名"""
+    gazetteer = gazetteer if gazetteer is not None else GAZETTEER
+    if province not in gazetteer:
+        raise ValueError(f"地名表中没有该省份: {province}，可选: {', '.join(gazetteer)}")
+    return [province] + list(gazetteer[province])
+
+
+def city_province_map(gazetteer=None):
+    """城市名 (小写) -> 省名；同名城市属于多个省份 (如 Taizhou) 时不收录"""
+    gazetteer = gazetteer if gazetteer is not None else GAZETTEER
+    mapping = {}
+    ambiguous = set()
+    for province, cities in gazetteer.items():
+        for city in [province] + list(cities):
+            key = city.lower()
+            if mapping.get(key, province) != province:
+                ambiguous.add(key)
+            mapping[key] = province
+    for key in ambiguous:
+        del mapping[key]
+    return mapping
+
+
+def remove_author_brackets(addresses):
+    """去除地址中的 [作者] 部分 (向量化)，空值变为空字符串"""
+    return addresses.fillna('').astype(str).str.replace(AUTHOR_BRACKET_PATTERN, '', regex=True)
+
+
+def trie_regex(words):
+    """把一组词按前缀树合并成一个正则 (公共前缀只匹配一次)"""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[''] = True
+
+    def build(node):
+        branches = [re.escape(ch) + build(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        if '' in node:
+            body = (body if len(branches) > 1 else '(?:' + body + ')') + '?'
+        return body
+
+    return build(trie)
+
+
+class RegionMatcher:
+    """一组地名的整词、大小写无关匹配"""
+
+    def __init__(self, names):
+        self.names = sorted({name.lower() for name in names if name})
+        if not self.names:
+            raise ValueError("地名列表为空")
+        word = '[' + re.escape(''.join(sorted(WORD_CHARS))) + ']'
+        self.pattern = re.compile(r'(?<!' + word + r')(?:' + trie_regex(self.names) + r')(?!' + word + r')')
+        self.automaton = None
+        if ahocorasick is not None:
+            self.automaton = ahocorasick.Automaton()
+            for name in self.names:
+                self.automaton.add_word(name, len(name))
+            self.automaton.make_automaton()
+
+    def _search_automaton(self, text):
+        text = text.lower()
+        n = len(text)
+        for end, length in self.automaton.iter(text):
+            start = end - length + 1
+            if (start == 0 or text[start - 1] not in WORD_CHARS) and (end + 1 == n or text[end + 1] not in WORD_CHARS):
+                return True
+        return False
+
+    def search(self, text):
+        """text 中是否出现任一地名"""
+        if self.automaton is not None:
+            return self._search_automaton(text)
+        return self.pattern.search(text.lower()) is not None
+
+    def contains(self, series):
+        """对字符串 Series 逐个判断，返回布尔 Series"""
+        if self.automaton is not None:
+            return series.map(self._search_automaton, na_action='ignore').fillna(False).astype(bool)
+        return series.str.lower().str.contains(self.pattern, na=False)
+
+
+@lru_cache(maxsize=None)
+def get_region_matcher(province, gazetteer_file=None):
+    """按省份构建 (并缓存) 匹配器，子进程中重复调用不会重复编译"""
+    return RegionMatcher(region_names(province, load_gazetteer(gazetteer_file)))
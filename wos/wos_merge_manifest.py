@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+# 合并清单 (<合并文件>.manifest.jsonl)
+# 每合并一个导出文件追加一行: 路径、大小、mtime、内容哈希、行数。
+# 再次合并同一目录时，路径/大小/mtime 未变的文件直接跳过 (不读文件)，
+# 其余文件按内容哈希判断是否已合并过 (被重命名的重复文件也会跳过)，只追加新文件。
+
+import os
+import csv
+import json
+import hashlib
+from datetime import datetime
+
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def manifest_path_for(output_csv):
+    return output_csv + '.manifest.jsonl'
+
+
+def file_hash(file_path):
+    """文件内容哈希 (blake2b)"""
+    h = hashlib.blake2b(digest_size=16)
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def read_csv_header(output_csv):
+    """已有合并文件的表头 (续写时沿用)，文件不存在或为空时返回 None"""
+    if not os.path.exists(output_csv) or os.path.getsize(output_csv) == 0:
+        return None
+    with open(output_csv, 'r', encoding='utf-8-sig', newline='') as f:
+        return next(csv.reader(f), None)
+
+
+class MergeManifest:
+    """一个合并文件对应的已合并清单"""
+
+    def __init__(self, output_csv):
+        self.path = manifest_path_for(output_csv)
+        self.by_stat = {}
+        self.by_hash = {}
+        self.total_rows = 0
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # 中断时写了一半的最后一行
+                    continue
+                self._index(entry)
+
+    def _index(self, entry):
+        self.by_stat[(entry.get('path'), entry.get('size'), entry.get('mtime'))] = entry
+        if entry.get('hash'):
+            self.by_hash[entry['hash']] = entry
+        self.total_rows += entry.get('rows', 0)
+
+    def __len__(self):
+        return len(self.by_hash)
+
+    def reset(self):
+        """合并文件重新生成时清空清单"""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.by_stat, self.by_hash, self.total_rows = {}, {}, 0
+
+    @staticmethod
+    def _stat_key(file_path):
+        st = os.stat(file_path)
+        return os.path.abspath(file_path), st.st_size, st.st_mtime_ns
+
+    def check(self, file_path):
+        """
+        返回 (是否已合并, 内容哈希)。路径、大小、mtime 都与清单一致时不读文件。
+        """
+        entry = self.by_stat.get(self._stat_key(file_path))
+        if entry is not None:
+            return True, entry.get('hash')
+        digest = file_hash(file_path)
+        return digest in self.by_hash, digest
+
+    def record(self, file_path, rows, digest=None):
+        """记录一个已追加到合并文件的导出文件 (应在删除原文件之前调用)"""
+        path, size, mtime = self._stat_key(file_path)
+        entry = {
+            "path": path,
+            "file": os.path.basename(file_path),
+            "size": size,
+            "mtime": mtime,
+            "hash": digest or file_hash(file_path),
+            "rows": rows,
+            "merged_at": datetime.now().isoformat(timespec='seconds'),
+        }
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        self._index(entry)
+        return entry
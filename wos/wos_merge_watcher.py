@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+# WOS 导出块后台合并
+# 导出过程中由后台线程定期扫描下载目录，把已通过校验的块 (savedrecs_<关键词>_PY<年份>_<起>-<止>.ext)
+# 立即追加到合并 CSV，并在 <合并文件>.manifest.jsonl (见 wos_merge_manifest.py) 中记录已合并的文件；
+# 导出结束时只需处理最后几块，不再在 finally 中串行转换成千上万个文件。
+# 只合并校验通过的块；结束时目录中剩下的原始 savedrecs 文件 (已判定失败的任务迟到的下载、写到一半的文件)
+# 对应的任务会重新导出，合并它们会带来重复或残缺的行，因此移入 _unverified 子目录留待人工检查。
+
+import os
+import re
+import time
+import shutil
+import logging
+import threading
+
+from wos_export_verify import list_export_files
+from wos_merge_manifest import MergeManifest, read_csv_header
+
+# 扫描间隔 (秒)
+MERGE_POLL_INTERVAL = 15
+# 文件最后修改后至少经过多少秒才合并 (跨磁盘 shutil.move 是先复制后改 mtime，避免读到半个文件)
+MERGE_SETTLE_SECONDS = 5
+# 校验通过后重命名的块 (见 wos_export_verify.chunk_file_name)
+ACCEPTED_CHUNK_PATTERN = re.compile(r'^savedrecs_.+_\d+-\d+\.(xls|xlsx|txt)$', re.IGNORECASE)
+# 结束时未通过校验的原始 savedrecs 文件移到下载目录下的这个子目录，不合并
+UNVERIFIED_SUBDIR = '_unverified'
+
+logger = logging.getLogger('wos_spider')
+
+
+class MergeWatcher(threading.Thread):
+    """
+    后台合并线程：start() 后每 interval 秒合并一次新完成的块；
+    stop() 停止扫描并做最后一次合并 (同样只合并校验通过的块)，其余 savedrecs 文件移入 _unverified。
+    """
+
+    def __init__(self, input_folder, output_csv, delete_originals=True, interval=MERGE_POLL_INTERVAL):
+        super().__init__(name='merge-watcher', daemon=True)
+        self.input_folder = input_folder
+        self.output_csv = output_csv
+        self.delete_originals = delete_originals
+        self.interval = interval
+        self.manifest = MergeManifest(output_csv)
+        self.header_columns = read_csv_header(output_csv)
+        if self.header_columns is None:
+            self.manifest.reset()
+        self._stop_event = threading.Event()
+        self._lock = threading.Lock()
+
+    def run(self):
+        logger.info(f"[后台合并] 启动，监视 {self.input_folder} -> {self.output_csv}")
+        while not self._stop_event.wait(self.interval):
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"[后台合并] 扫描出错: {e}")
+
+    def stop(self, final_sweep=True):
+        """停止后台扫描；final_sweep 时合并剩余的校验通过的块，并隔离未校验的文件。返回合并总行数"""
+        self._stop_event.set()
+        if self.is_alive():
+            self.join()
+        if final_sweep:
+            # 等最后一块的移动完成，不跳过刚写入的文件
+            time.sleep(MERGE_SETTLE_SECONDS)
+            self.sweep()
+            self.quarantine_unverified()
+        logger.info(f"[后台合并] 结束，共合并 {len(self.manifest)} 个文件，{self.manifest.total_rows} 行")
+        return self.manifest.total_rows
+
+    def pending_files(self):
+        """待合并的校验通过的块 (按名称排序)"""
+        now = time.time()
+        names = []
+        for name in sorted(list_export_files(self.input_folder)):
+            if not ACCEPTED_CHUNK_PATTERN.match(name):
+                # 刚下载、尚未校验的原始 savedrecs 文件
+                continue
+            path = os.path.join(self.input_folder, name)
+            try:
+                if now - os.path.getmtime(path) < MERGE_SETTLE_SECONDS:
+                    continue
+            except OSError:
+                continue
+            names.append(name)
+        return names
+
+    def sweep(self):
+        """合并一轮，返回本轮合并的文件数"""
+        from combine_wos_export import append_export_to_csv
+
+        with self._lock:
+            count = 0
+            for name in self.pending_files():
+                path = os.path.join(self.input_folder, name)
+                merged, digest = self.manifest.check(path)
+                if not merged:
+                    try:
+                        rows, self.header_columns = append_export_to_csv(
+                            path, self.output_csv, self.header_columns, write_header=(self.header_columns is None)
+                        )
+                    except Exception as e:
+                        logger.error(f"[后台合并] 无法读取 {name}: {e}")
+                        continue
+                    self.manifest.record(path, rows, digest)
+                    count += 1
+                    logger.info(f"[后台合并] {name} ({rows} 行)，累计 {self.manifest.total_rows} 行")
+
+                if self.delete_originals:
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        logger.warning(f"[后台合并] 删除失败: {name}")
+            return count
+
+    def quarantine_unverified(self):
+        """把未通过校验的原始 savedrecs 文件移入 _unverified 子目录，返回移动的文件数"""
+        names = [n for n in sorted(list_export_files(self.input_folder)) if not ACCEPTED_CHUNK_PATTERN.match(n)]
+        if not names:
+            return 0
+        target_dir = os.path.join(self.input_folder, UNVERIFIED_SUBDIR)
+        os.makedirs(target_dir, exist_ok=True)
+        for name in names:
+            try:
+                shutil.move(os.path.join(self.input_folder, name),
+                            os.path.join(target_dir, f"{int(time.time())}_{name}"))
+            except OSError as e:
+                logger.warning(f"[后台合并] 移动未校验文件失败: {name}: {e}")
+        logger.warning(f"[后台合并] {len(names)} 个未通过校验的 savedrecs 文件未合并，已移入 {target_dir}")
+        return len(names)
+
+
+def start_merge_watcher(input_folder, output_csv, delete_originals=True):
+    """创建并启动后台合并线程"""
+    output_dir = os.path.dirname(output_csv)
+    if output_dir and not os.path.exists(output_dir):
+        os.makedirs(output_dir)
+    watcher = MergeWatcher(input_folder, output_csv, delete_originals=delete_originals)
+    watcher.start()
+    return watcher
@@ -0,0 +1,298 @@
+# -*- coding: utf-8 -*-
+# Web of Science (WOS) 多标签页并行导出 (基于 v4 高级检索脚本)
+# 主标签页负责检索和 PY 切分；同一个已登录的浏览器里再开 TAB_COUNT 个标签页，
+# 打开同一个结果集 URL，从任务台账 (wos_tasks.db) 中各自领取不重叠的 markFrom/markTo 范围并行导出。
+# 每个标签页的下载单独路由到 tab_downloads/tabN，文件不会互相覆盖或被误认。
+
+import os
+import io
+import sys
+import time
+import random
+import threading
+import traceback
+from selenium import webdriver
+from selenium.webdriver.chrome.options import Options
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.webdriver.support import expected_conditions as EC
+
+import wos_export_by_advanced_search as v4
+import wos_task_ledger as ledger_db
+from combine_wos_export import merge_wos_exports_to_csv
+from wos_merge_watcher import start_merge_watcher
+
+# =====================================================
+# 全局配置参数 (其余路径/参数沿用 wos_export_by_advanced_search.py)
+# =====================================================
+# 并行导出的标签页数量 (不含主标签页)
+TAB_COUNT = 4
+# 手动启动的 Chrome 调试地址
+DEBUGGER_ADDRESS = "127.0.0.1:9222"
+# 每个标签页的下载目录 tab_downloads/tab1, tab2 ...
+TAB_DOWNLOAD_ROOT = os.path.join(v4.DOWNLOAD_DIR, 'tab_downloads')
+# 标签页之间错开启动，避免同时打开结果页
+TAB_START_INTERVAL = 3
+
+# 一个浏览器 (profile) 的并行导出配置；多 profile 进程池 (wos_worker_pool.py) 为每个浏览器各建一份
+DEFAULT_PROFILE = {
+    "name": "",                           # worker 名称前缀，同时用于区分下载目录
+    "debugger_address": DEBUGGER_ADDRESS,
+    "tab_count": TAB_COUNT,
+    "download_root": TAB_DOWNLOAD_ROOT,   # 标签页下载目录的根目录
+    "main_download_dir": None,            # 主标签页下载目录 (None 表示 Chrome 默认下载目录)
+}
+
+logger = v4.logger
+
+
+def attach_driver(debugger_address=DEBUGGER_ADDRESS):
+    """连接手动启动的 Chrome；每个线程各自持有一个 webdriver 会话"""
+    chrome_options = Options()
+    chrome_options.add_experimental_option("debuggerAddress", debugger_address)
+    return webdriver.Chrome(options=chrome_options)
+
+
+def route_downloads(driver, download_dir):
+    """把当前标签页的下载重定向到 download_dir (仅作用于该标签页)"""
+    if not os.path.exists(download_dir):
+        os.makedirs(download_dir)
+    driver.execute_cdp_cmd("Page.setDownloadBehavior", {
+        "behavior": "allow",
+        "downloadPath": os.path.abspath(download_dir),
+    })
+
+
+# =====================================================
+# 标签页 worker
+# =====================================================
+def tab_worker(tab_no, result_url, keyword, years, profile=DEFAULT_PROFILE):
+    """
+    在新标签页中打开结果集，循环领取同一分区的范围任务直到领完。
+    失败的任务留在台账中 (失败次数达到上限后不再领取)，由主标签页兜底。
+    """
+    worker = f"{profile['name']}tab{tab_no}"
+    tab_dir = os.path.join(profile['download_root'], worker)
+    conn = ledger_db.open_ledger(v4.LEDGER_PATH)
+    driver = None
+    exported = 0
+    try:
+        time.sleep((tab_no - 1) * TAB_START_INTERVAL)
+        driver = attach_driver(profile['debugger_address'])
+        driver.switch_to.new_window('tab')
+        route_downloads(driver, tab_dir)
+        driver.get(result_url)
+        wait = WebDriverWait(driver, v4.WAIT_TIMEOUT)
+        wait.until(EC.visibility_of_element_located((By.XPATH, v4.XPATH_TOTAL_RECORDS_COUNT)))
+        logger.info(f"[{worker}] 结果页已打开，开始领取任务")
+
+        while True:
+            task = ledger_db.claim_next_task(conn, worker, keyword=keyword, years=years,
+                                             max_attempts=v4.MAX_TASK_ATTEMPTS)
+            if task is None:
+                break
+            logger.info(f"[{worker}] 领取块 {task['start_record']}-{task['end_record']}")
+            if v4.run_range_task(driver, wait, conn, keyword, years, task,
+                                 download_dir=tab_dir, worker=worker):
+                exported += 1
+                time.sleep(random.uniform(2, 4))
+            else:
+                time.sleep(10)
+
+    except Exception as e:
+        logger.error(f"[{worker}] 标签页异常退出: {e}")
+        logger.error(traceback.format_exc())
+    finally:
+        if driver is not None:
+            try: driver.close()
+            except: pass
+        conn.close()
+        logger.info(f"[{worker}] 结束，共导出 {exported} 块")
+
+
+def export_partition_parallel(driver, wait, ledger, keyword, years, total_records, profile=DEFAULT_PROFILE):
+    """
+    主标签页已处于该分区的结果页：登记范围任务，启动多个标签页并行导出，
+    最后由主标签页补导标签页没完成的块。返回剩余未完成的块数。
+    """
+    ledger_db.add_range_tasks(ledger, keyword, years, total_records, v4.MAX_EXPORT_PER_CHUNK)
+    # 上次中断时处于 running 的块重新排队
+    for task in ledger_db.open_tasks(ledger, keyword, years):
+        if task['status'] == ledger_db.TASK_RUNNING:
+            ledger_db.requeue_task(ledger, task['id'], "上次运行中断", reset_claims=False)
+
+    open_count = len(ledger_db.open_tasks(ledger, keyword, years))
+    tab_count = min(profile['tab_count'], open_count)
+    if tab_count > 0:
+        result_url = driver.current_url
+        logger.info(f"启动 {tab_count} 个标签页并行导出 {open_count} 个块: {result_url}")
+        threads = [threading.Thread(target=tab_worker, args=(i + 1, result_url, keyword, years, profile),
+                                    daemon=True)
+                   for i in range(tab_count)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+    # 主标签页兜底：标签页异常退出或多次失败的块在这里串行补导
+    for task in ledger_db.open_tasks(ledger, keyword, years):
+        logger.info(f"主标签页补导块 {task['start_record']}-{task['end_record']}")
+        for attempt in range(v4.MAX_TASK_ATTEMPTS):
+            if v4.run_range_task(driver, wait, ledger, keyword, years, task,
+                                 download_dir=profile['main_download_dir'], worker=f"{profile['name']}main"):
+                break
+            time.sleep(10)
+
+    return len(ledger_db.open_tasks(ledger, keyword, years))
+
+
+def export_keyword(driver, wait, ledger, keyword, profile=DEFAULT_PROFILE, should_stop=None):
+    """
+    导出一个关键词：首次处理时检索并按 PY 切分，然后逐个分区并行导出。
+    should_stop: 可选的回调，返回 True 时在分区之间停止 (例如租约丢失)。
+    返回该关键词是否已全部完成。
+    """
+    partitions = ledger_db.load_partitions(ledger, keyword)
+    on_result_page = False
+
+    if not partitions:
+        if not v4.perform_search(driver, wait, keyword):
+            logger.warning(f"搜索 {keyword} 失败或无结果，保存跳过状态")
+            ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_SKIPPED)
+            return False
+
+        try:
+            total_records = v4.get_total_records(wait, strict=True)
+        except Exception as e:
+            logger.error(f"关键词 {keyword} 读取结果数失败，稍后重试: {e}")
+            return False
+        if total_records == 0:
+            logger.warning(f"关键词 {keyword} 结果为 0，跳过")
+            ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_EMPTY, 0)
+            try: driver.get(v4.WOS_URL_ROOT)
+            except: pass
+            return False
+
+        try:
+            partitions = v4.plan_keyword_partitions(driver, wait, keyword, total_records)
+        except v4.PartitionProbeError as e:
+            logger.error(f"关键词 {keyword} 切分失败，不保存切分结果，稍后重新切分: {e}")
+            return False
+        ledger_db.save_partitions(ledger, keyword, partitions)
+        ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_PLANNED, total_records)
+        partitions = ledger_db.load_partitions(ledger, keyword)
+        on_result_page = (len(partitions) == 1)
+
+    for part_index, partition in enumerate(partitions):
+        if partition['status'] == ledger_db.TASK_DONE:
+            continue
+        if should_stop is not None and should_stop():
+            logger.warning(f"关键词 {keyword} 被要求停止，剩余分区交给其他 worker")
+            return False
+        part_label = f"PY={partition['years']}" if partition['years'] else "全部"
+        logger.info(f"--- 分区 {part_index+1}/{len(partitions)}: {part_label} ---")
+
+        if not on_result_page:
+            # 读不到结果数时不能按 0 处理，否则没有任何块就把分区标记完成
+            total_records = v4.search_partition(driver, wait, keyword, partition['years'])
+            if total_records is None:
+                logger.error(f"分区 {part_label} 连续 {v4.PARTITION_SEARCH_ATTEMPTS} 次检索失败，标记为失败，稍后重新导出")
+                ledger_db.set_partition_status(ledger, keyword, partition['years'], ledger_db.TASK_FAILED)
+                continue
+        on_result_page = False
+
+        exportable = min(total_records, v4.MAX_RECORDS_PER_QUERY)
+        ledger_db.set_partition_total(ledger, keyword, partition['years'], total_records, exportable)
+        if exportable < total_records:
+            logger.warning(f"分区 {part_label} 有 {total_records} 条，超过导出上限，"
+                           f"{total_records - exportable} 条无法导出 (已记入台账)")
+        gaps = export_partition_parallel(driver, wait, ledger, keyword, partition['years'], exportable, profile)
+        if gaps:
+            logger.warning(f"分区 {part_label} 还有 {gaps} 个块未通过校验，下次运行或 --repair 时重新导出")
+        else:
+            ledger_db.set_partition_status(ledger, keyword, partition['years'], ledger_db.TASK_DONE)
+
+    if any(p['status'] != ledger_db.TASK_DONE for p in ledger_db.load_partitions(ledger, keyword)):
+        logger.warning(f"关键词 {keyword} 存在未完成的块，稍后重新导出")
+        return False
+
+    logger.info(f"关键词 {keyword} 完成")
+    ledger_db.set_keyword_status(ledger, keyword, ledger_db.KW_DONE)
+    return True
+
+
+# =====================================================
+# 主任务
+# =====================================================
+def main_task():
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='ignore', line_buffering=True)
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='ignore', line_buffering=True)
+
+    global logger
+    logger = v4.logger = v4.setup_logger(v4.DOWNLOAD_DIR)
+    logger.info(f"=== 脚本启动 (多标签页并行导出, {TAB_COUNT} 个标签页) ===")
+
+    keywords = v4.read_keywords(v4.CSV_FILE_PATH)
+    if not keywords: return
+
+    ledger = ledger_db.open_ledger(v4.LEDGER_PATH)
+    ledger_db.register_keywords(ledger, keywords)
+
+    try:
+        driver = attach_driver()
+        wait = WebDriverWait(driver, v4.WAIT_TIMEOUT)
+        logger.info("浏览器连接成功")
+    except Exception as e:
+        logger.critical(f"浏览器连接失败: {e}")
+        return
+
+    try:
+        driver.get(v4.WOS_URL_ROOT)
+    except: pass
+    logger.info("请确认已登录 WOS 且看到 Advanced Search 页面，按 Enter 键开始...")
+    input()
+
+    merge_watcher = None
+    if v4.BACKGROUND_MERGE:
+        merge_watcher = start_merge_watcher(v4.CHROME_DOWNLOAD_DIR, v4.OUTPUT_FILE, delete_originals=True)
+
+    try:
+        for idx, keyword in enumerate(keywords):
+            kw_status = ledger_db.get_keyword_status(ledger, keyword)
+            if kw_status in (ledger_db.KW_DONE, ledger_db.KW_EMPTY, ledger_db.KW_SKIPPED):
+                continue
+
+            logger.info(f"{'='*40}")
+            logger.info(f"进度: {idx+1}/{len(keywords)} - 期刊: 【{keyword}】")
+            logger.info(f"{'='*40}")
+
+            export_keyword(driver, wait, ledger, keyword)
+
+            try:
+                driver.get(v4.WOS_URL_ROOT)
+                time.sleep(2)
+            except: pass
+
+        summary = ledger_db.ledger_summary(ledger)
+        logger.info(f"台账汇总: 关键词 {summary['keywords']}，任务 {summary['tasks']}")
+
+    except KeyboardInterrupt:
+        logger.info("用户中断 (Ctrl+C)，进度已保存")
+    except Exception as e:
+        logger.critical("发生未捕获异常")
+        logger.error(traceback.format_exc())
+    finally:
+        logger.info("尝试合并文件...")
+        try:
+            if merge_watcher is not None:
+                # 大部分块已在导出过程中合并，这里只处理剩余文件
+                merge_watcher.stop()
+            else:
+                merge_wos_exports_to_csv(v4.CHROME_DOWNLOAD_DIR, v4.OUTPUT_FILE, delete_originals=True)
+            logger.info(f"合并完成: {v4.OUTPUT_FILE}")
+        except Exception as e:
+            logger.error(f"合并失败: {e}")
+
+
+if __name__ == "__main__":
+    main_task()
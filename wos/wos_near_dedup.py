@@ -0,0 +1,460 @@
+# -*- coding: utf-8 -*-
+# 近似重复记录聚类 (MinHash + LSH)
+# wos_dedup.py 按 UT/DOI 去掉完全相同的记录后，同一篇论文仍可能以不同元数据出现多次：在线发表 (Early Access)
+# 与正式出版各一条、勘误 ("Correction to: ...") 等，它们的 UT 不同，标题只有细微差别。这里按 标题 + 第一作者 + 年份
+# 找出这类记录并聚类，可选地只保留每个聚类的第一条，之后 analysis_SO_nums.py 等计数不再重复计算。
+#   1. 标题标准化 (小写、去标点) 后取字符 4-gram，计算 NUM_PERM 个 MinHash；签名分成 BANDS 段，
+#      每段与第一作者姓氏一起哈希成一个桶键 (LSH)。签名 (只保留低 16 位) 和桶键按记录顺序写入工作目录下的二进制文件。
+#   2. 逐段把桶键排序，同一个桶中的记录成为候选对 (与桶中第一条及相邻的一条比较，不做两两比较)；
+#      候选对再用签名估计标题的 Jaccard 相似度 (>= SIMILARITY) 并检查年份 (相差不超过 YEAR_TOLERANCE) 确认。
+#   3. 确认的记录对求连通分量后，每条记录再与其聚类的第一条记录比较 (相似度、年份)，不满足的移出后在剩余记录中重新聚类，
+#      避免 A≈B≈C 这样的链把标题相似、年份相隔很远的记录串成一个聚类；聚类编号为其中第一条记录的序号。
+# 每一步的开销都与记录数成线性 (排序为 n log n)，几千万条记录也不需要两两比较；内存占用只和块大小、单段桶键有关。
+# 第 1 步最耗时，进度保存在 <聚类结果.csv>.work/state.json 中，中断后重新运行从断点继续。
+# 用法: python wos_near_dedup.py <聚类结果.csv> <CSV 文件或目录> [...] [--output <去重后.csv>]
+#   聚类结果.csv  每条属于聚类的记录一行: record (输入中的序号), UT, 标题, 年份, cluster_id, cluster_size,
+#                 dropped (--output 中是否去掉)
+#   --output      另外写出去掉近似重复 (每个聚类只保留第一条) 后的 CSV；通用标题 (Editorial、Preface 等) 和
+#                 没有作者 / 作者为 [Anonymous] 的记录只列在聚类结果中，不会被去掉
+
+import os
+import sys
+import glob
+import json
+import shutil
+
+import numpy as np
+import pandas as pd
+
+from wos_chunk_reader import iter_csv_chunks
+from wos_merge_manifest import read_csv_header
+
+COL_UT = 'UT (Unique WOS ID)'
+COL_TITLE = 'Article Title'
+COL_AUTHORS = 'Authors'
+COL_YEAR = 'Publication Year'
+COL_EARLY_ACCESS = 'Early Access Date'
+
+CHUNK_SIZE = 50000
+SHINGLE = 4                 # 字符 n-gram 的长度
+NUM_PERM = 64               # MinHash 个数
+BANDS = 16                  # LSH 段数 (每段 NUM_PERM // BANDS 个)，标题相似度约 0.5 以上的记录对才可能进入同一个桶
+SIMILARITY = 0.8            # 估计的标题 Jaccard 相似度阈值
+YEAR_TOLERANCE = 1          # 在线发表与正式出版的年份可能相差一年；缺少年份时不限制
+VERIFY_BATCH = 1000000      # 每次确认的候选对数
+SEED = 20240101
+
+# 通用标题 (标准化后)：不同期刊、不同年份的社论、序言等标题相同，只凭标题和作者无法判断是否同一篇，--output 中不去掉
+GENERIC_TITLES = frozenset({
+    'editorial', 'preface', 'introduction', 'front matter', 'back matter', 'foreword', 'editorial board',
+    'guest editorial', 'editors note', 'correction', 'erratum', 'index', 'contents', 'table of contents',
+})
+# 匿名作者 (标准化后的第一作者姓氏)，空字符串为没有作者
+ANONYMOUS_AUTHORS = frozenset({'', 'anonymous'})
+
+# 勘误等记录标题前的说明，标准化时去掉
+ERRATUM_PREFIX_PATTERN = r'^(?:correction|erratum|corrigendum|addendum|retraction|retracted|expression of concern)' \
+                         r'(?: (?:to|of|for|on))?(?: article)? '
+
+# 乘加移位哈希 ((a * x + b) mod 2**64) >> 32，a 为奇数；uint64 乘法自然回绕，不需要取模
+_rng = np.random.RandomState(SEED)
+_HASH_A = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_HASH_B = _rng.randint(0, 1 << 63, size=NUM_PERM, dtype=np.uint64)
+_SHIFT = np.uint64(32)
+_FNV_PRIME = np.uint64(0x100000001b3)
+
+
+def work_dir_for(clusters_csv):
+    return clusters_csv + '.work'
+
+
+def normalize_titles(titles):
+    """小写，标点、空白合并为一个空格，去掉 "Correction to:" 之类的前缀"""
+    titles = titles.fillna('').astype(str).str.lower().str.replace(r'[\W_]+', ' ', regex=True).str.strip()
+    return titles.str.replace(ERRATUM_PREFIX_PATTERN, '', regex=True)
+
+
+def first_author_keys(authors):
+    """第一作者的姓 (小写，只保留字母数字)；"Li, X; Wang, Y" -> "li\""""
+    surname = authors.fillna('').astype(str).str.split(';').str[0].str.split(',').str[0]
+    return surname.str.lower().str.replace(r'[\W_]+', '', regex=True)
+
+
+def record_years(chunk):
+    """出版年；没有出版年的在线发表记录取 Early Access Date 中的年份；都没有时为 0"""
+    year = pd.to_numeric(chunk[COL_YEAR], errors='coerce') if COL_YEAR in chunk.columns else None
+    if COL_EARLY_ACCESS in chunk.columns:
+        early = pd.to_numeric(chunk[COL_EARLY_ACCESS].str.extract(r'(\d{4})', expand=False), errors='coerce')
+        year = early if year is None else year.fillna(early)
+    if year is None:
+        return np.zeros(len(chunk), dtype=np.int16)
+    return year.fillna(0).to_numpy().astype(np.int16)
+
+
+def title_shingles(titles):
+    """
+    标准化后的标题 -> (所有 4-gram 的整数编码, 每条标题的 4-gram 个数)。
+    所有标题的 UTF-8 字节拼成一个数组，用移位一次算出全部编码，不逐条切片。
+    """
+    encoded = [t.encode('utf-8') for t in titles]
+    lengths = np.fromiter(map(len, encoded), dtype=np.int64, count=len(encoded))
+    counts = np.maximum(lengths - SHINGLE + 1, 0)
+    buf = np.frombuffer(b''.join(encoded) + b'\0' * SHINGLE, dtype=np.uint8).astype(np.uint64)
+    starts = np.repeat(np.cumsum(lengths) - lengths, counts)
+    positions = starts + (np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts))
+    codes = np.zeros(len(positions), dtype=np.uint64)
+    for i in range(SHINGLE):
+        codes = (codes << np.uint64(8)) | buf[positions + i]
+    return codes, counts
+
+
+def minhash_signatures(codes, counts):
+    """每条记录的 NUM_PERM 个 MinHash，没有 4-gram 的记录全为 0"""
+    sig = np.zeros((len(counts), NUM_PERM), dtype=np.uint32)
+    has = counts > 0
+    if not has.any():
+        return sig
+    starts = np.cumsum(counts[has]) - counts[has]
+    h = np.empty_like(codes)
+    for k in range(NUM_PERM):
+        # 原地计算，每个哈希函数不再分配新数组
+        np.multiply(codes, _HASH_A[k], out=h)
+        np.add(h, _HASH_B[k], out=h)
+        np.right_shift(h, _SHIFT, out=h)
+        sig[has, k] = np.minimum.reduceat(h, starts)
+    return sig
+
+
+def band_keys(sig, author_hash, has):
+    """每段签名与第一作者一起哈希成桶键，返回 (记录数, BANDS) 的 int64；没有标题的记录为 0 (不参与分桶)"""
+    rows = NUM_PERM // BANDS
+    keys = np.empty((len(sig), BANDS), dtype=np.uint64)
+    for band in range(BANDS):
+        h = author_hash.copy()
+        for k in range(band * rows, (band + 1) * rows):
+            h = (h ^ sig[:, k].astype(np.uint64)) * _FNV_PRIME
+        keys[:, band] = h | np.uint64(1)
+    keys[~has] = 0
+    return keys.view(np.int64)
+
+
+def list_inputs(inputs, exclude=()):
+    files = []
+    for source in inputs:
+        files.extend([source] if os.path.isfile(source) else sorted(glob.glob(os.path.join(source, '*.csv'))))
+    exclude = {os.path.abspath(p) for p in exclude if p}
+    return [os.path.abspath(p) for p in files if os.path.abspath(p) not in exclude]
+
+
+def file_states(files):
+    """[[路径, 大小, mtime_ns], ...]；工作目录中的签名和记录序号只对这些文件状态有效"""
+    states = []
+    for path in files:
+        st = os.stat(path)
+        states.append([path, st.st_size, st.st_mtime_ns])
+    return states
+
+
+class SignatureStore:
+    """
+    工作目录中按记录顺序存放的签名 (uint16)、年份 (int16) 和各段桶键 (int64)，以及第 1 步的进度。
+    任一输入文件的大小或 mtime 变化 (重新生成、追加) 时记录序号不再对应，整个工作目录重建。
+    """
+
+    def __init__(self, work_dir, files):
+        files = file_states(files)
+        self.work_dir = work_dir
+        self.state_path = os.path.join(work_dir, 'state.json')
+        self.sig_path = os.path.join(work_dir, 'sig.u16')
+        self.year_path = os.path.join(work_dir, 'year.i16')
+        self.band_paths = [os.path.join(work_dir, f'band_{b:02d}.i64') for b in range(BANDS)]
+        self.params = {'shingle': SHINGLE, 'num_perm': NUM_PERM, 'bands': BANDS, 'seed': SEED}
+
+        state = None
+        if os.path.exists(self.state_path):
+            with open(self.state_path, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            if state.get('files') != files or state.get('params') != self.params:
+                print(" [重建] 输入文件 (路径、大小、mtime) 或参数已变化，重新计算签名")
+                state = None
+        if state is None:
+            shutil.rmtree(work_dir, ignore_errors=True)
+            state = {'files': files, 'params': self.params, 'records': 0, 'current': 0, 'offset': None}
+        os.makedirs(work_dir, exist_ok=True)
+        self.state = state
+        self._truncate()
+
+    def _truncate(self):
+        """去掉上次中断时已写出、但未记入进度的部分"""
+        n = self.state['records']
+        for path, width in [(self.sig_path, NUM_PERM * 2), (self.year_path, 2)] + [(p, 8) for p in self.band_paths]:
+            with open(path, 'ab') as f:
+                f.truncate(n * width)
+
+    def save(self):
+        tmp_path = self.state_path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.state_path)
+
+    def append(self, sig, years, keys):
+        with open(self.sig_path, 'ab') as f:
+            sig.astype(np.uint16).tofile(f)
+        with open(self.year_path, 'ab') as f:
+            years.tofile(f)
+        for band, path in enumerate(self.band_paths):
+            with open(path, 'ab') as f:
+                np.ascontiguousarray(keys[:, band]).tofile(f)
+
+    @property
+    def records(self):
+        return self.state['records']
+
+    def signatures(self):
+        return np.memmap(self.sig_path, dtype=np.uint16, mode='r', shape=(self.records, NUM_PERM))
+
+    def years(self):
+        return np.fromfile(self.year_path, dtype=np.int16)
+
+    def band(self, band):
+        return np.fromfile(self.band_paths[band], dtype=np.int64)
+
+
+def _signature_columns(path):
+    """第 1 步要读取的列；一列都没有时读取全部列 (只用于计数，保证记录序号与第 3 步一致)"""
+    header = read_csv_header(path) or []
+    return [c for c in header if c in (COL_TITLE, COL_AUTHORS, COL_YEAR, COL_EARLY_ACCESS)] or None
+
+
+def build_signatures(store, chunk_size=CHUNK_SIZE):
+    """第 1 步：逐块计算签名和桶键，追加到工作目录；每块之后保存进度"""
+    files = store.state['files']
+    while store.state['current'] < len(files):
+        path = files[store.state['current']][0]
+        print(f" -> 正在计算签名: {os.path.basename(path)} ...")
+        for chunk, offset in iter_csv_chunks(path, chunk_size, start_offset=store.state['offset'],
+                                             usecols=_signature_columns(path), dtype=str):
+            empty = pd.Series('', index=chunk.index)
+            titles = normalize_titles(chunk[COL_TITLE] if COL_TITLE in chunk.columns else empty)
+            authors = first_author_keys(chunk[COL_AUTHORS] if COL_AUTHORS in chunk.columns else empty)
+            codes, counts = title_shingles(titles)
+            sig = minhash_signatures(codes, counts)
+            keys = band_keys(sig, pd.util.hash_array(authors.to_numpy(dtype=object)), counts > 0)
+            # 先写数据再记进度；中断时多写的部分下次按记录数截掉
+            store.append(sig, record_years(chunk), keys)
+            store.state['records'] += len(chunk)
+            store.state['offset'] = offset
+            store.save()
+        store.state['current'] += 1
+        store.state['offset'] = None
+        store.save()
+
+
+def candidate_pairs(store):
+    """第 2 步：逐段排序桶键，同一桶中的记录与桶中第一条、相邻一条组成候选对；返回去重后的 (i, j)，i < j"""
+    n = np.int64(store.records)
+    encoded = []
+    for band in range(BANDS):
+        keys = store.band(band)
+        order = np.argsort(keys, kind='stable')
+        sorted_keys = keys[order]
+        same = (sorted_keys[1:] == sorted_keys[:-1]) & (sorted_keys[1:] != 0)
+        if not same.any():
+            continue
+        run_start = np.flatnonzero(np.r_[True, ~same])
+        first = order[run_start[np.cumsum(np.r_[True, ~same]) - 1]]
+        members = np.flatnonzero(same) + 1
+        for left in (first[members], order[members - 1]):
+            right = order[members]
+            pairs = np.minimum(left, right) * n + np.maximum(left, right)
+            encoded.append(pairs[left != right])
+    if not encoded:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    encoded = np.unique(np.concatenate(encoded))
+    return encoded // n, encoded % n
+
+
+def verify_pairs(store, left, right):
+    """用签名估计标题相似度并检查年份，返回确认为近似重复的记录对"""
+    if not len(left):
+        return left, right
+    sig = store.signatures()
+    years = store.years().astype(np.int32)
+    keep = np.zeros(len(left), dtype=bool)
+    for start in range(0, len(left), VERIFY_BATCH):
+        i = left[start:start + VERIFY_BATCH]
+        j = right[start:start + VERIFY_BATCH]
+        similarity = (sig[i] == sig[j]).mean(axis=1)
+        year_ok = (years[i] == 0) | (years[j] == 0) | (np.abs(years[i] - years[j]) <= YEAR_TOLERANCE)
+        keep[start:start + VERIFY_BATCH] = (similarity >= SIMILARITY) & year_ok
+    return left[keep], right[keep]
+
+
+def is_droppable(chunk):
+    """--output 中可以作为近似重复去掉的记录：标题不是通用标题，且有署名作者"""
+    empty = pd.Series('', index=chunk.index)
+    titles = normalize_titles(chunk[COL_TITLE] if COL_TITLE in chunk.columns else empty)
+    authors = first_author_keys(chunk[COL_AUTHORS] if COL_AUTHORS in chunk.columns else empty)
+    return (~titles.isin(GENERIC_TITLES) & ~authors.isin(ANONYMOUS_AUTHORS)).to_numpy()
+
+
+def connected_components(left, right):
+    """
+    记录对 -> (聚类中的记录序号 (升序), 对应的聚类编号)。
+    聚类编号为聚类中最小的记录序号；用向量化的最小标签传播 + 指针跳跃，不逐对合并。
+    """
+    nodes = np.unique(np.concatenate([left, right]))
+    a = np.searchsorted(nodes, left)
+    b = np.searchsorted(nodes, right)
+    label = np.arange(len(nodes))
+    while True:
+        new = label.copy()
+        m = np.minimum(label[a], label[b])
+        np.minimum.at(new, a, m)
+        np.minimum.at(new, b, m)
+        new = new[new]
+        if np.array_equal(new, label):
+            break
+        label = new
+    return nodes, nodes[label]
+
+
+def anchored_clusters(store, left, right):
+    """
+    确认的记录对 -> (聚类中的记录序号 (升序), 对应的聚类编号)，不让聚类通过链式传递无限扩大：
+    求连通分量后，每条记录与聚类第一条记录比较标题相似度，与聚类中第一条有年份的记录比较年份，
+    满足的留在该聚类；其余记录之间的记录对在下一轮重新聚类，直到没有记录对。
+    """
+    sig = store.signatures()
+    years = store.years().astype(np.int32)
+    out_nodes, out_ids = [], []
+    while len(left):
+        nodes, roots = connected_components(left, right)
+        # 每个聚类的参考年份：聚类中第一条年份不为 0 的记录 (都没有年份时为 0，不限制)
+        ref_year = np.zeros(len(nodes), dtype=np.int32)
+        dated = years[nodes] != 0
+        if dated.any():
+            cluster_roots, first = np.unique(roots[dated], return_index=True)
+            ref = dict(zip(cluster_roots.tolist(), years[nodes[dated][first]].tolist()))
+            ref_year = pd.Series(roots).map(ref).fillna(0).to_numpy().astype(np.int32)
+        similar = np.empty(len(nodes), dtype=bool)
+        for start in range(0, len(nodes), VERIFY_BATCH):
+            i = nodes[start:start + VERIFY_BATCH]
+            j = roots[start:start + VERIFY_BATCH]
+            similar[start:start + VERIFY_BATCH] = (sig[i] == sig[j]).mean(axis=1) >= SIMILARITY
+        year_ok = (years[nodes] == 0) | (ref_year == 0) | (np.abs(years[nodes] - ref_year) <= YEAR_TOLERANCE)
+        member = similar & year_ok
+        # 只剩第一条记录的聚类不算聚类
+        size = pd.Series(roots[member]).value_counts()
+        member &= pd.Series(roots).map(size).fillna(0).to_numpy() > 1
+        out_nodes.append(nodes[member])
+        out_ids.append(roots[member])
+
+        # 已归入聚类的记录和各聚类的第一条记录不再参与下一轮，每轮至少去掉每个连通分量的一条记录
+        settled = np.zeros(store.records, dtype=bool)
+        settled[nodes[member]] = True
+        settled[roots] = True
+        rest = ~settled[left] & ~settled[right]
+        left, right = left[rest], right[rest]
+    if not out_nodes:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    nodes, ids = np.concatenate(out_nodes), np.concatenate(out_ids)
+    order = np.argsort(nodes, kind='stable')
+    return nodes[order], ids[order]
+
+
+def write_results(files, nodes, cluster_ids, clusters_csv, output_csv=None, chunk_size=CHUNK_SIZE):
+    """
+    第 3 步：重新读取输入，写出聚类结果；给出 output_csv 时同时写出每个聚类只保留第一条的 CSV。
+    聚类结果中 dropped 标出 output_csv 中去掉的记录：通用标题、没有署名作者的记录 (或其聚类的第一条是这样的记录) 不去掉。
+    """
+    sizes = pd.Series(cluster_ids).map(pd.Series(cluster_ids).value_counts()).to_numpy()
+    columns = []
+    if output_csv:
+        for path in files:
+            for column in read_csv_header(path) or []:
+                if column not in columns:
+                    columns.append(column)
+        if os.path.exists(output_csv):
+            os.remove(output_csv)
+
+    parts, base, dropped_total = [], 0, 0
+    # 第一条记录不能作为去重依据的聚类 (聚类编号总是小于成员序号，读到成员之前已登记)
+    weak_clusters = set()
+    for path in files:
+        print(f" -> 正在写出: {os.path.basename(path)} ...")
+        usecols = None
+        if not output_csv:
+            usecols = [c for c in read_csv_header(path) or []
+                       if c in (COL_UT, COL_TITLE, COL_AUTHORS, COL_YEAR)] or None
+        for chunk, _ in iter_csv_chunks(path, chunk_size, usecols=usecols, dtype=str):
+            lo, hi = np.searchsorted(nodes, [base, base + len(chunk)])
+            records = nodes[lo:hi]
+            ids = cluster_ids[lo:hi]
+            dropped = np.zeros(len(records), dtype=bool)
+            if len(records):
+                rows = chunk.iloc[records - base]
+                droppable = is_droppable(rows)
+                weak_clusters.update(ids[(ids == records) & ~droppable].tolist())
+                dropped = (ids != records) & droppable & ~np.isin(ids, list(weak_clusters))
+                dropped_total += int(dropped.sum())
+                parts.append(pd.DataFrame({
+                    'record': records,
+                    COL_UT: rows[COL_UT].to_numpy() if COL_UT in rows.columns else None,
+                    COL_TITLE: rows[COL_TITLE].to_numpy() if COL_TITLE in rows.columns else None,
+                    COL_YEAR: rows[COL_YEAR].to_numpy() if COL_YEAR in rows.columns else None,
+                    'cluster_id': ids,
+                    'cluster_size': sizes[lo:hi],
+                    'dropped': dropped,
+                }))
+            if output_csv:
+                drop = records[dropped] - base
+                kept = chunk.drop(index=chunk.index[drop])
+                if not kept.empty:
+                    kept.reindex(columns=columns).to_csv(output_csv, mode='a', index=False,
+                                                         header=not os.path.exists(output_csv), encoding='utf-8-sig')
+            base += len(chunk)
+
+    result = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame(
+        columns=['record', COL_UT, COL_TITLE, COL_YEAR, 'cluster_id', 'cluster_size', 'dropped'])
+    result.to_csv(clusters_csv, index=False, encoding='utf-8-sig')
+    return dropped_total
+
+
+def find_near_duplicates(inputs, clusters_csv, output_csv=None, chunk_size=CHUNK_SIZE):
+    """按顺序读取 inputs (CSV 文件或目录)，聚类近似重复记录，返回 (记录数, 聚类数, 聚类中的记录数, 可去掉的记录数)"""
+    files = list_inputs(inputs, exclude=(clusters_csv, output_csv))
+    store = SignatureStore(work_dir_for(clusters_csv), files)
+    build_signatures(store, chunk_size)
+
+    print(" -> 正在查找候选对 ...")
+    left, right = candidate_pairs(store)
+    left, right = verify_pairs(store, left, right)
+    print(f"    候选对确认后 {len(left)} 对")
+    nodes, cluster_ids = anchored_clusters(store, left, right)
+    if file_states(files) != store.state['files']:
+        # 第 3 步按记录序号重新读取输入，运行期间输入被改动时序号对不上
+        raise ValueError("计算签名之后输入文件被修改，请重新运行")
+    dropped = write_results(files, nodes, cluster_ids, clusters_csv, output_csv, chunk_size)
+    return store.records, len(np.unique(cluster_ids)), len(nodes), dropped
+
+
+if __name__ == '__main__':
+    # 用法: python wos_near_dedup.py <聚类结果.csv> <CSV 文件或目录> [...] [--output <去重后.csv>]
+    args = sys.argv[1:]
+    output = None
+    if '--output' in args:
+        i = args.index('--output')
+        output = args[i + 1] if i + 1 < len(args) else None
+        args = args[:i] + args[i + 2:]
+    if len(args) < 2 or ('--output' in sys.argv and not output):
+        print("用法: python wos_near_dedup.py <聚类结果.csv> <CSV 文件或目录> [...] [--output <去重后.csv>]")
+        sys.exit(1)
+    try:
+        records, clusters, members, dropped = find_near_duplicates(args[1:], args[0], output)
+    except ValueError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    print(f"共 {records} 条记录，{clusters} 个近似重复聚类，涉及 {members} 条 (可去掉 {dropped} 条) -> {args[0]}")
+    if output:
+        print(f"去掉近似重复后的文件: {output}")
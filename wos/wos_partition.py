@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+# WOS 检索结果按出版年份 (PY) 自动切分
+# WOS 单个检索结果集最多只能翻页/导出 MAX_RECORDS_PER_QUERY 条，超过上限时
+# 按 PY 区间递归二分，直到每个分区的记录数都不超过上限。
+
+import logging
+from datetime import datetime
+
+# WOS 单个结果集可浏览/导出的最大记录数
+MAX_RECORDS_PER_QUERY = 100000
+
+# 未指定年份范围时的默认切分边界
+PARTITION_YEAR_MIN = 1900
+PARTITION_YEAR_MAX = datetime.now().year + 1
+
+logger = logging.getLogger('wos_spider')
+
+
+class PartitionProbeError(RuntimeError):
+    """计数探针失败 (检索失败或读不到总数，而不是检索结果为 0)"""
+
+
+def parse_year_range(text):
+    """
+    解析 "2023" / "2020-2024" 形式的年份范围，返回 (起始年, 结束年)。
+    留空时返回默认边界。
+    """
+    if not text:
+        return PARTITION_YEAR_MIN, PARTITION_YEAR_MAX
+    parts = [p.strip() for p in str(text).split('-') if p.strip()]
+    first = int(parts[0])
+    last = int(parts[-1])
+    return min(first, last), max(first, last)
+
+
+def format_year_range(first_year, last_year):
+    """(2000, 2019) -> "2000-2019"；单年 -> "2000" """
+    if first_year == last_year:
+        return str(first_year)
+    return f"{first_year}-{last_year}"
+
+
+def plan_year_partitions(count_fn, first_year, last_year, cap=MAX_RECORDS_PER_QUERY, total=None):
+    """
+    递归切分年份区间。
+
+    count_fn(first_year, last_year) 为计数探针，返回该年份区间的记录数；探针失败时应抛出
+    PartitionProbeError，不能返回 0 (右半区间由 父区间 - 左半区间 得出，错误的 0 会让切分出错)。
+    total 为已知的区间总数 (可省略，省掉一次探针)。
+    返回 [{"years": "2000-2009", "count": 85000}, ...]，按年份升序。
+
+    二分后右半区间的数量直接用 父区间 - 左半区间 计算，每次切分只需一次探针。
+    """
+    count = total if total is not None else count_fn(first_year, last_year)
+    if count <= 0:
+        return []
+
+    if count <= cap:
+        return [{"years": format_year_range(first_year, last_year), "count": count}]
+
+    if first_year == last_year:
+        # 单一年份仍然超限，PY 无法再切分，只能导出前 cap 条
+        logger.error(f"年份 {first_year} 单独检索仍有 {count} 条，超过上限 {cap}，无法继续按 PY 切分")
+        return [{"years": format_year_range(first_year, last_year), "count": count}]
+
+    mid = (first_year + last_year) // 2
+    left_count = count_fn(first_year, mid)
+    if left_count > count:
+        logger.warning(f"PY={format_year_range(first_year, mid)} 的记录数 {left_count} 大于父区间 "
+                       f"PY={format_year_range(first_year, last_year)} 的 {count}，检索结果可能在变化")
+    right_count = max(count - left_count, 0)
+    logger.info(f"切分 PY={format_year_range(first_year, last_year)} ({count}) -> "
+                f"{format_year_range(first_year, mid)} ({left_count}) + "
+                f"{format_year_range(mid + 1, last_year)} ({right_count})")
+
+    return (plan_year_partitions(count_fn, first_year, mid, cap, total=left_count) +
+            plan_year_partitions(count_fn, mid + 1, last_year, cap, total=right_count))
+
+
+def check_partition_total(partitions, total):
+    """检查各分区记录数之和是否等于总数，不一致时记录错误日志，返回差值 (总数 - 分区之和)"""
+    diff = total - sum(p['count'] for p in partitions)
+    if diff:
+        logger.error(f"切分结果各分区之和 {total - diff} 与总数 {total} 不一致 (相差 {diff})，"
+                     f"部分记录可能不在任何分区中，请检查切分日志")
+    return diff
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+# WOS 纯文本导出的流式解析
+# 支持两种格式 (下载文件名均为 savedrecs*.txt)：
+#   - Tab delimited file：第一行为字段标签 (PT AU ... UT)，之后每行一条记录
+#   - Plain text file：字段标签格式，"PT J" 开始、"ER" 结束，续行以 3 个空格开头
+# 逐条 yield {字段标签: 值}，不依赖 pandas/openpyxl/xlrd，比解析 .xls 快一个数量级。
+
+# WOS 字段标签 -> Excel 导出中的列名 (合并结果沿用 Excel 列名，下游脚本无需修改)
+TAG_TO_COLUMN = {
+    'PT': 'Publication Type',
+    'AU': 'Authors',
+    'BA': 'Book Authors',
+    'BE': 'Book Editors',
+    'GP': 'Book Group Authors',
+    'AF': 'Author Full Names',
+    'BF': 'Book Author Full Names',
+    'CA': 'Group Authors',
+    'TI': 'Article Title',
+    'SO': 'Source Title',
+    'SE': 'Book Series Title',
+    'BS': 'Book Series Subtitle',
+    'LA': 'Language',
+    'DT': 'Document Type',
+    'CT': 'Conference Title',
+    'CY': 'Conference Date',
+    'CL': 'Conference Location',
+    'SP': 'Conference Sponsor',
+    'HO': 'Conference Host',
+    'DE': 'Author Keywords',
+    'ID': 'Keywords Plus',
+    'AB': 'Abstract',
+    'C1': 'Addresses',
+    'C3': 'Affiliations',
+    'RP': 'Reprint Addresses',
+    'EM': 'Email Addresses',
+    'RI': 'Researcher Ids',
+    'OI': 'ORCIDs',
+    'FU': 'Funding Orgs',
+    'FP': 'Funding Name Preferred',
+    'FX': 'Funding Text',
+    'CR': 'Cited References',
+    'NR': 'Cited Reference Count',
+    'TC': 'Times Cited, WoS Core',
+    'Z9': 'Times Cited, All Databases',
+    'U1': '180 Day Usage Count',
+    'U2': 'Since 2013 Usage Count',
+    'PU': 'Publisher',
+    'PI': 'Publisher City',
+    'PA': 'Publisher Address',
+    'SN': 'ISSN',
+    'EI': 'eISSN',
+    'BN': 'ISBN',
+    'J9': 'Journal Abbreviation',
+    'JI': 'Journal ISO Abbreviation',
+    'PD': 'Publication Date',
+    'PY': 'Publication Year',
+    'VL': 'Volume',
+    'IS': 'Issue',
+    'PN': 'Part Number',
+    'SU': 'Supplement',
+    'SI': 'Special Issue',
+    'MA': 'Meeting Abstract',
+    'BP': 'Start Page',
+    'EP': 'End Page',
+    'AR': 'Article Number',
+    'DI': 'DOI',
+    'DL': 'DOI Link',
+    'D2': 'Book DOI',
+    'EA': 'Early Access Date',
+    'PG': 'Number of Pages',
+    'WC': 'WoS Categories',
+    'WE': 'Web of Science Index',
+    'SC': 'Research Areas',
+    'GA': 'IDS Number',
+    'PM': 'Pubmed Id',
+    'OA': 'Open Access Designations',
+    'HC': 'Highly Cited Status',
+    'HP': 'Hot Paper Status',
+    'DA': 'Date of Export',
+    'UT': 'UT (Unique WOS ID)',
+}
+
+# 纯文本格式中每行一个条目的多值字段，续行用 "; " 连接 (与 Excel 导出一致)；其余字段续行用空格连接
+LIST_TAGS = {'AU', 'AF', 'BA', 'BF', 'BE', 'CA', 'GP', 'CR', 'C1', 'C3'}
+
+# 纯文本格式的文件头/文件尾标签
+PLAIN_HEADER_TAGS = {'FN', 'VR'}
+
+
+def _open_text(path):
+    """按 BOM 判断编码：UTF-16 (Win 导出) 或 UTF-8 (可能带 BOM)"""
+    with open(path, 'rb') as f:
+        head = f.read(2)
+    encoding = 'utf-16' if head in (b'\xff\xfe', b'\xfe\xff') else 'utf-8-sig'
+    return open(path, 'r', encoding=encoding, errors='replace', newline='')
+
+
+def detect_text_format(path):
+    """返回 'plain' (字段标签格式) 或 'tab' (制表符分隔)"""
+    with _open_text(path) as f:
+        first = f.readline()
+    return 'plain' if first.startswith('FN ') else 'tab'
+
+
+def iter_tab_delimited_records(path):
+    """逐条读取 Tab delimited 导出，yield {字段标签: 值}"""
+    with _open_text(path) as f:
+        header = f.readline().rstrip('\r\n').split('\t')
+        tags = [t.strip() for t in header]
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            values = line.split('\t')
+            yield {tag: value for tag, value in zip(tags, values) if tag}
+
+
+def iter_plain_text_records(path):
+    """逐条读取字段标签格式 (Plain text) 导出，yield {字段标签: 值}"""
+    record = {}
+    tag = None
+    parts = []
+
+    def flush_field():
+        if tag is not None:
+            record[tag] = ('; ' if tag in LIST_TAGS else ' ').join(parts)
+
+    with _open_text(path) as f:
+        for line in f:
+            line = line.rstrip('\r\n')
+            if not line:
+                continue
+            if line.startswith('   '):
+                # 续行：属于上一个字段
+                parts.append(line.strip())
+                continue
+
+            code = line[:2]
+            value = line[3:].strip()
+            if code == 'ER':
+                flush_field()
+                if record:
+                    yield record
+                record, tag, parts = {}, None, []
+            elif code == 'EF' or code in PLAIN_HEADER_TAGS:
+                continue
+            else:
+                flush_field()
+                tag, parts = code, [value]
+
+    # 文件被截断、缺少最后一个 ER 时，仍输出已读到的记录
+    flush_field()
+    if record:
+        yield record
+
+
+def iter_export_records(path):
+    """自动识别格式，逐条 yield {字段标签: 值}"""
+    if detect_text_format(path) == 'plain':
+        return iter_plain_text_records(path)
+    return iter_tab_delimited_records(path)
+
+
+def count_export_records(path):
+    """统计纯文本导出文件中的记录数"""
+    return sum(1 for _ in iter_export_records(path))
+
+
+def record_to_row(record):
+    """{字段标签: 值} -> {Excel 列名: 值}；未知标签保留原标签作为列名"""
+    return {TAG_TO_COLUMN.get(tag, tag): value for tag, value in record.items()}
+
+
+def export_columns(path):
+    """
+    文件中出现的列名 (Excel 列名，按 TAG_TO_COLUMN 的标准顺序)。
+    Tab delimited 只读表头；Plain text 只扫描每行开头的字段标签，不拼接字段值。
+    """
+    if detect_text_format(path) == 'tab':
+        with _open_text(path) as f:
+            tags = [t.strip() for t in f.readline().rstrip('\r\n').split('\t') if t.strip()]
+    else:
+        with _open_text(path) as f:
+            # 与 iter_plain_text_records 相同：三个空格开头的是续行，其余非空行的前两个字符是标签
+            seen = {line.rstrip('\r\n')[:2] for line in f if not line.startswith('   ')}
+        tags = list(seen - {'', 'ER', 'EF'} - PLAIN_HEADER_TAGS)
+    order = {tag: i for i, tag in enumerate(TAG_TO_COLUMN)}
+    tags.sort(key=lambda t: order.get(t, len(order)))
+    return [TAG_TO_COLUMN.get(t, t) for t in tags]
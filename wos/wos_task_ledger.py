@@ -0,0 +1,508 @@
+# -*- coding: utf-8 -*-
+# WOS 导出任务台账 (SQLite, WAL 模式)
+# 替代只记录 kw_index/start_record 的 wos_spider_state.json：
+#   keywords   每个关键词一行：状态、总记录数、租约 (多 profile 进程池领取关键词用)
+#   partitions 每个 (关键词, PY 分区) 一行：预估数量、状态
+#   tasks      每个 (关键词, PY 分区, 记录范围) 一行：状态、尝试次数、输出文件、行数、耗时
+# 断点续传直接查询未完成的任务即可，台账本身也可以用任意 SQLite 工具查询。
+
+import os
+import sys
+import json
+import time
+import sqlite3
+from datetime import datetime
+
+# 关键词状态
+KW_PENDING = 'pending'
+KW_PLANNED = 'planned'     # 已完成 PY 切分，正在导出
+KW_DONE = 'done'
+KW_EMPTY = 'empty'         # 检索无结果
+KW_SKIPPED = 'skipped'     # 检索失败/报错，跳过
+
+# 任务状态
+TASK_PENDING = 'pending'
+TASK_RUNNING = 'running'
+TASK_DONE = 'done'
+TASK_FAILED = 'failed'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS keywords (
+    keyword       TEXT PRIMARY KEY,
+    kw_index      INTEGER NOT NULL,
+    status        TEXT NOT NULL DEFAULT 'pending',
+    total_records INTEGER,
+    updated_at    TEXT,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    heartbeat_at  TEXT,
+    claims        INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE IF NOT EXISTS partitions (
+    keyword     TEXT NOT NULL,
+    years       TEXT NOT NULL,          -- '' 表示不额外限制年份
+    part_index  INTEGER NOT NULL,
+    est_count   INTEGER,
+    status      TEXT NOT NULL DEFAULT 'pending',
+    total_records INTEGER,              -- 导出时检索到的结果数
+    shortfall   INTEGER NOT NULL DEFAULT 0,  -- 超过 MAX_RECORDS_PER_QUERY、无法导出的记录数 (单个年份仍超过上限)
+    PRIMARY KEY (keyword, years)
+);
+
+CREATE TABLE IF NOT EXISTS tasks (
+    id           INTEGER PRIMARY KEY AUTOINCREMENT,
+    keyword      TEXT NOT NULL,
+    years        TEXT NOT NULL,
+    start_record INTEGER NOT NULL,
+    end_record   INTEGER NOT NULL,
+    status       TEXT NOT NULL DEFAULT 'pending',
+    attempts     INTEGER NOT NULL DEFAULT 0,
+    worker       TEXT,
+    output_file  TEXT,
+    row_count    INTEGER,
+    error        TEXT,
+    created_at   TEXT,
+    started_at   TEXT,
+    finished_at  TEXT,
+    elapsed      REAL,
+    UNIQUE (keyword, years, start_record, end_record)
+);
+
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status);
+CREATE INDEX IF NOT EXISTS idx_tasks_keyword ON tasks (keyword, years, start_record);
+"""
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def open_ledger(db_path):
+    """打开 (或创建) 台账数据库，开启 WAL 以便多个进程/线程同时读写"""
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA busy_timeout=30000")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.commit()
+    return conn
+
+
+def _migrate(conn):
+    """旧版台账补充租约、分区结果数相关字段"""
+    columns = {r['name'] for r in conn.execute("PRAGMA table_info(keywords)")}
+    for name, ddl in (("lease_owner", "TEXT"), ("lease_expires", "REAL"),
+                      ("heartbeat_at", "TEXT"), ("claims", "INTEGER NOT NULL DEFAULT 0")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE keywords ADD COLUMN {name} {ddl}")
+    columns = {r['name'] for r in conn.execute("PRAGMA table_info(partitions)")}
+    for name, ddl in (("total_records", "INTEGER"), ("shortfall", "INTEGER NOT NULL DEFAULT 0")):
+        if name not in columns:
+            conn.execute(f"ALTER TABLE partitions ADD COLUMN {name} {ddl}")
+
+
+# =====================================================
+# 关键词
+# =====================================================
+def register_keywords(conn, keywords):
+    """登记关键词列表 (已存在的关键词保持原状态)"""
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO keywords (keyword, kw_index, status, updated_at) VALUES (?, ?, ?, ?)",
+            [(kw, idx, KW_PENDING, _now()) for idx, kw in enumerate(keywords)]
+        )
+
+
+def get_keyword_status(conn, keyword):
+    row = conn.execute("SELECT status FROM keywords WHERE keyword = ?", (keyword,)).fetchone()
+    return row['status'] if row else None
+
+
+def set_keyword_status(conn, keyword, status, total_records=None):
+    with conn:
+        if total_records is None:
+            conn.execute("UPDATE keywords SET status = ?, updated_at = ? WHERE keyword = ?",
+                         (status, _now(), keyword))
+        else:
+            conn.execute("UPDATE keywords SET status = ?, total_records = ?, updated_at = ? WHERE keyword = ?",
+                         (status, total_records, _now(), keyword))
+
+
+def has_progress(conn):
+    """台账里是否已经有开始过的关键词 (用于判断是否为断点模式)"""
+    row = conn.execute("SELECT COUNT(*) AS n FROM keywords WHERE status != ?", (KW_PENDING,)).fetchone()
+    return row['n'] > 0
+
+
+def import_json_state(conn, keywords, state_path, chunk_size=None):
+    """
+    兼容旧版 wos_spider_state.json：kw_index 之前的关键词标记为已完成；
+    第 kw_index 个关键词 (中断时正在导出) 的 1 .. start_record-1 按 chunk_size 切块记为已完成的任务，
+    并把该关键词固定为一个不切分的分区 (旧版不按 PY 切分，已导出的记录范围只对应整体检索)，
+    续跑时从 start_record 继续。不传 chunk_size 时不导入 start_record。
+    只在台账还没有任何进度时导入一次，导入后旧文件改名为 .imported。
+    返回 (标记为完成的关键词数, 续跑的起始记录)。
+    """
+    if not os.path.exists(state_path) or has_progress(conn):
+        return 0, 1
+    try:
+        with open(state_path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+        state = json.loads(content) if content else {}
+        kw_index = int(state.get('kw_index', 0))
+        start_record = int(state.get('start_record', 1))
+    except Exception:
+        return 0, 1
+    with conn:
+        conn.executemany("UPDATE keywords SET status = ?, updated_at = ? WHERE keyword = ?",
+                         [(KW_DONE, _now(), kw) for kw in keywords[:kw_index]])
+    if chunk_size and start_record > 1 and kw_index < len(keywords):
+        keyword = keywords[kw_index]
+        save_partitions(conn, keyword, [{"years": None, "count": None}])
+        set_keyword_status(conn, keyword, KW_PLANNED)
+        # 旧版从 1 开始按 chunk_size 切块，start_record 总在块边界上，与 add_range_tasks 的切法一致
+        add_range_tasks(conn, keyword, None, start_record - 1, chunk_size)
+        with conn:
+            conn.execute("UPDATE tasks SET status = ?, finished_at = ? WHERE keyword = ? AND years = ''",
+                         (TASK_DONE, _now(), keyword))
+    else:
+        start_record = 1
+    os.replace(state_path, state_path + '.imported')
+    return kw_index, start_record
+
+
+# =====================================================
+# 关键词租约 (多 profile 进程池)
+# =====================================================
+def claim_keyword(conn, worker, lease_seconds, max_claims=None):
+    """
+    原子地领取一个关键词并加租约：未完成、且没有租约或租约已过期的关键词按顺序领取。
+    worker 失联后租约自然过期，关键词会被其他 worker 重新领取。
+    max_claims: 同一关键词最多被领取的次数，避免反复失败的关键词无限循环。
+    返回关键词字符串，没有可领取的关键词时返回 None。
+    """
+    now = time.time()
+    sql = ("SELECT keyword FROM keywords WHERE status IN (?, ?) "
+           "AND (lease_owner IS NULL OR lease_expires < ?)")
+    params = [KW_PENDING, KW_PLANNED, now]
+    if max_claims is not None:
+        sql += " AND claims < ?"
+        params.append(max_claims)
+    sql += " ORDER BY kw_index LIMIT 1"
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(sql, params).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute(
+            "UPDATE keywords SET lease_owner = ?, lease_expires = ?, heartbeat_at = ?, claims = claims + 1 "
+            "WHERE keyword = ?",
+            (worker, now + lease_seconds, _now(), row['keyword'])
+        )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return row['keyword']
+
+
+def heartbeat(conn, worker, keyword, lease_seconds):
+    """续租；返回 False 表示租约已经不属于该 worker (已被回收或转给他人)"""
+    with conn:
+        cur = conn.execute(
+            "UPDATE keywords SET lease_expires = ?, heartbeat_at = ? WHERE keyword = ? AND lease_owner = ?",
+            (time.time() + lease_seconds, _now(), keyword, worker)
+        )
+    return cur.rowcount == 1
+
+
+def release_keyword(conn, worker, keyword):
+    with conn:
+        conn.execute(
+            "UPDATE keywords SET lease_owner = NULL, lease_expires = NULL WHERE keyword = ? AND lease_owner = ?",
+            (keyword, worker)
+        )
+
+
+def release_worker_leases(conn, worker):
+    """
+    回收某个 worker 持有的全部租约 (进程退出时由协调器调用)，
+    其名下处于 running 的任务 (含各标签页 "<worker>/tabN") 重新排队。返回回收的关键词数。
+    """
+    with conn:
+        cur = conn.execute(
+            "UPDATE keywords SET lease_owner = NULL, lease_expires = NULL WHERE lease_owner = ?", (worker,)
+        )
+        conn.execute(
+            "UPDATE tasks SET status = ?, error = ? WHERE status = ? AND (worker = ? OR worker LIKE ?)",
+            (TASK_PENDING, f"worker {worker} 退出", TASK_RUNNING, worker, f"{worker}/%")
+        )
+    return cur.rowcount
+
+
+def exhausted_keywords(conn, max_claims):
+    """领取次数已达上限、但仍未完成的关键词 [(关键词, 领取次数), ...]；这些关键词不会再被自动领取"""
+    rows = conn.execute(
+        "SELECT keyword, claims FROM keywords WHERE status IN (?, ?) AND claims >= ? ORDER BY kw_index",
+        (KW_PENDING, KW_PLANNED, max_claims)
+    ).fetchall()
+    return [(r['keyword'], r['claims']) for r in rows]
+
+
+def reset_claims(conn, keyword=None):
+    """把未完成关键词的领取次数清零 (重新排队、--repair 之后允许再次领取)，返回清零的关键词数"""
+    sql = "UPDATE keywords SET claims = 0 WHERE claims > 0 AND status IN (?, ?)"
+    params = [KW_PENDING, KW_PLANNED]
+    if keyword is not None:
+        sql += " AND keyword = ?"
+        params.append(keyword)
+    with conn:
+        return conn.execute(sql, params).rowcount
+
+
+def keyword_progress(conn, keyword):
+    """
+    关键词的进展标记：分区数、任务数、各任务的尝试次数之和、最近的开始/完成时间。
+    标记变化说明导出在推进，worker 的心跳据此判断是否续租。
+    """
+    part = conn.execute("SELECT COUNT(*) AS n FROM partitions WHERE keyword = ?", (keyword,)).fetchone()
+    row = conn.execute(
+        "SELECT COUNT(*) AS n, COALESCE(SUM(attempts), 0) AS attempts, MAX(started_at) AS started, "
+        "MAX(finished_at) AS finished FROM tasks WHERE keyword = ?", (keyword,)
+    ).fetchone()
+    return part['n'], row['n'], row['attempts'], row['started'], row['finished']
+
+
+def expired_lease_owners(conn):
+    """租约已过期但未释放的持有者 (worker 卡死或失联)"""
+    return [r['lease_owner'] for r in conn.execute(
+        "SELECT DISTINCT lease_owner FROM keywords WHERE lease_owner IS NOT NULL AND lease_expires < ?",
+        (time.time(),)
+    )]
+
+
+def claimable_keywords(conn, max_claims=None):
+    """仍可被领取的关键词数量 (不论当前是否有租约)"""
+    sql = "SELECT COUNT(*) AS n FROM keywords WHERE status IN (?, ?)"
+    params = [KW_PENDING, KW_PLANNED]
+    if max_claims is not None:
+        sql += " AND claims < ?"
+        params.append(max_claims)
+    return conn.execute(sql, params).fetchone()['n']
+
+
+# =====================================================
+# PY 分区
+# =====================================================
+def save_partitions(conn, keyword, partitions):
+    """partitions: [{"years": "2000-2009" 或 None, "count": 85000}, ...]"""
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO partitions (keyword, years, part_index, est_count, status) VALUES (?, ?, ?, ?, ?)",
+            [(keyword, p['years'] or '', i, p['count'], TASK_PENDING) for i, p in enumerate(partitions)]
+        )
+
+
+def load_partitions(conn, keyword):
+    rows = conn.execute(
+        "SELECT years, est_count, status FROM partitions WHERE keyword = ? ORDER BY part_index",
+        (keyword,)
+    ).fetchall()
+    return [{"years": r['years'] or None, "count": r['est_count'], "status": r['status']} for r in rows]
+
+
+def set_partition_status(conn, keyword, years, status):
+    with conn:
+        conn.execute("UPDATE partitions SET status = ? WHERE keyword = ? AND years = ?",
+                     (status, keyword, years or ''))
+
+
+def set_partition_total(conn, keyword, years, total_records, exportable):
+    """记录分区检索到的结果数；exportable 小于结果数时 (单个年份超过导出上限) 差额记为 shortfall"""
+    with conn:
+        conn.execute("UPDATE partitions SET total_records = ?, shortfall = ? WHERE keyword = ? AND years = ?",
+                     (total_records, max(total_records - exportable, 0), keyword, years or ''))
+
+
+def truncated_partitions(conn):
+    """结果数超过导出上限、有记录无法导出的分区：[(关键词, 年份, 结果数, 缺少的记录数), ...]"""
+    return [(r['keyword'], r['years'] or None, r['total_records'], r['shortfall']) for r in conn.execute(
+        "SELECT keyword, years, total_records, shortfall FROM partitions WHERE shortfall > 0 ORDER BY keyword, part_index")]
+
+
+# =====================================================
+# 记录范围任务
+# =====================================================
+def add_range_tasks(conn, keyword, years, total_records, chunk_size):
+    """按 chunk_size 把 1..total_records 切成记录范围任务 (重复调用不会重复插入)"""
+    now = _now()
+    rows = []
+    start = 1
+    while start <= total_records:
+        end = min(start + chunk_size - 1, total_records)
+        rows.append((keyword, years or '', start, end, TASK_PENDING, now))
+        start = end + 1
+    with conn:
+        conn.executemany(
+            "INSERT OR IGNORE INTO tasks (keyword, years, start_record, end_record, status, created_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            rows
+        )
+    return len(rows)
+
+
+def open_tasks(conn, keyword, years):
+    """某个分区下所有未完成的任务，按记录起始排序 (running 也视为未完成：上次运行中断)"""
+    return conn.execute(
+        "SELECT * FROM tasks WHERE keyword = ? AND years = ? AND status != ? ORDER BY start_record",
+        (keyword, years or '', TASK_DONE)
+    ).fetchall()
+
+
+def mark_task_running(conn, task_id, worker=None):
+    with conn:
+        conn.execute(
+            "UPDATE tasks SET status = ?, attempts = attempts + 1, worker = ?, started_at = ?, error = NULL "
+            "WHERE id = ?",
+            (TASK_RUNNING, worker, _now(), task_id)
+        )
+    return time.time()
+
+
+def mark_task_done(conn, task_id, started=None, output_file=None, row_count=None):
+    elapsed = round(time.time() - started, 2) if started else None
+    with conn:
+        conn.execute(
+            "UPDATE tasks SET status = ?, finished_at = ?, elapsed = ?, output_file = ?, row_count = ? "
+            "WHERE id = ?",
+            (TASK_DONE, _now(), elapsed, output_file, row_count, task_id)
+        )
+
+
+def mark_task_failed(conn, task_id, error=None, started=None):
+    elapsed = round(time.time() - started, 2) if started else None
+    with conn:
+        conn.execute(
+            "UPDATE tasks SET status = ?, finished_at = ?, elapsed = ?, error = ? WHERE id = ?",
+            (TASK_FAILED, _now(), elapsed, str(error) if error else None, task_id)
+        )
+
+
+def done_tasks(conn):
+    """所有已完成的任务 (用于 --repair 复核)"""
+    return conn.execute(
+        "SELECT * FROM tasks WHERE status = ? ORDER BY keyword, years, start_record", (TASK_DONE,)
+    ).fetchall()
+
+
+def requeue_task(conn, task_id, reason=None, reset_claims=True):
+    """
+    把单个任务重新排队，所属分区和关键词一并重新打开。
+    reset_claims: 同时把关键词的领取次数清零 (复核发现缺口时需要重新领取)；
+    worker 启动时把上次中断的 running 任务排回队列不应清零，否则反复崩溃的关键词会无限轮转。
+    """
+    with conn:
+        row = conn.execute("SELECT keyword, years FROM tasks WHERE id = ?", (task_id,)).fetchone()
+        conn.execute("UPDATE tasks SET status = ?, error = ? WHERE id = ?", (TASK_PENDING, reason, task_id))
+        conn.execute("UPDATE partitions SET status = ? WHERE keyword = ? AND years = ?",
+                     (TASK_PENDING, row['keyword'], row['years']))
+        conn.execute("UPDATE keywords SET status = ?, updated_at = ? WHERE keyword = ?",
+                     (KW_PLANNED, _now(), row['keyword']))
+        if reset_claims:
+            conn.execute("UPDATE keywords SET claims = 0 WHERE keyword = ?", (row['keyword'],))
+
+
+def claim_next_task(conn, worker, keyword=None, years=None, max_attempts=None):
+    """
+    原子地领取一个待处理任务 (供多个并行 worker 共享同一台账)。
+    领取只把任务标记为 running，尝试次数由随后的 mark_task_running 累加。
+    返回任务行，没有可领取的任务时返回 None。
+    """
+    sql = "SELECT id FROM tasks WHERE status IN (?, ?)"
+    params = [TASK_PENDING, TASK_FAILED]
+    if keyword is not None:
+        sql += " AND keyword = ?"
+        params.append(keyword)
+    if years is not None or keyword is not None:
+        sql += " AND years = ?"
+        params.append(years or '')
+    if max_attempts is not None:
+        sql += " AND attempts < ?"
+        params.append(max_attempts)
+    sql += " ORDER BY keyword, years, start_record LIMIT 1"
+
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(sql, params).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None
+        conn.execute("UPDATE tasks SET status = ?, worker = ? WHERE id = ?",
+                     (TASK_RUNNING, worker, row['id']))
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return conn.execute("SELECT * FROM tasks WHERE id = ?", (row['id'],)).fetchone()
+
+
+def reset_tasks(conn, keyword=None, status=TASK_FAILED):
+    """
+    把指定状态的任务重置为待处理 (用于部分重新导出)，所属分区/关键词一并重新打开，
+    重新打开的关键词领取次数清零。返回重置数量。
+    """
+    sql = "UPDATE tasks SET status = ?, error = NULL WHERE status = ?"
+    params = [TASK_PENDING, status]
+    if keyword is not None:
+        sql += " AND keyword = ?"
+        params.append(keyword)
+    with conn:
+        cur = conn.execute(sql, params)
+        conn.execute(
+            "UPDATE partitions SET status = ? WHERE EXISTS (SELECT 1 FROM tasks t WHERE t.keyword = partitions.keyword "
+            "AND t.years = partitions.years AND t.status = ?)",
+            (TASK_PENDING, TASK_PENDING)
+        )
+        conn.execute(
+            "UPDATE keywords SET status = ?, updated_at = ?, claims = 0 WHERE EXISTS (SELECT 1 FROM tasks t "
+            "WHERE t.keyword = keywords.keyword AND t.status = ?)",
+            (KW_PLANNED, _now(), TASK_PENDING)
+        )
+    return cur.rowcount
+
+
+def ledger_summary(conn):
+    """返回 {'keywords': {状态: 数量}, 'tasks': {状态: 数量}, 'rows': 已导出行数, 'shortfall': 超过上限无法导出的记录数}"""
+    kw = {r['status']: r['n'] for r in
+          conn.execute("SELECT status, COUNT(*) AS n FROM keywords GROUP BY status")}
+    tasks = {r['status']: r['n'] for r in
+             conn.execute("SELECT status, COUNT(*) AS n FROM tasks GROUP BY status")}
+    rows = conn.execute("SELECT COALESCE(SUM(row_count), 0) AS n FROM tasks WHERE status = ?",
+                        (TASK_DONE,)).fetchone()['n']
+    shortfall = conn.execute("SELECT COALESCE(SUM(shortfall), 0) AS n FROM partitions").fetchone()['n']
+    return {"keywords": kw, "tasks": tasks, "rows": rows, "shortfall": shortfall}
+
+
+if __name__ == '__main__':
+    # 用法: python wos_task_ledger.py <台账路径> [--reset-claims]  打印台账概况；
+    #       --reset-claims 把未完成关键词的领取次数清零 (达到 MAX_KEYWORD_CLAIMS 后不再被领取)
+    if len(sys.argv) < 2:
+        print("用法: python wos_task_ledger.py <wos_tasks.db> [--reset-claims]")
+        sys.exit(1)
+    conn = open_ledger(sys.argv[1])
+    if '--reset-claims' in sys.argv[2:]:
+        print(f"领取次数已清零的关键词: {reset_claims(conn)}")
+    summary = ledger_summary(conn)
+    print(f"关键词: {summary['keywords']}")
+    print(f"任务:   {summary['tasks']}")
+    print(f"已导出行数: {summary['rows']}")
+    for keyword, years, total, shortfall in truncated_partitions(conn):
+        print(f"超过导出上限: {keyword} PY={years or '全部'} 结果 {total} 条，缺少 {shortfall} 条")
@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+# 本地 WOS 数据仓库 (SQLite, WAL 模式)
+# 把所有合并后的 CSV 增量导入一个数据库，按 UT 去重，之后的计数、筛选、与期刊名单关联都直接用 SQL:
+#   records        每个 UT 一行；列名用 WOS 字段标签 (UT、TI、SO、PY、DI、C1 ...，见 wos_record_parser.TAG_TO_COLUMN)，
+#                  年份、被引次数等为整数列；UT 为主键，DI / SO / PY 建索引 (SO、DI 不区分大小写)
+#   journal_lists  期刊名单 (如中科院 1 区)，用 load_journal_list 导入后与 records.SO 直接 JOIN
+#   ingest_files   已导入的文件及读取到的字节偏移 (增量导入、断点续跑；文件只在末尾追加时从偏移继续导入，
+#                  偏移之前的内容变化 (重新生成) 时删除该文件导入的记录后重新导入)
+# 合并文件中出现新列时自动 ALTER TABLE 增加。
+# 用法: python wos_warehouse.py <wos.db> <合并 CSV 文件或目录>
+# 查询示例:
+#   SELECT SO, COUNT(*) FROM records WHERE PY BETWEEN 2021 AND 2026 GROUP BY SO
+#   SELECT COUNT(*) FROM records r JOIN journal_lists j ON r.SO = j.SO WHERE j.list_name = 'tier1' AND r.PY = 2024
+
+import os
+import sys
+import glob
+import sqlite3
+from datetime import datetime
+
+import pandas as pd
+
+from wos_chunk_reader import iter_csv_chunks, content_digest, is_appended
+from wos_record_parser import TAG_TO_COLUMN
+from combine_wos_export import INTEGER_COLUMNS
+
+CHUNK_SIZE = 20000
+# Excel 列名 -> 字段标签
+COLUMN_TO_TAG = {column: tag for tag, column in TAG_TO_COLUMN.items()}
+INTEGER_TAGS = {COLUMN_TO_TAG.get(column, column) for column in INTEGER_COLUMNS}
+# 比较时不区分大小写的列 (期刊名、DOI)
+NOCASE_TAGS = ('SO', 'DI', 'J9', 'JI')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS ingest_files (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    path        TEXT NOT NULL UNIQUE,
+    size        INTEGER,
+    mtime       INTEGER,
+    offset      INTEGER,
+    digest      TEXT,                   -- 文件开头和 offset 之前内容的哈希 (wos_chunk_reader.content_digest)
+    done        INTEGER NOT NULL DEFAULT 0,
+    rows_read   INTEGER NOT NULL DEFAULT 0,
+    rows_added  INTEGER NOT NULL DEFAULT 0,
+    updated_at  TEXT
+);
+
+CREATE TABLE IF NOT EXISTS records (
+    UT          TEXT PRIMARY KEY,
+    file_id     INTEGER NOT NULL,
+    PY          INTEGER,
+    SO          TEXT COLLATE NOCASE,
+    DI          TEXT COLLATE NOCASE
+);
+
+CREATE TABLE IF NOT EXISTS journal_lists (
+    list_name   TEXT NOT NULL,
+    SO          TEXT NOT NULL COLLATE NOCASE,
+    PRIMARY KEY (list_name, SO)
+);
+
+CREATE INDEX IF NOT EXISTS idx_records_py ON records (PY);
+CREATE INDEX IF NOT EXISTS idx_records_so ON records (SO, PY);
+CREATE INDEX IF NOT EXISTS idx_records_di ON records (DI);
+CREATE INDEX IF NOT EXISTS idx_records_file ON records (file_id);
+"""
+
+
+def _now():
+    return datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+
+def open_warehouse(db_path):
+    """打开 (或创建) 数据仓库"""
+    db_dir = os.path.dirname(db_path)
+    if db_dir and not os.path.exists(db_dir):
+        os.makedirs(db_dir)
+    conn = sqlite3.connect(db_path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.commit()
+    return conn
+
+
+def _migrate(conn):
+    """旧版仓库的 ingest_files 补充 digest 字段"""
+    columns = {r['name'] for r in conn.execute("PRAGMA table_info(ingest_files)")}
+    if 'digest' not in columns:
+        conn.execute("ALTER TABLE ingest_files ADD COLUMN digest TEXT")
+
+
+def _quote(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def record_columns(conn):
+    """records 表现有的列"""
+    return [r['name'] for r in conn.execute("PRAGMA table_info(records)")]
+
+
+def ensure_columns(conn, tags):
+    """为新出现的字段增加列"""
+    existing = set(record_columns(conn))
+    for tag in tags:
+        if tag in existing:
+            continue
+        if tag in INTEGER_TAGS:
+            ddl = "INTEGER"
+        elif tag in NOCASE_TAGS:
+            ddl = "TEXT COLLATE NOCASE"
+        else:
+            ddl = "TEXT"
+        conn.execute(f"ALTER TABLE records ADD COLUMN {_quote(tag)} {ddl}")
+        existing.add(tag)
+
+
+def _file_entry(conn, path):
+    """
+    返回 (文件 id, 续读偏移, 是否已完成)。
+    文件在上次导入之后只在末尾追加了记录 (增量合并) 时从上次的偏移继续；
+    偏移之前的内容变了 (重新生成) 时删除该文件之前导入的记录，从头重新导入。
+    """
+    st = os.stat(path)
+    row = conn.execute("SELECT * FROM ingest_files WHERE path = ?", (path,)).fetchone()
+    if row is not None and row['size'] == st.st_size and row['mtime'] == st.st_mtime_ns:
+        return row['id'], (None if row['done'] else row['offset']), bool(row['done'])
+    if row is not None and is_appended(path, row['offset'] or 0, row['digest']):
+        with conn:
+            conn.execute("UPDATE ingest_files SET size = ?, mtime = ?, done = 0, updated_at = ? WHERE id = ?",
+                         (st.st_size, st.st_mtime_ns, _now(), row['id']))
+        return row['id'], row['offset'], False
+    with conn:
+        if row is not None:
+            conn.execute("DELETE FROM records WHERE file_id = ?", (row['id'],))
+            conn.execute("DELETE FROM ingest_files WHERE id = ?", (row['id'],))
+        cur = conn.execute("INSERT INTO ingest_files (path, size, mtime, updated_at) VALUES (?, ?, ?, ?)",
+                           (path, st.st_size, st.st_mtime_ns, _now()))
+    return cur.lastrowid, None, False
+
+
+def _chunk_rows(chunk, tags, file_id):
+    """DataFrame -> executemany 的参数：整数列转 int，空值转 None"""
+    for column, tag in zip(chunk.columns, tags):
+        if tag in INTEGER_TAGS:
+            chunk[column] = pd.to_numeric(chunk[column], errors='coerce').astype('Int64')
+    chunk = chunk.astype(object).where(chunk.notna(), None)
+    chunk['file_id'] = file_id
+    return chunk.itertuples(index=False, name=None)
+
+
+def ingest_file(conn, csv_path, chunk_size=CHUNK_SIZE):
+    """
+    把一个合并 CSV 导入 records，返回新增记录数。
+    同一 UT 只保留最先导入的一条 (INSERT OR IGNORE)；没有 UT 的行跳过。
+    """
+    path = os.path.abspath(csv_path)
+    file_id, start_offset, done = _file_entry(conn, path)
+    if done:
+        return 0
+
+    added = 0
+    for chunk, offset in iter_csv_chunks(path, chunk_size, start_offset=start_offset, dtype=str):
+        tags = [COLUMN_TO_TAG.get(column, column) for column in chunk.columns]
+        if 'UT' not in tags:
+            raise ValueError(f"{os.path.basename(path)} 中没有 UT 列，无法去重入库")
+        chunk = chunk[chunk.iloc[:, tags.index('UT')].notna()]
+        columns = ', '.join(_quote(tag) for tag in tags + ['file_id'])
+        marks = ', '.join('?' * (len(tags) + 1))
+
+        # 数据和偏移在同一个事务中提交，中断后从偏移继续不会重复或遗漏
+        with conn:
+            ensure_columns(conn, tags)
+            before = conn.total_changes
+            conn.executemany(f"INSERT OR IGNORE INTO records ({columns}) VALUES ({marks})",
+                             _chunk_rows(chunk, tags, file_id))
+            inserted = conn.total_changes - before
+            conn.execute("UPDATE ingest_files SET offset = ?, digest = ?, rows_read = rows_read + ?, "
+                         "rows_added = rows_added + ?, updated_at = ? WHERE id = ?",
+                         (offset, content_digest(path, offset), len(chunk), inserted, _now(), file_id))
+        added += inserted
+
+    with conn:
+        conn.execute("UPDATE ingest_files SET done = 1, updated_at = ? WHERE id = ?", (_now(), file_id))
+    return added
+
+
+def ingest(db_path, source, chunk_size=CHUNK_SIZE):
+    """导入 source (合并 CSV 文件或目录) 中新增或变化的 CSV，返回新增记录数"""
+    files = [source] if os.path.isfile(source) else sorted(glob.glob(os.path.join(source, '*.csv')))
+    conn = open_warehouse(db_path)
+    total = 0
+    try:
+        for path in files:
+            added = ingest_file(conn, path, chunk_size)
+            print(f" - {os.path.basename(path)}: 新增 {added} 条")
+            total += added
+    finally:
+        conn.close()
+    return total
+
+
+def load_journal_list(conn, list_name, journals):
+    """导入 (替换) 一个期刊名单，之后可与 records.SO 直接 JOIN (不区分大小写)"""
+    names = sorted({str(j).strip() for j in journals if isinstance(j, str) and j.strip()})
+    with conn:
+        conn.execute("DELETE FROM journal_lists WHERE list_name = ?", (list_name,))
+        conn.executemany("INSERT OR IGNORE INTO journal_lists (list_name, SO) VALUES (?, ?)",
+                         [(list_name, name) for name in names])
+    return len(names)
+
+
+def count_by_journal(conn, year_from=None, year_to=None, list_name=None):
+    """各期刊论文数 (可限定年份范围和期刊名单)，返回 DataFrame"""
+    sql = "SELECT r.SO AS SO, COUNT(*) AS papers FROM records r"
+    conditions, params = ["r.SO IS NOT NULL"], []
+    if list_name is not None:
+        sql += " JOIN journal_lists j ON r.SO = j.SO"
+        conditions.append("j.list_name = ?")
+        params.append(list_name)
+    if year_from is not None:
+        conditions.append("r.PY >= ?")
+        params.append(year_from)
+    if year_to is not None:
+        conditions.append("r.PY <= ?")
+        params.append(year_to)
+    sql += " WHERE " + " AND ".join(conditions) + " GROUP BY r.SO ORDER BY papers DESC"
+    return pd.read_sql_query(sql, conn, params=params)
+
+
+if __name__ == '__main__':
+    # 用法: python wos_warehouse.py <wos.db> <合并 CSV 文件或目录>
+    if len(sys.argv) < 3:
+        print("用法: python wos_warehouse.py <wos.db> <合并 CSV 文件或目录>")
+        sys.exit(1)
+    added = ingest(sys.argv[1], sys.argv[2])
+    conn = open_warehouse(sys.argv[1])
+    total = conn.execute("SELECT COUNT(*) FROM records").fetchone()[0]
+    files = conn.execute("SELECT COUNT(*) FROM ingest_files WHERE done = 1").fetchone()[0]
+    print(f"本次新增 {added} 条；仓库共 {total} 条记录 (去重后)，来自 {files} 个文件")
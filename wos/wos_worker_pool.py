@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+# Web of Science (WOS) 多 profile 进程池导出 (协调器 + worker)
+# 每个调试端口对应一个独立的 Chrome 实例 / profile (各自登录一个授权会话)，每个实例由一个 worker 进程驱动。
+# 关键词通过任务台账 (wos_tasks.db) 的租约领取：worker 定期心跳续租，进程退出或失联 (租约过期) 后，
+# 协调器回收其租约并重启 worker，未完成的关键词和记录范围自动交给其他 worker。
+#
+# 用法:
+#   1. 为每个端口启动一个 Chrome (AUTO_LAUNCH_CHROME=True 时由本脚本启动)，分别登录 WOS
+#   2. python wos_worker_pool.py
+
+import os
+import io
+import sys
+import time
+import subprocess
+import threading
+import traceback
+import multiprocessing
+from selenium.webdriver.support.ui import WebDriverWait
+
+import wos_export_by_advanced_search as v4
+import wos_multi_tab_export as multi_tab
+import wos_task_ledger as ledger_db
+from combine_wos_export import merge_wos_exports_to_csv
+from wos_merge_watcher import start_merge_watcher
+
+# =====================================================
+# 全局配置参数 (其余路径/参数沿用 wos_export_by_advanced_search.py)
+# =====================================================
+# 每个端口一个 Chrome 实例 / profile / worker 进程
+WORKER_PORTS = [9222, 9223, 9224]
+# 每个 worker 在自己的浏览器中再开几个并行标签页 (0 表示只用主标签页)
+TABS_PER_WORKER = 2
+
+# 是否由本脚本启动 Chrome (否则请按 README 手动以 debug 模式启动)
+AUTO_LAUNCH_CHROME = False
+CHROME_EXE = r'C:\Program Files\Google\Chrome\Application\chrome.exe'
+PROFILE_ROOT = os.path.join(v4.WORK_DIR, 'selenium_user_dir')
+
+# 租约与心跳 (秒)：心跳间隔必须明显小于租约时长
+LEASE_SECONDS = 300
+HEARTBEAT_INTERVAL = 30
+# 关键词在台账中超过这么久没有任何进展 (新分区、任务开始/完成) 时停止续租，租约过期后由协调器结束该 worker。
+# PY 切分的计数探针不写台账，这个时长需要大于一次切分所需的时间
+STALL_SECONDS = 1800
+# 同一关键词最多被领取几次，避免持续失败的关键词在 worker 之间无限轮转
+MAX_KEYWORD_CLAIMS = 3
+# 单个 worker 进程异常退出后最多重启几次
+MAX_WORKER_RESTARTS = 3
+
+# 各 worker 的下载目录 (主标签页与各标签页分开路由)
+WORKER_DOWNLOAD_ROOT = os.path.join(v4.DOWNLOAD_DIR, 'worker_downloads')
+
+logger = v4.logger
+
+
+def worker_name(port):
+    return f"profile{port}"
+
+
+def launch_chrome(port):
+    """以 debug 模式启动一个独立 profile 的 Chrome"""
+    profile_dir = os.path.join(PROFILE_ROOT, f"wos_profile_{port}")
+    if not os.path.exists(profile_dir):
+        os.makedirs(profile_dir)
+    return subprocess.Popen([
+        CHROME_EXE,
+        f"--remote-debugging-port={port}",
+        f"--user-data-dir={profile_dir}",
+        v4.WOS_URL_ROOT,
+    ])
+
+
+# =====================================================
+# worker 进程
+# =====================================================
+def heartbeat_loop(name, keyword, stop_event, lost_event):
+    """
+    独立线程：定期续租，租约被回收时置位 lost_event。
+    只有关键词在台账中有进展时才续租：worker 卡死 (如 Selenium 无响应) 时进展停止，
+    STALL_SECONDS 后不再续租，租约过期，关键词交给其他 worker。
+    """
+    conn = ledger_db.open_ledger(v4.LEDGER_PATH)
+    progress = ledger_db.keyword_progress(conn, keyword)
+    last_progress = time.time()
+    try:
+        while not stop_event.wait(HEARTBEAT_INTERVAL):
+            current = ledger_db.keyword_progress(conn, keyword)
+            if current != progress:
+                progress, last_progress = current, time.time()
+            elif time.time() - last_progress > STALL_SECONDS:
+                logger.warning(f"[{name}] 关键词 {keyword} 已 {STALL_SECONDS} 秒没有进展，停止续租")
+                lost_event.set()
+                return
+            if not ledger_db.heartbeat(conn, name, keyword, LEASE_SECONDS):
+                logger.warning(f"[{name}] 关键词 {keyword} 的租约已失效")
+                lost_event.set()
+                return
+    finally:
+        conn.close()
+
+
+def worker_main(port):
+    """worker 进程入口：连接指定端口的 Chrome，循环领取关键词直到没有可领取的关键词"""
+    name = worker_name(port)
+    global logger
+    logger = v4.logger = multi_tab.logger = v4.setup_logger(os.path.join(v4.DOWNLOAD_DIR, 'workers', name))
+    logger.info(f"=== worker {name} 启动 ===")
+
+    worker_dir = os.path.join(WORKER_DOWNLOAD_ROOT, name)
+    profile = {
+        "name": f"{name}/",
+        "debugger_address": f"127.0.0.1:{port}",
+        "tab_count": TABS_PER_WORKER,
+        "download_root": worker_dir,
+        "main_download_dir": os.path.join(worker_dir, 'main'),
+    }
+
+    conn = ledger_db.open_ledger(v4.LEDGER_PATH)
+    driver = multi_tab.attach_driver(profile['debugger_address'])
+    multi_tab.route_downloads(driver, profile['main_download_dir'])
+    wait = WebDriverWait(driver, v4.WAIT_TIMEOUT)
+
+    while True:
+        keyword = ledger_db.claim_keyword(conn, name, LEASE_SECONDS, max_claims=MAX_KEYWORD_CLAIMS)
+        if keyword is None:
+            logger.info(f"[{name}] 没有可领取的关键词，退出")
+            break
+
+        logger.info(f"{'='*40}")
+        logger.info(f"[{name}] 领取关键词: 【{keyword}】")
+        logger.info(f"{'='*40}")
+
+        stop_event = threading.Event()
+        lost_event = threading.Event()
+        hb = threading.Thread(target=heartbeat_loop, args=(name, keyword, stop_event, lost_event), daemon=True)
+        hb.start()
+        try:
+            multi_tab.export_keyword(driver, wait, conn, keyword, profile, should_stop=lost_event.is_set)
+        except Exception as e:
+            logger.error(f"[{name}] 关键词 {keyword} 导出异常: {e}")
+            logger.error(traceback.format_exc())
+        finally:
+            stop_event.set()
+            hb.join()
+            ledger_db.release_keyword(conn, name, keyword)
+
+        try:
+            driver.get(v4.WOS_URL_ROOT)
+            time.sleep(2)
+        except: pass
+
+
+# =====================================================
+# 协调器
+# =====================================================
+def report_exhausted_keywords(ledger):
+    """列出领取次数已达上限、不会再被自动领取的关键词"""
+    exhausted = ledger_db.exhausted_keywords(ledger, MAX_KEYWORD_CLAIMS)
+    if exhausted:
+        logger.warning(f"{len(exhausted)} 个关键词已被领取 {MAX_KEYWORD_CLAIMS} 次仍未完成，不再自动领取: " +
+                       ", ".join(f"{kw}({claims})" for kw, claims in exhausted))
+        logger.warning(f"排查后可运行 python wos_task_ledger.py {v4.LEDGER_PATH} --reset-claims 或 --repair 重新开放")
+    return exhausted
+
+
+def start_worker(port):
+    proc = multiprocessing.Process(target=worker_main, args=(port,), name=worker_name(port))
+    proc.start()
+    return proc
+
+
+def coordinator_main():
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='ignore', line_buffering=True)
+    sys.stderr = io.TextIOWrapper(sys.stderr.buffer, encoding='utf-8', errors='ignore', line_buffering=True)
+
+    global logger
+    logger = v4.logger = v4.setup_logger(v4.DOWNLOAD_DIR)
+    logger.info(f"=== 协调器启动: {len(WORKER_PORTS)} 个 profile {WORKER_PORTS}，每个 {TABS_PER_WORKER} 个并行标签页 ===")
+
+    keywords = v4.read_keywords(v4.CSV_FILE_PATH)
+    if not keywords: return
+
+    ledger = ledger_db.open_ledger(v4.LEDGER_PATH)
+    ledger_db.register_keywords(ledger, keywords)
+    # 上次运行遗留的租约全部回收
+    for port in WORKER_PORTS:
+        ledger_db.release_worker_leases(ledger, worker_name(port))
+    report_exhausted_keywords(ledger)
+
+    if AUTO_LAUNCH_CHROME:
+        for port in WORKER_PORTS:
+            launch_chrome(port)
+            time.sleep(2)
+    logger.info("请在每个 Chrome 实例中登录 WOS 并进入 Advanced Search 页面，按 Enter 键开始...")
+    input()
+
+    merge_watcher = None
+    if v4.BACKGROUND_MERGE:
+        merge_watcher = start_merge_watcher(v4.CHROME_DOWNLOAD_DIR, v4.OUTPUT_FILE, delete_originals=True)
+
+    workers = {port: start_worker(port) for port in WORKER_PORTS}
+    restarts = {port: 0 for port in WORKER_PORTS}
+
+    try:
+        while workers:
+            time.sleep(HEARTBEAT_INTERVAL)
+            stalled = set(ledger_db.expired_lease_owners(ledger))
+            for port, proc in list(workers.items()):
+                name = worker_name(port)
+                if proc.is_alive() and name in stalled:
+                    # 进程还在但租约已过期：worker 卡死，结束后按异常退出处理 (回收租约、重启)
+                    logger.warning(f"worker {name} 的租约已过期 (无进展)，结束该进程")
+                    proc.terminate()
+                    proc.join()
+                if proc.is_alive():
+                    continue
+                released = ledger_db.release_worker_leases(ledger, name)
+                logger.info(f"worker {name} 已退出 (exitcode={proc.exitcode})，回收租约 {released} 个")
+                del workers[port]
+
+                remaining = ledger_db.claimable_keywords(ledger, MAX_KEYWORD_CLAIMS)
+                if proc.exitcode != 0 and remaining and restarts[port] < MAX_WORKER_RESTARTS:
+                    restarts[port] += 1
+                    logger.warning(f"worker {name} 异常退出，第 {restarts[port]} 次重启")
+                    workers[port] = start_worker(port)
+
+            summary = ledger_db.ledger_summary(ledger)
+            logger.info(f"[协调器] 存活 worker {len(workers)}，关键词 {summary['keywords']}，任务 {summary['tasks']}")
+
+        logger.info("所有 worker 已结束")
+    except KeyboardInterrupt:
+        logger.info("用户中断 (Ctrl+C)，停止所有 worker，进度已保存在台账中")
+        for port, proc in workers.items():
+            proc.terminate()
+            proc.join()
+            ledger_db.release_worker_leases(ledger, worker_name(port))
+    finally:
+        summary = ledger_db.ledger_summary(ledger)
+        logger.info(f"台账汇总: 关键词 {summary['keywords']}，任务 {summary['tasks']}")
+        report_exhausted_keywords(ledger)
+        logger.info("尝试合并文件...")
+        try:
+            if merge_watcher is not None:
+                # 大部分块已在导出过程中合并，这里只处理剩余文件
+                merge_watcher.stop()
+            else:
+                merge_wos_exports_to_csv(v4.CHROME_DOWNLOAD_DIR, v4.OUTPUT_FILE, delete_originals=True)
+            logger.info(f"合并完成: {v4.OUTPUT_FILE}")
+        except Exception as e:
+            logger.error(f"合并失败: {e}")
+
+
+if __name__ == "__main__":
+    coordinator_main()